@@ -1,7 +1,12 @@
+import sys
 import pandas as pd
 
+if len(sys.argv) != 2:
+    print("Usage: python CSVtoPandasDataFrame.py <perf_output.csv>")
+    sys.exit(1)
+
 # Load the CSV file
-csv_file = "C:/Users/izcin/OneDrive/Documents/GitHub/Prefetching-Pattern-Tracker/perf_output.csv"
+csv_file = sys.argv[1]
 data = pd.read_csv(csv_file)
 
 # Display the first few rows
@@ -0,0 +1,255 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from CompactTrace import CompactTrace
+
+def _hash64(keys, seed=0):
+    """SplitMix64 finalizer; spreads arbitrary uint64 keys over all 64 bits."""
+    x = np.asarray(keys, dtype=np.uint64) + np.uint64((0x9E3779B97F4A7C15 * (seed + 1)) % 2 ** 64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _bit_length(values):
+    """Bit length of every uint64 value (0 for 0)."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # frexp's exponent is the bit length; exact for 32-bit halves
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+def _register_updates(keys, precision, seed):
+    """Register index and rank (position of the first 1 bit) of each key."""
+    hashed = _hash64(keys, seed)
+    index = (hashed >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashed & np.uint64((1 << (64 - precision)) - 1)
+    rank = (64 - precision) - _bit_length(rest) + 1
+    return index, rank.astype(np.uint8)
+
+def _estimate(registers):
+    """HyperLogLog estimate for each row of a (groups, m) register matrix."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)), axis=1)
+    # Small-range correction: linear counting while registers are still empty
+    empty = np.sum(registers == 0, axis=1)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(empty, 1))
+    return np.where((raw <= 2.5 * m) & (empty > 0), linear, raw)
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch.
+
+    Memory is 2**precision one-byte registers regardless of how many keys
+    are added, the standard error is about 1.04 / sqrt(2**precision)
+    (0.8% at the default precision of 14), and sketches with the same
+    precision and seed merge losslessly by taking the register-wise
+    maximum, so counts of partitions can be combined into counts of their
+    union without revisiting the keys.
+    """
+    def __init__(self, precision=14, seed=0):
+        """
+        Args:
+            precision (int): log2 of the register count (4..18)
+            seed (int): Hash seed; only sketches with equal seeds merge
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.seed = seed
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def update(self, keys):
+        """Add a batch of uint64 keys."""
+        if len(keys) == 0:
+            return
+        index, rank = _register_updates(keys, self.precision, self.seed)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """Fold another sketch into this one (set union)."""
+        if (other.precision, other.seed) != (self.precision, self.seed):
+            raise ValueError("HyperLogLog sketches differ in precision or seed and cannot be merged")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """Estimated number of distinct keys added."""
+        return float(_estimate(self.registers)[0])
+
+class GroupedHyperLogLog:
+    """
+    One HyperLogLog per group (time window, thread, DSO, ...) in a single
+    register matrix, updated with one vectorized scatter per batch.
+
+    Groups are arbitrary integer ids and are added as they appear. Rows
+    can be estimated individually or merged into a rollup for any set of
+    groups, and whole grouped sketches from different partitions of a
+    trace merge row by row.
+    """
+    def __init__(self, precision=12, seed=0):
+        self.precision = precision
+        self.seed = seed
+        self.groups = np.zeros(0, dtype=np.int64)   # Sorted group ids
+        self.registers = np.zeros((0, 1 << precision), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.groups)
+
+    def _rows(self, group_ids):
+        """Row of every (distinct) group id, adding rows for groups not seen yet."""
+        new = np.setdiff1d(group_ids, self.groups, assume_unique=True)
+        if len(new):
+            groups = np.union1d(self.groups, new)
+            registers = np.zeros((len(groups), self.registers.shape[1]), dtype=np.uint8)
+            registers[np.searchsorted(groups, self.groups)] = self.registers
+            self.groups, self.registers = groups, registers
+        return np.searchsorted(self.groups, group_ids)
+
+    def update(self, group_ids, keys):
+        """Add keys with the group each belongs to (parallel arrays)."""
+        if len(keys) == 0:
+            return
+        groups, inverse = np.unique(np.asarray(group_ids, dtype=np.int64), return_inverse=True)
+        self.update_registers(groups, inverse, *_register_updates(keys, self.precision, self.seed))
+
+    def update_registers(self, groups, inverse, index, rank):
+        """
+        Update with pre-grouped, pre-hashed keys, so callers sketching the
+        same keys under several groupings do that work once.
+
+        Args:
+            groups (np.ndarray): Distinct group ids
+            inverse (np.ndarray): Position in `groups` of every key's group
+            index, rank (np.ndarray): Register index and rank of every key
+        """
+        rows = self._rows(groups)[inverse]
+        width = self.registers.shape[1]
+        np.maximum.at(self.registers.reshape(-1), rows * width + index, rank)
+
+    def merge(self, other):
+        if (other.precision, other.seed) != (self.precision, self.seed):
+            raise ValueError("Grouped sketches differ in precision or seed and cannot be merged")
+        rows = self._rows(other.groups)
+        self.registers[rows] = np.maximum(self.registers[rows], other.registers)
+        return self
+
+    def estimates(self):
+        """
+        Returns:
+            pd.Series: estimated distinct keys per group id
+        """
+        values = _estimate(self.registers) if len(self.groups) else np.zeros(0)
+        return pd.Series(values, index=self.groups)
+
+    def rollup(self, groups=None):
+        """
+        Merge the sketches of `groups` (all groups if None).
+
+        Returns:
+            HyperLogLog: sketch of the union of those groups' keys
+        """
+        sketch = HyperLogLog(self.precision, self.seed)
+        rows = np.arange(len(self.groups)) if groups is None \
+            else np.searchsorted(self.groups, np.intersect1d(groups, self.groups))
+        if len(rows):
+            sketch.registers = self.registers[rows].max(axis=0)
+        return sketch
+
+class CardinalityProfile:
+    """
+    Distinct addresses, cache lines and pages per time window, thread and
+    DSO, kept as grouped HyperLogLog sketches.
+
+    Time windows are absolute (timestamp // window_ns) and DSOs are keyed
+    by a hash of their name, so profiles built from separate chunks or
+    shards of a trace line up and merge into the profile of the whole
+    trace. Any set of groups within one dimension rolls up with
+    `GroupedHyperLogLog.rollup`, e.g. distinct pages over windows 10-20.
+    """
+    DIMENSIONS = ('window', 'thread', 'dso')
+    KINDS = ('address', 'line', 'page')
+
+    def __init__(self, window_ns, precision=12, seed=0):
+        """
+        Args:
+            window_ns (int): Width of one time window in nanoseconds
+            precision (int): HyperLogLog precision of every group sketch
+        """
+        self.window_ns = int(window_ns)
+        self.precision = precision
+        self.seed = seed
+        self.dso_names = {}   # DSO group id -> name
+        self.sketches = {
+            (dimension, kind): GroupedHyperLogLog(precision, seed)
+            for dimension in self.DIMENSIONS for kind in self.KINDS
+        }
+
+    @classmethod
+    def for_range(cls, start, end, n_windows=50, **kwargs):
+        """Empty profile with `n_windows` windows over timestamps [start, end]."""
+        return cls(max(-(-(int(end) - int(start) + 1) // n_windows), 1), **kwargs)
+
+    @classmethod
+    def from_trace(cls, trace, n_windows=50, batch_events=1_000_000, **kwargs):
+        """Profile a whole trace, using `n_windows` windows over its span."""
+        trace = CompactTrace.open(trace)
+        profile = cls.for_range(trace.timestamp.min(), trace.timestamp.max(), n_windows, **kwargs) \
+            if len(trace) else cls(1, **kwargs)
+        for start in range(0, len(trace), batch_events):
+            profile.update(trace.take(np.arange(start, min(start + batch_events, len(trace)))))
+        return profile
+
+    @staticmethod
+    def dso_id(name):
+        """Stable group id of a DSO name, the same in every trace."""
+        return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=7).digest(), 'little')
+
+    def update(self, trace):
+        """Add the events of a CompactTrace (or chunk of one)."""
+        dso_ids = np.array([self.dso_id(name) for name in trace.dsos], dtype=np.int64)
+        self.dso_names.update(zip(dso_ids.tolist(), trace.dsos))
+        groups = {
+            'window': trace.timestamp // self.window_ns,
+            'thread': trace.thread_id,
+            'dso': dso_ids[trace.dso_code] if len(dso_ids) else trace.dso_code,
+        }
+        keys = {'address': trace.address, 'line': trace.line, 'page': trace.page}
+        # Group and hash once per dimension / key kind, not per sketch
+        grouped = {
+            dimension: np.unique(ids.astype(np.int64), return_inverse=True)
+            for dimension, ids in groups.items()
+        }
+        hashed = {kind: _register_updates(values, self.precision, self.seed) for kind, values in keys.items()}
+        for (dimension, kind), sketch in self.sketches.items():
+            sketch.update_registers(*grouped[dimension], *hashed[kind])
+
+    def merge(self, other):
+        if other.window_ns != self.window_ns:
+            raise ValueError("Profiles use different window widths and cannot be merged")
+        for key, sketch in self.sketches.items():
+            sketch.merge(other.sketches[key])
+        self.dso_names.update(other.dso_names)
+        return self
+
+    def table(self, dimension):
+        """
+        Returns:
+            pd.DataFrame: estimated distinct addresses, lines and pages per
+                group of `dimension` ('window', 'thread' or 'dso')
+        """
+        table = pd.DataFrame({
+            kind: self.sketches[(dimension, kind)].estimates() for kind in self.KINDS
+        })
+        if dimension == 'dso':
+            table.index = [self.dso_names.get(group, group) for group in table.index]
+        return table.rename_axis(dimension)
+
+    def totals(self):
+        """Distinct addresses, lines and pages over the whole profile."""
+        return {kind: self.sketches[('window', kind)].rollup().estimate() for kind in self.KINDS}
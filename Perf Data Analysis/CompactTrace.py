@@ -0,0 +1,344 @@
+import hashlib
+import struct
+import zipfile
+import numpy as np
+import pandas as pd
+from MemDataSource import decode_data_src
+from SchemaValidation import infer_timestamp_unit, validate
+
+class CompactTrace:
+    """
+    Compact, struct-of-arrays representation of a memory access trace.
+
+    Every event is stored as one slot in a set of fixed-width numpy columns
+    instead of a row of Python objects. Repeated strings (event names and
+    DSOs) are dictionary-encoded into small integer codes that index the
+    `event_types` and `dsos` tables, and derived values such as the page or
+    cache line of an address are computed on first use rather than stored
+    as extra columns.
+
+    Memory budget per event (base columns only):
+        timestamp   int64    8 bytes
+        address     uint64   8 bytes
+        ip          uint64   8 bytes
+        period      uint64   8 bytes
+        thread_id   uint32   4 bytes
+        process_id  uint32   4 bytes
+        raw_offset  uint64   8 bytes
+        raw_length  uint32   4 bytes
+        event_code  uint16   2 bytes
+        dso_code    uint16   2 bytes
+        shard_id    uint16   2 bytes
+        weight      uint32   4 bytes
+        mem_level   uint8    1 byte
+        mem_flags   uint8    1 byte
+        ---------------------------------
+                             64 bytes / event
+
+    `raw_offset`/`raw_length` locate each record in the source perf dump
+    so that RawRecordReader can fetch its hex dump on demand; `shard_id`
+    says which dump that is when several shards were merged. `weight`
+    (sampled access latency) and the `mem_level`/`mem_flags` codes decoded
+    from perf's data_src field (see MemDataSource) are zero when the input
+    did not record them.
+
+    Each lazily derived column (page, line) adds 8 bytes per event once it
+    has been requested. The string tables are shared by all events and are
+    negligible for realistic traces.
+    """
+    PAGE_SIZE = 4096
+    CACHE_LINE_SIZE = 64
+
+    # Column name -> storage dtype. Order here is the on-disk order.
+    COLUMNS = {
+        'timestamp': np.int64,
+        'address': np.uint64,
+        'ip': np.uint64,
+        'period': np.uint64,
+        'thread_id': np.uint32,
+        'process_id': np.uint32,
+        'raw_offset': np.uint64,
+        'raw_length': np.uint32,
+        'event_code': np.uint16,
+        'dso_code': np.uint16,
+        'shard_id': np.uint16,
+        'weight': np.uint32,
+        'mem_level': np.uint8,
+        'mem_flags': np.uint8,
+    }
+    BYTES_PER_EVENT = sum(np.dtype(dtype).itemsize for dtype in COLUMNS.values())
+
+    # CSV header aliases for the layouts produced by this repository
+    # (ExtendedData2CSV writes lowercase names, DataToCSV capitalized ones).
+    CSV_ALIASES = {
+        'Timestamp': 'timestamp',
+        'Address': 'address',
+        'Event': 'event_type',
+        'ip_address': 'ip',
+    }
+
+    def __init__(self, columns, event_types, dsos):
+        """
+        Build a trace from already-typed column arrays.
+
+        Args:
+            columns (dict): Column name -> numpy array, all the same length
+            event_types (list): Decoded strings for `event_code`
+            dsos (list): Decoded strings for `dso_code`
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Column lengths differ: {sorted(lengths)}")
+
+        self.columns = {}
+        n_events = lengths.pop() if lengths else 0
+        for name, dtype in self.COLUMNS.items():
+            values = columns.get(name)
+            if values is None:
+                values = np.zeros(n_events, dtype=dtype)
+            self.columns[name] = np.ascontiguousarray(values, dtype=dtype)
+
+        self.event_types = list(event_types)
+        self.dsos = list(dsos)
+        self._derived = {}
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def __getattr__(self, name):
+        # Expose columns as attributes (trace.address, trace.timestamp, ...)
+        columns = self.__dict__.get('columns')
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    @classmethod
+    def from_csv(cls, csv_file, quarantine=None):
+        """
+        Load a CSV written by DataToCSV or ExtendedData2CSV.
+
+        Args:
+            csv_file (str): Input CSV
+            quarantine (Quarantine): Optional SchemaValidation.Quarantine
+                receiving the rejected rows with their reason codes
+        """
+        df = pd.read_csv(csv_file, usecols=cls.csv_columns, dtype=str)
+        return cls.from_frame(df, quarantine)
+
+    @classmethod
+    def csv_columns(cls, name):
+        """usecols filter: the CSV columns a trace is built from."""
+        return cls.CSV_ALIASES.get(name, name) in (
+            'timestamp', 'address', 'event_type', 'thread_id',
+            'process_id', 'dso', 'period', 'ip', 'raw_offset', 'raw_length', 'shard_id',
+            'weight', 'data_src', 'mem_level', 'mem_flags'
+        )
+
+    @classmethod
+    def from_frame(cls, df, quarantine=None, timestamp_unit=None):
+        """
+        Convert a string-typed DataFrame into a compact trace.
+
+        Every column is checked in one pass by SchemaValidation.validate;
+        rows failing any check (most commonly no parseable address or
+        timestamp) are left out, and recorded in `quarantine` (a
+        SchemaValidation.Quarantine) when one is given.
+
+        Args:
+            df (pd.DataFrame): Parsed rows
+            quarantine (Quarantine): Optional receiver of rejected rows
+            timestamp_unit (str): 'ns' or 's' when the frame is one batch
+                of a larger source (see `timestamp_unit`); inferred from
+                the frame otherwise
+        """
+        df = df.rename(columns=cls.CSV_ALIASES)
+        typed, reasons = validate(df, cls.COLUMNS, timestamp_unit=timestamp_unit)
+        if quarantine is not None:
+            quarantine.add(df, reasons)
+        keep = reasons == 0
+        n_events = int(keep.sum())
+
+        columns = {name: typed[name][keep] for name in cls.COLUMNS if name in typed}
+        if 'data_src' in typed:
+            # Raw data_src as written by the parsers; decoded here so CSVs
+            # only need to carry the one field
+            columns['mem_level'], columns['mem_flags'] = decode_data_src(typed['data_src'][keep])
+
+        names = typed['event_type'][keep] if 'event_type' in typed else None
+        columns['event_code'], event_types = cls._encode(names, n_events)
+        dso = df['dso'][keep] if 'dso' in df else None
+        columns['dso_code'], dsos = cls._encode(dso, n_events)
+
+        return cls(columns, event_types, dsos)
+
+    @classmethod
+    def timestamp_unit(cls, df):
+        """Timestamp unit ('ns' or 's') of the source `df` is a batch of; None if undecided."""
+        return infer_timestamp_unit(df.rename(columns=cls.CSV_ALIASES))
+
+    @staticmethod
+    def _encode(values, n_events):
+        """Dictionary-encode a string column into uint16 codes and a table."""
+        if values is None:
+            return np.zeros(n_events, dtype=np.uint16), ['']
+        codes, uniques = pd.factorize(values.fillna(''), sort=True)
+        if len(uniques) > np.iinfo(np.uint16).max:
+            raise ValueError(f"Too many distinct values to encode: {len(uniques)}")
+        return codes.astype(np.uint16), list(uniques) or ['']
+
+    @property
+    def page(self):
+        """Page number of every access (computed on first use)."""
+        return self._derive('page', lambda: self.address // np.uint64(self.PAGE_SIZE))
+
+    @property
+    def line(self):
+        """Cache line number of every access (computed on first use)."""
+        return self._derive('line', lambda: self.address // np.uint64(self.CACHE_LINE_SIZE))
+
+    def _derive(self, name, compute):
+        if name not in self._derived:
+            self._derived[name] = compute()
+        return self._derived[name]
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays, including materialized derived columns."""
+        return (sum(values.nbytes for values in self.columns.values()) +
+                sum(values.nbytes for values in self._derived.values()))
+
+    def fingerprint(self):
+        """
+        Content hash of the trace, stable across processes and sessions.
+
+        Used to key cached results (e.g. rendered figures) so they are
+        shared only between identical datasets.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for name, values in self.columns.items():
+                digest.update(name.encode('utf-8'))
+                digest.update(memoryview(values))
+            digest.update('\0'.join(self.event_types + self.dsos).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def access_order(self):
+        """
+        Positions of the memory accesses in time order.
+
+        When the trace holds PERF_RECORD_SAMPLE records only those count as
+        accesses; the other records (mmaps, comms, ...) are not.
+        """
+        sample_codes = [code for code, name in enumerate(self.event_types) if 'SAMPLE' in name]
+        if sample_codes:
+            order = np.flatnonzero(np.isin(self.event_code, sample_codes))
+        else:
+            order = np.arange(len(self))
+        if len(order) > 1 and np.any(self.timestamp[order][1:] < self.timestamp[order][:-1]):
+            order = order[np.argsort(self.timestamp[order], kind='stable')]
+        return order
+
+    def take(self, indices):
+        """Return a new trace holding only the selected events (mask or indices)."""
+        columns = {name: values[indices] for name, values in self.columns.items()}
+        return CompactTrace(columns, self.event_types, self.dsos)
+
+    def to_frame(self, columns=None):
+        """
+        Expose the trace as a pandas DataFrame for plotting code.
+
+        Encoded strings come back as categoricals that share the trace's
+        string tables, so no per-row Python strings are created.
+
+        Args:
+            columns (list): Column names to include. Besides the stored
+                columns, 'event_type', 'dso', 'page' and 'line' are accepted.
+        """
+        if columns is None:
+            columns = ['timestamp', 'address', 'ip', 'period', 'thread_id',
+                       'process_id', 'event_type', 'dso']
+        data = {}
+        for name in columns:
+            if name == 'event_type':
+                data[name] = pd.Categorical.from_codes(self.event_code, self.event_types)
+            elif name == 'dso':
+                data[name] = pd.Categorical.from_codes(self.dso_code, self.dsos)
+            elif name in ('page', 'line'):
+                data[name] = getattr(self, name)
+            else:
+                data[name] = self.columns[name]
+        return pd.DataFrame(data, copy=False)
+
+    def save(self, path):
+        """Write the trace as an uncompressed .npz archive."""
+        np.savez(
+            path,
+            event_types=np.array(self.event_types, dtype=str),
+            dsos=np.array(self.dsos, dtype=str),
+            **self.columns
+        )
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Read a trace written by `save`.
+
+        Args:
+            path (str): .npz archive
+            mmap_mode (str): 'r' to memory-map the columns instead of
+                reading them; `save` stores them uncompressed, so each one
+                is a plain .npy image at a fixed offset in the archive
+        """
+        if mmap_mode:
+            columns, strings = cls._map_npz(path, mmap_mode)
+            columns = {name: values for name, values in columns.items() if name in cls.COLUMNS}
+            return cls(columns, strings['event_types'].tolist(), strings['dsos'].tolist())
+        with np.load(path) as archive:
+            columns = {name: archive[name] for name in cls.COLUMNS if name in archive}
+            return cls(columns, archive['event_types'].tolist(), archive['dsos'].tolist())
+
+    @staticmethod
+    def _map_npz(path, mmap_mode):
+        """
+        Memory-map the members of an uncompressed .npz archive.
+
+        Returns:
+            tuple: (numeric arrays, other arrays) by member name, the
+                latter (string tables) read normally
+        """
+        mapped, read = {}, {}
+        with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+            for info in archive.infolist():
+                name = info.filename[:-len('.npy')]
+                if info.compress_type != zipfile.ZIP_STORED:
+                    read[name] = np.load(archive.open(info))
+                    continue
+                # Local file header: 30 fixed bytes, then name and extra field
+                file.seek(info.header_offset + 26)
+                name_length, extra_length = struct.unpack('<HH', file.read(4))
+                file.seek(info.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(file)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+                if dtype.kind in 'biuf' and shape and shape[0]:
+                    mapped[name] = np.memmap(file.name, dtype=dtype, mode=mmap_mode, offset=file.tell(),
+                                             shape=shape, order='F' if fortran_order else 'C')
+                else:
+                    read[name] = np.load(archive.open(info))
+        return mapped, read
+
+    @classmethod
+    def open(cls, source):
+        """
+        Accept whatever the tools are given as input: an existing trace,
+        a saved .npz trace, or a CSV file.
+        """
+        if isinstance(source, CompactTrace):
+            return source
+        if str(source).endswith('.npz'):
+            return cls.load(source, mmap_mode='r')
+        return cls.from_csv(source)
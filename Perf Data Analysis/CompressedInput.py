@@ -0,0 +1,118 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+# Read buffer for dumps; large sequential reads keep decompressors and
+# line splitting out of the per-syscall overhead
+BUFFER_SIZE = 8 * 1024 * 1024
+
+# Leading bytes of each supported container
+MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'BZh', 'bz2'),
+)
+
+# Footer magic of the zstd seekable format's seek table
+ZSTD_SEEKABLE_MAGIC = b'\xb1\xea\x92\x8f'
+
+def detect_compression(path):
+    """
+    Identify the compression of a dump from its leading bytes.
+
+    Returns:
+        str: 'gzip', 'zstd', 'xz', 'bz2', or None for plain text
+    """
+    with open(path, 'rb') as file:
+        head = file.read(6)
+    for magic, name in MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+def is_seekable_zstd(path):
+    """True if the file ends with a zstd seekable-format seek table."""
+    if os.path.getsize(path) < 9:
+        return False
+    with open(path, 'rb') as file:
+        file.seek(-4, os.SEEK_END)
+        return file.read(4) == ZSTD_SEEKABLE_MAGIC
+
+def _open_zstd(path, buffer_size):
+    # pyzstd reads both plain and seekable-format files and supports seek;
+    # zstandard is a streaming fallback
+    try:
+        import pyzstd
+    except ImportError:
+        pyzstd = None
+    if pyzstd is not None:
+        if is_seekable_zstd(path):
+            stream = pyzstd.SeekableZstdFile(path, 'rb')
+        else:
+            stream = pyzstd.ZstdFile(path, 'rb')
+        return io.BufferedReader(stream, buffer_size)
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            f"{path} is zstd-compressed; install 'pyzstd' (seekable) or 'zstandard' to read it"
+        )
+    raw = open(path, 'rb', buffering=buffer_size)
+    reader = zstandard.ZstdDecompressor().stream_reader(raw, read_size=buffer_size, closefd=True)
+    return io.BufferedReader(reader, buffer_size)
+
+def open_dump(path, buffer_size=BUFFER_SIZE):
+    """
+    Open a perf text dump for binary reading, decompressing on the fly.
+
+    Plain, gzip, zstd, xz and bz2 files are recognized by content, not by
+    extension. The returned object is a buffered binary stream; byte
+    offsets (tell/seek) refer to the decompressed text, so offsets
+    recorded while parsing a compressed dump stay valid. Seeking is cheap
+    on plain files and seekable-format zstd, and re-decompresses from the
+    start otherwise.
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'rb', buffering=buffer_size)
+    if compression == 'zstd':
+        return _open_zstd(path, buffer_size)
+    opener = {'gzip': gzip.open, 'xz': lzma.open, 'bz2': bz2.open}[compression]
+    # Closing the buffered reader closes the decompressor and its file
+    return io.BufferedReader(opener(path, 'rb'), buffer_size)
+
+def supports_random_access(path):
+    """True if chunks of the dump can be decompressed independently."""
+    compression = detect_compression(path)
+    return compression is None or (compression == 'zstd' and is_seekable_zstd(path))
+
+def split_ranges(path, n_chunks):
+    """
+    Split a dump into about `n_chunks` line-aligned byte ranges.
+
+    Each range can be read on its own, e.g. by a separate worker process,
+    by seeking an `open_dump` stream to its start. Only plain files and
+    seekable-format zstd support this; for those, finding the boundaries
+    reads a few bytes per chunk.
+
+    Returns:
+        list: (start, end) offsets into the decompressed text
+    """
+    if not supports_random_access(path):
+        raise ValueError(f"{path} cannot be split; recompress it as seekable zstd or read it sequentially")
+    with open_dump(path, buffer_size=64 * 1024) as file:
+        size = file.seek(0, os.SEEK_END)
+        bounds = [0]
+        for i in range(1, n_chunks):
+            target = max(size * i // n_chunks, bounds[-1])
+            file.seek(target)
+            # Move the boundary to the start of the next line
+            boundary = target + len(file.readline()) if target else 0
+            if bounds[-1] < boundary < size:
+                bounds.append(boundary)
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
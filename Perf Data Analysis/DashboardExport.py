@@ -0,0 +1,260 @@
+import json
+import os
+import numpy as np
+from CompactTrace import CompactTrace
+from TraceAggregates import TraceAggregates
+from PhaseDetector import detect_phases, phase_boundaries
+
+# Bump whenever the layout of the exported file changes; the web dashboard
+# ignores files with a version it does not know.
+FORMAT_VERSION = 1
+
+# Same palette the Next.js dashboard uses for its built-in sample data
+COLORS = ['#2ecc71', '#3498db', '#9b59b6', '#e74c3c', '#1abc9c', '#f39c12', '#95a5a6']
+
+def classify_dsos(dsos, dso_counts):
+    """
+    Map each DSO to one of the program sections the web dashboard charts.
+
+    Returns:
+        dict: section name ('mainProgram', 'dynamicLinker', 'cLibrary',
+            'vdso' or 'other') -> list of DSO codes
+    """
+    sections = {'mainProgram': [], 'dynamicLinker': [], 'cLibrary': [], 'vdso': [], 'other': []}
+    executables = []
+    for code, dso in enumerate(dsos):
+        name = os.path.basename(dso)
+        if name.startswith(('ld-linux', 'ld.so', 'ld-')):
+            sections['dynamicLinker'].append(code)
+        elif name.startswith(('libc.so', 'libc-')):
+            sections['cLibrary'].append(code)
+        elif dso == '[vdso]':
+            sections['vdso'].append(code)
+        elif dso.startswith('/') and '.so' not in name:
+            executables.append(code)
+        else:
+            sections['other'].append(code)
+    # The busiest non-library file is the profiled program itself
+    if executables:
+        main = max(executables, key=lambda code: dso_counts[code])
+        sections['mainProgram'].append(main)
+        sections['other'].extend(code for code in executables if code != main)
+    return sections
+
+def label_phases(phase_of_window, main_per_phase):
+    """
+    Map detected phases onto the dashboard's 'init' / 'loop' / 'exit' labels.
+
+    Phases before the first one in which the program's own code runs are
+    'init', phases after the last such phase are 'exit', the rest 'loop'.
+
+    Args:
+        phase_of_window (np.ndarray): Detected phase index of every chart point
+        main_per_phase (np.ndarray): Main-program accesses per detected phase
+    """
+    active = np.flatnonzero(main_per_phase)
+    labels = np.full(len(main_per_phase), 'loop', dtype=object)
+    if len(active):
+        labels[:active[0]] = 'init'
+        labels[active[-1] + 1:] = 'exit'
+    return labels[phase_of_window].tolist()
+
+def top_with_other(names, counts, limit, key):
+    """Top `limit` (name, count) entries plus an 'Other' bucket, with colors."""
+    order = [i for i in np.argsort(counts)[::-1] if counts[i] > 0]
+    entries = [(names[i], int(counts[i])) for i in order[:limit]]
+    other = int(sum(counts[i] for i in order[limit:]))
+    if other:
+        entries.append(('Other', other))
+    return [
+        {'name': name, key: count, 'color': COLORS[i % len(COLORS)]}
+        for i, (name, count) in enumerate(entries)
+    ]
+
+class DashboardCounts:
+    """
+    Per-window and per-phase event counts behind the dashboard export.
+
+    Counts are keyed by (DSO name, event name) rather than by a trace's
+    codes, so counts of separately encoded chunks merge by addition, and
+    every chart series is a sum over some of the keys. Memory depends on
+    the number of such pairs and chart points, not on the trace length.
+    """
+    def __init__(self, start, span, n_points, boundaries):
+        """
+        Args:
+            start, span (int): Time axis of the chart points in nanoseconds
+            n_points (int): Number of equal-width chart points
+            boundaries (np.ndarray): Inner edges of the detected phases
+                (PhaseDetector.phase_boundaries)
+        """
+        self.start = start
+        self.span = span
+        self.n_points = n_points
+        self.boundaries = boundaries
+        self.windows = {}   # (dso, event) -> counts per chart point
+        self.phases = {}    # (dso, event) -> counts per detected phase
+
+    @staticmethod
+    def _add(totals, trace, bucket, n_buckets):
+        """Add the events of `trace` per (DSO, event) pair and bucket."""
+        n_types = len(trace.event_types)
+        pair = trace.dso_code.astype(np.int64) * n_types + trace.event_code
+        keys, counts = np.unique(pair * n_buckets + bucket, return_counts=True)
+        pairs, inverse = np.unique(keys // n_buckets, return_inverse=True)
+        table = np.zeros((len(pairs), n_buckets), dtype=np.int64)
+        table[inverse, keys % n_buckets] = counts
+        for pair, row in zip(pairs.tolist(), table):
+            name = (trace.dsos[pair // n_types], trace.event_types[pair % n_types])
+            totals[name] = totals.get(name, 0) + row
+
+    def update(self, trace):
+        timestamp = trace.timestamp
+        window = np.clip((timestamp - self.start) * self.n_points // (self.span + 1),
+                         0, self.n_points - 1).astype(np.int64)
+        self._add(self.windows, trace, window, self.n_points)
+        self._add(self.phases, trace, np.searchsorted(self.boundaries, timestamp, side='right'),
+                  len(self.boundaries) + 1)
+
+    def merge(self, other):
+        for totals, others in ((self.windows, other.windows), (self.phases, other.phases)):
+            for name, counts in others.items():
+                totals[name] = totals.get(name, 0) + counts
+
+    def aggregates(self):
+        """The exported aggregates (see build_dashboard_aggregates)."""
+        n_points = self.n_points
+        names = sorted(self.windows)
+        # String tables in the order a single encoded trace would have them
+        dsos = sorted({dso for dso, _ in names})
+        event_types = sorted({event for _, event in names})
+        windows = np.array([self.windows[name] for name in names]).reshape(len(names), n_points)
+        phases = np.array([self.phases[name] for name in names]).reshape(len(names), len(self.boundaries) + 1)
+        dso_code = np.array([dsos.index(dso) for dso, _ in names], dtype=np.int64)
+        event_code = np.array([event_types.index(event) for _, event in names], dtype=np.int64)
+        window_seconds = self.span / n_points / 1e9
+
+        def per_window(mask):
+            return windows[mask].sum(axis=0)
+
+        # Memory accesses are the samples when the trace has sample records,
+        # otherwise every event (perf script / DataToCSV style traces)
+        codes_matching = lambda pattern: [c for c, name in enumerate(event_types) if pattern.search(name)]
+        sample_codes = [c for c, name in enumerate(event_types) if 'SAMPLE' in name]
+        is_access = np.isin(event_code, sample_codes) if sample_codes else np.ones(len(names), dtype=bool)
+
+        accesses = per_window(is_access)
+        misses = per_window(np.isin(event_code, codes_matching(TraceAggregates.MISS_PATTERN)))
+        hits = per_window(np.isin(event_code, codes_matching(TraceAggregates.HIT_PATTERN)))
+        references = per_window(np.isin(event_code, codes_matching(TraceAggregates.REFERENCE_PATTERN)))
+        if not hits.any():
+            hits = np.maximum(references - misses, 0)
+
+        dso_counts = np.bincount(dso_code[is_access], weights=windows[is_access].sum(axis=1),
+                                 minlength=len(dsos)).astype(np.int64)
+        sections = classify_dsos(dsos, dso_counts)
+        section_counts = {
+            section: per_window(is_access & np.isin(dso_code, codes))
+            for section, codes in sections.items()
+        }
+
+        # Detected execution phases, sampled at each chart point's start time
+        is_main = is_access & np.isin(dso_code, sections['mainProgram'])
+        main_per_phase = phases[is_main].sum(axis=0)
+        window_starts = self.start + np.arange(n_points) * (self.span + 1) // n_points
+        phase_labels = label_phases(np.searchsorted(self.boundaries, window_starts, side='right'), main_per_phase)
+
+        time_series = [
+            {
+                'timestamp': f'{i * window_seconds * 1e3:.2f}ms',
+                'accesses': int(accesses[i]),
+                'cacheHits': int(hits[i]),
+                'cacheMisses': int(misses[i]),
+                'mainProgram': int(section_counts['mainProgram'][i]),
+                'dynamicLinker': int(section_counts['dynamicLinker'][i]),
+                'cLibrary': int(section_counts['cLibrary'][i]),
+                'phase': phase_labels[i]
+            }
+            for i in range(n_points)
+        ]
+
+        # Friendly names for the sections the dashboard already knows about
+        section_labels = {'mainProgram': 'Main()', 'dynamicLinker': 'Linker', 'cLibrary': 'C Library', 'vdso': 'VDSO'}
+        dso_names = [os.path.basename(dso) or dso or 'Unknown' for dso in dsos]
+        for section, label in section_labels.items():
+            for code in sections[section]:
+                dso_names[code] = label
+        libraries = top_with_other(dso_names, dso_counts, 5, 'accesses')
+
+        event_counts = np.bincount(event_code, weights=windows.sum(axis=1),
+                                   minlength=len(event_types)).astype(np.int64)
+        event_names = [name.replace('PERF_RECORD_', '') for name in event_types]
+        events = top_with_other(event_names, event_counts, 4, 'count')
+
+        # Traces without cache hit/miss events leave the rates unknown (null),
+        # which the dashboard shows as "n/a" rather than a misleading 0%
+        total_hits, total_misses = int(hits.sum()), int(misses.sum())
+        cache_total = total_hits + total_misses
+        metrics = {
+            'cacheHitRate': round(100 * total_hits / cache_total, 2) if cache_total else None,
+            'cacheMissRate': round(100 * total_misses / cache_total, 2) if cache_total else None,
+            'totalAccesses': int(accesses.sum()),
+            'peakAccessRate': round(float(accesses.max()) / window_seconds, 2) if names else 0
+        }
+
+        return {
+            'version': FORMAT_VERSION,
+            'timeSeries': time_series,
+            'libraries': libraries,
+            'events': events,
+            'metrics': metrics
+        }
+
+def build_dashboard_aggregates(trace, n_points=50):
+    """
+    Reduce a trace to the data the Next.js dashboard renders.
+
+    The output mirrors `memory-analysis-dashboard/src/types/types.tsx`:
+    `timeSeries` is a list of TimeSeriesDataPoint, `libraries` of
+    LibraryAccess, `events` of EventType, and `metrics` is a
+    PerformanceMetrics object. Its size depends on `n_points` and the
+    number of distinct DSOs/events, never on the trace length.
+
+    A chunked trace is read chunk by chunk in three streaming passes (time
+    range, phase detection, DashboardCounts), so memory stays bounded by
+    the chunk size.
+
+    Args:
+        trace: Anything CompactTrace.open accepts, or an iterable of
+            CompactTrace chunks such as a ChunkedTrace
+        n_points (int): Number of time series points
+    """
+    if isinstance(trace, (str, os.PathLike, CompactTrace)):
+        trace = [CompactTrace.open(trace)]
+
+    # Equal-width time windows over the trace span. perf synthesizes header
+    # records (ID_INDEX, CPU_MAP, ...) with timestamp 0; they go into the
+    # first window instead of stretching the span back to the epoch.
+    n_events, first, last = 0, None, None
+    for chunk in trace:
+        n_events += len(chunk)
+        timed = chunk.timestamp[chunk.timestamp > 0]
+        if len(timed):
+            first = int(timed.min()) if first is None else min(first, int(timed.min()))
+            last = int(timed.max()) if last is None else max(last, int(timed.max()))
+    start = first or 0
+    span = max(last - start, 1) if last is not None else 1
+
+    detected = detect_phases(trace, window_events=max(n_events // (4 * n_points), 1))
+    counts = DashboardCounts(start, span, n_points, phase_boundaries(detected))
+    for chunk in trace:
+        counts.update(chunk)
+    return counts.aggregates()
+
+def export_dashboard_aggregates(trace, output_file, n_points=50):
+    """Write the dashboard aggregates as compact JSON. Returns the byte size."""
+    aggregates = build_dashboard_aggregates(trace, n_points)
+    text = json.dumps(aggregates, separators=(',', ':'))
+    with open(output_file, 'w', encoding='utf-8') as file:
+        file.write(text)
+    return len(text)
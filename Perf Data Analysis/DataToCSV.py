@@ -1,47 +1,114 @@
 import pandas as pd
 import os
+import sys
 import time
+from CompressedInput import open_dump
+from SchemaValidation import Quarantine, infer_timestamp_unit, validate
 
-# Input and output file paths
-input_file = r"\\wsl.localhost\Ubuntu\home\iftikher\perf_output.txt"
-output_file = "C:/Users/izcin\OneDrive/Documents/GitHub/Prefetching-Pattern-Tracker/perf_output.csv"
-
-# To keep track of the last read position
-last_position = 0
-
-# Check if CSV exists; if not, initialize it with headers
-if not os.path.exists(output_file):
-    pd.DataFrame(columns=["Timestamp", "Address", "Event"]).to_csv(output_file, index=False)
-
-# Function to process new lines and append them to the CSV file
-def process_new_lines():
-    global last_position
-    
-    new_data = []  # List to store parsed rows
-    with open(input_file, "r") as file:
-        file.seek(last_position)  # Move to the last read position
-        for line in file:
-            parts = line.strip().split()
-            if len(parts) >= 3:
-                timestamp = parts[0].replace(":", "")
-                event = parts[1]
-                address = parts[2]
-                new_data.append([timestamp, address, event])
-        
-        # Update the last position
-        last_position = file.tell()
-
-    # Append new data to the existing CSV
-    if new_data:
-        df = pd.DataFrame(new_data, columns=["Timestamp", "Address", "Event"])
-        df.to_csv(output_file, mode='a', header=False, index=False)
-        print(f"Added {len(new_data)} new rows to {output_file}")
+COLUMNS = {"Timestamp": "timestamp", "Address": "address", "Event": "event_type"}
+
+class CSVTailer:
+    """
+    Appends the `timestamp: event address` lines of a growing perf output
+    to a CSV, one poll at a time.
+
+    State carried between polls: an unterminated last line is held back
+    until the rest of it has been written, and the timestamp unit is
+    decided by the first batch with a valid timestamp, so every later
+    batch is validated the same way.
+    """
+    def __init__(self, output_file, quarantine=None):
+        """
+        Args:
+            output_file (str): CSV the clean rows are appended to
+            quarantine (Quarantine): Optional SchemaValidation.Quarantine
+                receiving rejected rows
+        """
+        self.output_file = output_file
+        self.quarantine = quarantine
+        self.timestamp_unit = None
+        self._partial = b''
+
+    def process_new_lines(self, input_stream):
+        """
+        Append the complete lines read from `input_stream` to the CSV.
+
+        Lines are split into three tokens and then validated as one batch;
+        rows that are not `timestamp: event address` samples (headers, hex
+        dump lines, ...) are left out of the CSV and recorded in the
+        quarantine when there is one.
+
+        Returns:
+            int: Rows appended
+        """
+        new_data = []  # List to store parsed rows
+        try:
+            for line in input_stream:
+                line = self._partial + line
+                if not line.endswith(b'\n'):
+                    # The writer is still in the middle of this line
+                    self._partial = line
+                    break
+                self._partial = b''
+                parts = line.decode("utf-8", errors="replace").strip().split()
+                if len(parts) >= 3:
+                    timestamp = parts[0].replace(":", "")
+                    event = parts[1]
+                    address = parts[2]
+                    new_data.append([timestamp, address, event])
+        except EOFError:
+            pass  # Compressed dump is still being written; continue next time
+
+        # Append new data to the existing CSV
+        if not new_data:
+            return 0
+        df = pd.DataFrame(new_data, columns=list(COLUMNS))
+        batch = df.rename(columns=COLUMNS)
+        if self.timestamp_unit is None:
+            self.timestamp_unit = infer_timestamp_unit(batch)
+        _, reasons = validate(batch, timestamp_unit=self.timestamp_unit)
+        if self.quarantine is not None:
+            self.quarantine.add(df, reasons)
+        df = df[reasons == 0]
+        df.to_csv(self.output_file, mode='a', header=False, index=False)
+        print(f"Added {len(df)} new rows to {self.output_file} ({len(new_data) - len(df)} rejected)")
+        return len(df)
 
 # Continuously monitor the input file for new data
-try:
-    print("Monitoring perf_output.txt for updates... Press Ctrl+C to stop.")
-    while True:
-        process_new_lines()
-        time.sleep(1)  # Check every second for updates
-except KeyboardInterrupt:
-    print("Monitoring stopped.")
+def monitor(input_file, output_file, interval=1.0, quarantine_file=None):
+    """
+    Follow `input_file` and append every new `timestamp: event address`
+    line to `output_file` until interrupted. Lines that fail validation
+    go to `quarantine_file` instead, if given.
+
+    The input stream stays open between polls so a compressed dump is
+    decompressed only once; new lines are picked up where the last read
+    ended.
+    """
+    # Check if CSV exists; if not, initialize it with headers
+    if not os.path.exists(output_file):
+        pd.DataFrame(columns=list(COLUMNS)).to_csv(output_file, index=False)
+
+    quarantine = Quarantine(quarantine_file) if quarantine_file else None
+    tailer = CSVTailer(output_file, quarantine)
+    input_stream = open_dump(input_file)
+    try:
+        print(f"Monitoring {input_file} for updates... Press Ctrl+C to stop.")
+        while True:
+            tailer.process_new_lines(input_stream)
+            time.sleep(interval)  # Check for updates periodically
+    except KeyboardInterrupt:
+        print("Monitoring stopped.")
+        if quarantine is not None:
+            print('\n'.join(quarantine.summary()))
+    finally:
+        input_stream.close()
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python DataToCSV.py <perf_output.txt> <output.csv>")
+        sys.exit(1)
+    monitor(sys.argv[1], sys.argv[2])
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,29 @@
+import argparse
+import functools
+import os
 import pandas as pd
 import re
+import sys
+import tempfile
+from operator import itemgetter
 from datetime import datetime
 import logging
+from DashboardExport import export_dashboard_aggregates
+from CompactTrace import CompactTrace
+from CompressedInput import open_dump
+from OutOfCore import ChunkedTrace, SummaryStats
+from ShardMerge import merge_streams
 
 class PerfDataProcessor:
     def __init__(self, input_file, output_file):
+        """
+        Args:
+            input_file (str or list): Perf text dump, or several dumps
+                (e.g. one per CPU or session) to merge by timestamp
+            output_file (str): CSV written by process_perf_output
+        """
         self.input_file = input_file
+        self.input_files = list(input_file) if isinstance(input_file, (list, tuple)) else [input_file]
         self.output_file = output_file
         self.setup_logging()
         
@@ -17,8 +35,15 @@ class PerfDataProcessor:
         )
         self.logger = logging.getLogger(__name__)
 
-    def parse_event_record(self, lines):
-        """Parse a single event record from perf output."""
+    def parse_event_record(self, lines, raw_offset=None, raw_length=None, shard_id=0):
+        """
+        Parse a single event record from perf output.
+
+        The record's raw hex dump is not copied into the output; only its
+        byte offset and length in the source dump are kept so that
+        RawRecordReader can fetch it on demand; `shard_id` is the index of
+        that dump among the processor's inputs.
+        """
         event_data = {
             'timestamp': None,
             'address': None,
@@ -26,15 +51,24 @@ class PerfDataProcessor:
             'event_size': None,
             'thread_id': None,
             'process_id': None,
-            'raw_data': None,
+            'raw_offset': raw_offset,
+            'raw_length': raw_length,
+            'shard_id': shard_id,
             'dso': None,
             'period': None,
             'ip_address': None,
+            'weight': None,
+            'data_src': None,
             'event_specific_data': None
         }
         
-        # First line contains basic event information
-        header_match = re.match(r'(\d+)\s+(0x[0-9a-f]+)\s+\[(0x[0-9a-f]+)\]:\s*(.*)', lines[0])
+        # The decoded header line contains basic event information; it follows
+        # the raw hex dump when the record starts with one
+        header_match = None
+        for line in lines:
+            header_match = re.match(r'(\d+)\s+(0x[0-9a-f]+)\s+\[(0x[0-9a-f]+)\]:\s*(.*)', line)
+            if header_match:
+                break
         if header_match:
             event_data['timestamp'] = int(header_match.group(1)) if header_match.group(1) != '.' else None
             event_data['address'] = header_match.group(2)
@@ -57,78 +91,208 @@ class PerfDataProcessor:
         if period_match:
             event_data['period'] = int(period_match.group(1))
 
+        # Parse sampled latency and memory data source, present when the
+        # samples were recorded with them (perf mem / perf record -d -W)
+        weight_match = re.search(r'\bweight:\s*(\d+)', '\n'.join(lines))
+        if weight_match:
+            event_data['weight'] = int(weight_match.group(1))
+        data_src_match = re.search(r'data_src:\s*(0x[0-9a-f]+)', '\n'.join(lines))
+        if data_src_match:
+            event_data['data_src'] = data_src_match.group(1)
+
         # Parse IP address
         ip_match = re.search(r'IP.*?:\s*(0x[0-9a-f]+)', '\n'.join(lines))
         if ip_match:
             event_data['ip_address'] = ip_match.group(1)
 
-        # Store raw event data if present
-        raw_data_lines = [line.strip() for line in lines if 'raw event:' in line or line.strip().startswith('.')]
-        if raw_data_lines:
-            event_data['raw_data'] = '\n'.join(raw_data_lines)
-
         return event_data
 
-    def process_perf_output(self):
-        """Process the entire perf output file and convert to structured data."""
-        self.logger.info(f"Starting to process {self.input_file}")
-        
-        events_data = []
+    def iter_events(self):
+        """
+        Parse the input, yielding one event dict per record.
+
+        Several inputs are merged into a single timestamp-ordered stream;
+        each shard is expected to be in time order itself, and keeps a
+        bounded number of parsed events in flight. On multi-core machines
+        every shard is parsed in its own process. Records without a
+        timestamp (synthesized headers) stay next to the record before
+        them in their shard.
+        """
+        if len(self.input_files) == 1:
+            yield from self.iter_shard_events(self.input_files[0])
+            return
+        processes = (os.cpu_count() or 1) > 1
+        shards = [
+            functools.partial(self.iter_shard_events, path, shard_id) if processes
+            else self.iter_shard_events(path, shard_id)
+            for shard_id, path in enumerate(self.input_files)
+        ]
+        yield from merge_streams(shards, key=itemgetter('timestamp'), processes=processes)
+
+    def iter_shard_events(self, input_file, shard_id=0):
+        """Parse one perf output file, yielding one event dict per record."""
         current_event_lines = []
+        record_start = 0
+        record_end = 0
+        position = 0
+        awaiting_decoded = False
         
-        with open(self.input_file, 'r') as file:
-            for line in file:
-                line = line.strip()
+        # Read in binary mode so byte offsets into the dump stay exact;
+        # compressed dumps are decompressed as a stream and the offsets
+        # refer to the decompressed text
+        with open_dump(input_file) as file:
+            for raw_line in file:
+                line_start = position
+                position += len(raw_line)
+                line = raw_line.decode('utf-8', errors='replace').strip()
                 
                 # Skip empty lines and comments
                 if not line or line.startswith('#'):
                     continue
                 
-                # New event starts with a timestamp or address
-                if re.match(r'^(\d+|\.)\s+0x', line) or re.match(r'^0x', line):
+                # A record opens with its raw dump header ("0x... [0x...]: event: N")
+                # or, when no dump precedes it, with the decoded "<timestamp> 0x..."
+                # line. The decoded line right after a dump belongs to that record.
+                if re.match(r'^0x', line):
+                    starts_record = True
+                    awaiting_decoded = True
+                elif re.match(r'^(\d+|\.)\s+0x', line):
+                    starts_record = not awaiting_decoded
+                    awaiting_decoded = False
+                else:
+                    starts_record = False
+                
+                if starts_record:
                     if current_event_lines:
-                        events_data.append(self.parse_event_record(current_event_lines))
+                        yield self.parse_event_record(
+                            current_event_lines, record_start, record_end - record_start, shard_id)
                     current_event_lines = [line]
+                    record_start = line_start
                 else:
                     current_event_lines.append(line)
+                record_end = position
             
             # Process the last event
             if current_event_lines:
-                events_data.append(self.parse_event_record(current_event_lines))
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(events_data)
-        
-        # Add derived columns
-        df['timestamp_readable'] = pd.to_datetime(df['timestamp'], unit='ns')
-        df['address_numeric'] = df['address'].apply(lambda x: int(x, 16) if pd.notnull(x) and isinstance(x, str) else None)
-        
-        # Save to CSV with all columns
-        df.to_csv(self.output_file, index=False)
-        self.logger.info(f"Processed data saved to {self.output_file}")
-        
-        # Print summary statistics
-        self.print_summary_stats(df)
-        
-        return df
+                yield self.parse_event_record(
+                    current_event_lines, record_start, record_end - record_start, shard_id)
+
+    def process_perf_output(self, dashboard_json=None, n_points=50, chunk_events=1_000_000):
+        """
+        Process the entire perf output file and convert to structured data.
+
+        The CSV is written in batches of `chunk_events` events through the
+        chunked path, which keeps the parsed chunks in a temporary directory
+        for the dashboard export; neither the events nor a DataFrame of the
+        whole trace are held in memory at once.
+
+        Args:
+            dashboard_json (str): Also export the web dashboard aggregates
+                to this file
+            n_points (int): Time series points of the dashboard export
+            chunk_events (int): Events per CSV batch and chunk
+        """
+        with tempfile.TemporaryDirectory(prefix='perf-chunks-') as directory:
+            chunked = self.process_perf_output_chunked(directory, chunk_events, csv_file=self.output_file)
+            self.logger.info(f"Processed data saved to {self.output_file}")
+            if dashboard_json:
+                self.export_dashboard_aggregates(chunked, dashboard_json, n_points)
     
-    def print_summary_stats(self, df):
-        """Print summary statistics about the processed data."""
-        self.logger.info("\nData Processing Summary:")
-        self.logger.info(f"Total events processed: {len(df)}")
-        self.logger.info(f"Unique event types: {df['event_type'].nunique()}")
-        self.logger.info("\nEvent type distribution:")
-        for event_type, count in df['event_type'].value_counts().items():
-            self.logger.info(f"  {event_type}: {count}")
-        self.logger.info(f"\nTime range: {df['timestamp_readable'].min()} to {df['timestamp_readable'].max()}")
-        self.logger.info(f"Number of unique addresses: {df['address'].nunique()}")
+    def process_perf_output_chunked(self, output_dir, chunk_events=1_000_000, sample_events=100_000,
+                                    csv_file=None):
+        """
+        Out-of-core variant of process_perf_output for dumps larger than RAM.
+
+        Parsed events are written as CompactTrace chunks of at most
+        `chunk_events` events to `output_dir` as soon as each chunk fills
+        up, so peak memory is set by the chunk size rather than the trace
+        length. The summary is computed from mergeable per-chunk statistics.
+
+        A pending chunk is held as one list per field rather than one dict
+        per event, which would cost several hundred bytes of dict overhead
+        per event before any values. Every chunk also streams through a
+        reservoir sampler, so a uniform sample of `sample_events` events of
+        the whole dump is saved with the chunks (ChunkedTrace.sample).
+
+        With `csv_file`, every chunk is also appended to that CSV, with the
+        same columns process_perf_output has always written.
+
+        Returns:
+            ChunkedTrace: The written chunks
+        """
+        self.logger.info(f"Starting to process {self.input_file} into chunks in {output_dir}")
+        summary = SummaryStats()
+        csv_header = True
+
+        def flush(columns):
+            nonlocal csv_header
+            # Object columns keep the parsed ints exact; with gaps (None)
+            # pandas would store them as float64, which rounds nanosecond
+            # timestamps. The raw dump prints nanoseconds.
+            frame = pd.DataFrame({name: pd.Series(values, dtype=object) for name, values in columns.items()})
+            chunk = CompactTrace.from_frame(frame, timestamp_unit='ns')
+            writer.add(chunk)
+            summary.update(chunk)
+            if csv_file:
+                frame['timestamp_readable'] = pd.to_datetime(frame['timestamp'], unit='ns')
+                frame['address_numeric'] = frame['address'].apply(
+                    lambda x: int(x, 16) if pd.notnull(x) and isinstance(x, str) else None)
+                frame.to_csv(csv_file, mode='w' if csv_header else 'a', header=csv_header, index=False)
+                csv_header = False
+
+        with ChunkedTrace.create(output_dir, sample_events) as writer:
+            columns = None
+            pending = 0
+            for event in self.iter_events():
+                if columns is None:
+                    columns = {name: [] for name in event}
+                for name, values in columns.items():
+                    values.append(event[name])
+                pending += 1
+                if pending >= chunk_events:
+                    flush(columns)
+                    columns = {name: [] for name in columns}
+                    pending = 0
+            if pending:
+                flush(columns)
+        self.logger.info(f"Wrote {len(writer.chunks)} chunks to {output_dir}")
+        sample = writer.sample()
+        self.logger.info(f"Reservoir sample of {len(sample)} events ({sample.describe()}) "
+                         f"saved to {os.path.join(output_dir, ChunkedTrace.SAMPLE)}")
         
+        self.logger.info("\nData Processing Summary:")
+        for line in summary.lines():
+            self.logger.info(line)
+        return ChunkedTrace(output_dir)
+
+    def export_dashboard_aggregates(self, trace, output_file, n_points=50):
+        """
+        Export the pre-shaped aggregates the Next.js dashboard renders.
+
+        The file holds only chart points (time series, library and event
+        distributions, summary metrics), so its size depends on `n_points`
+        rather than on the number of events in the trace. `trace` is a
+        CompactTrace or a ChunkedTrace, which is aggregated chunk by chunk.
+        """
+        size = export_dashboard_aggregates(trace, output_file, n_points)
+        self.logger.info(f"Dashboard aggregates ({size} bytes) saved to {output_file}")
+
+# Where the Next.js dashboard serves its aggregates from
+DASHBOARD_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                              'memory-analysis-dashboard', 'public', 'dashboard_aggregates.json')
+
 def main():
+    parser = argparse.ArgumentParser(description='Convert perf report -D dumps to CSV')
+    parser.add_argument('inputs', nargs='+', help='perf dump, or several shards to merge by timestamp')
+    parser.add_argument('-o', '--output', default='perf_output_enhanced.csv', help='enhanced CSV to write')
+    parser.add_argument('--dashboard-json', default=DASHBOARD_JSON,
+                        help='web dashboard aggregates to write (default: the dashboard\'s public/)')
+    args = parser.parse_args()
     processor = PerfDataProcessor(
-        input_file=r"\\wsl.localhost\Ubuntu\home\iftikher\perf_output.txt",
-        output_file="perf_output_enhanced.csv"
+        input_file=args.inputs if len(args.inputs) > 1 else args.inputs[0],
+        output_file=args.output
     )
-    df = processor.process_perf_output()
+    processor.process_perf_output(dashboard_json=args.dashboard_json)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
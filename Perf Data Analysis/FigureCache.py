@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import plotly.io as pio
+
+class FigureCache:
+    """
+    Two-tier cache for rendered Plotly figures.
+
+    Figures are keyed by (dataset fingerprint, view, time range, view
+    parameters) and stored as plain JSON-compatible dicts, which Dash
+    callbacks can return as-is.
+
+    - The in-process tier is an LRU bounded by the serialized size of the
+      figures it holds; a hit is a dictionary lookup.
+    - The optional on-disk tier is a directory of JSON files shared by every
+      Dash worker process pointed at it. It is also bounded by total size,
+      evicting the least recently used files first. Writes go through a
+      temporary file and an atomic rename so concurrent workers never see a
+      partial entry.
+
+    Sizes are the UTF-8 encoded bytes of the JSON. Each process keeps a
+    running total of the directory size, taken from one scan at startup
+    and updated by its own writes; the directory is only rescanned once
+    that total passes the budget, and eviction then goes down to
+    DISK_LOW_WATER of the budget so the next writes do not rescan again.
+    Files other workers wrote since the last scan are only counted at the
+    next rescan.
+    """
+    # Fraction of max_disk_bytes that eviction shrinks the directory to
+    DISK_LOW_WATER = 0.9
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_dir=None, max_disk_bytes=2 * 1024 ** 3):
+        """
+        Args:
+            max_bytes (int): Size budget of the in-process tier
+            disk_dir (str): Directory for the shared on-disk tier (None disables it)
+            max_disk_bytes (int): Size budget of the on-disk tier
+        """
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir
+        self.entries = OrderedDict()   # key -> (figure dict, size in bytes)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.disk_size = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.disk_size = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def make_key(*parts):
+        """Stable digest of the key parts (any JSON-serializable values)."""
+        text = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get_or_create(self, key_parts, build, serialize=None):
+        """
+        Return the cached figure for `key_parts`, building and caching it
+        with `build()` on a miss.
+
+        Args:
+            key_parts (tuple): Parts of the cache key
+            build (callable): Renders the figure
+            serialize (callable): Figure -> UTF-8 JSON bytes, e.g.
+                FigurePayload.fit_budget; defaults to plain serialization
+        """
+        key = self.make_key(*key_parts)
+        figure = self.get(key)
+        if figure is None:
+            self.misses += 1
+            figure = self.put(key, build(), serialize)
+        else:
+            self.hits += 1
+        return figure
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry[0]
+
+        data = self._disk_read(key)
+        if data is None:
+            return None
+        figure = json.loads(data)
+        self._memory_put(key, figure, len(data))
+        return figure
+
+    def put(self, key, figure, serialize=None):
+        """
+        Store a figure (plotly Figure or dict); returns the cached dict.
+        `serialize` produces its JSON bytes (see get_or_create).
+        """
+        if serialize is None:
+            data = pio.to_json(figure, validate=False).encode('utf-8')
+        else:
+            data = serialize(figure)
+        figure = json.loads(data)
+        self._memory_put(key, figure, len(data))
+        self._disk_write(key, data)
+        return figure
+
+    def _memory_put(self, key, figure, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (figure, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.json')
+
+    def _disk_read(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        # Refresh the access time used for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def _disk_write(self, key, data):
+        if not self.disk_dir or len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.disk_size += len(data) - replaced
+            if self.disk_size > self.max_disk_bytes:
+                self._disk_evict()
+
+    def _disk_entries(self):
+        """(mtime, size, path) of every cached file in the directory."""
+        entries = []
+        with os.scandir(self.disk_dir) as scan:
+            for entry in scan:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Removed by another worker
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _disk_evict(self):
+        """
+        Rescan the directory and delete least recently used files until it
+        fits DISK_LOW_WATER of its budget.
+        """
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * self.DISK_LOW_WATER
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.disk_size = total
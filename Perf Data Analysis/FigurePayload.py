@@ -0,0 +1,184 @@
+"""
+Helpers for building Plotly figures whose JSON payload stays small.
+
+Dash ships every figure to the browser as JSON, and what dominates its
+size is how the data is handed to Plotly:
+
+- numpy arrays are serialized as base64 typed arrays ({"dtype", "bdata"}),
+  Python lists as one JSON number or string per element. `typed` turns
+  columns into compact numpy arrays (integral values as integers, which
+  plotly.py narrows to the smallest width; other floats as float32 unless
+  exact values are needed).
+- `histogram_bars` bins on the server and sends one bar per bin instead of
+  every point for the browser to bin.
+- `scatter` switches to WebGL (Scattergl) above WEBGL_THRESHOLD points.
+- `fold_rows` sums consecutive heatmap rows into bands so that rows x
+  columns fits the payload budget, and `thin_ticks` keeps at most
+  MAX_TICKS axis labels.
+
+`fit_budget` serializes a figure once and, when the JSON exceeds the
+budget, folds its heatmaps and thins its point traces until it fits.
+FigureCache takes it as its serializer, so the cached JSON is the
+measured one and figures are not serialized a second time to be checked.
+"""
+import logging
+import math
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Per-figure payload budget in bytes
+PAYLOAD_BUDGET = 1024 * 1024
+# Points per trace above which scatter() uses WebGL
+WEBGL_THRESHOLD = 10_000
+# Labelled ticks per axis
+MAX_TICKS = 20
+# Serialized bytes per heatmap cell (4-byte typed value, base64) and per
+# row label, for sizing heatmaps to a budget
+CELL_BYTES = 6
+LABEL_BYTES = 24
+# Shrink-and-reserialize rounds fit_budget tries before giving up
+MAX_FIT_ROUNDS = 3
+
+logger = logging.getLogger(__name__)
+
+def typed(values, exact=False):
+    """
+    Numeric column as the most compact numpy array that draws the same.
+
+    Args:
+        values (array-like): Numbers
+        exact (bool): Keep float64 precision (addresses, bin edges);
+            otherwise non-integral floats become float32
+
+    Returns:
+        np.ndarray: Integral values as int64 (plotly.py narrows them
+            further), other floats as float32 or float64
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != 'f' or len(values) == 0:
+        return values
+    finite = np.isfinite(values)
+    if finite.all() and np.all(values == np.round(values)) and np.abs(values).max() < 2 ** 53:
+        return values.astype(np.int64)
+    return values if exact else values.astype(np.float32)
+
+def histogram_bars(values, edges, weights=None, **kwargs):
+    """
+    Histogram binned here and drawn as bars, so the payload holds one value
+    per bin rather than every point.
+
+    Args:
+        values (np.ndarray): Values to bin
+        edges (np.ndarray): Bin edges
+        weights (np.ndarray): Optional per-value weights (sampled data)
+        **kwargs: Further go.Bar properties (name, opacity, hovertemplate, ...)
+
+    Returns:
+        go.Bar: Bars centred on the bins, each as wide as its bin
+    """
+    counts, edges = np.histogram(values, bins=edges, weights=weights)
+    return go.Bar(
+        x=typed((edges[:-1] + edges[1:]) / 2, exact=True),
+        y=typed(counts),
+        width=typed(np.diff(edges), exact=True),
+        **kwargs
+    )
+
+def scatter(x, y, **kwargs):
+    """
+    go.Scatter for small traces, go.Scattergl above WEBGL_THRESHOLD points.
+    Stacked and filled traces stay SVG, which WebGL cannot draw.
+    """
+    x, y = typed(x, exact=True), typed(y)
+    webgl = len(x) > WEBGL_THRESHOLD and 'stackgroup' not in kwargs and 'fill' not in kwargs
+    return (go.Scattergl if webgl else go.Scatter)(x=x, y=y, **kwargs)
+
+def max_heatmap_rows(n_columns, budget=PAYLOAD_BUDGET):
+    """Rows a heatmap with `n_columns` columns can have within `budget`."""
+    return max(1, budget // (max(n_columns, 1) * CELL_BYTES + LABEL_BYTES))
+
+def fold_rows(z, max_rows):
+    """
+    Sum runs of consecutive rows so that at most `max_rows` remain.
+
+    Returns:
+        tuple: (folded z, first original row of every band, rows per band)
+    """
+    z = np.asarray(z)
+    rows_per_band = max(1, math.ceil(len(z) / max_rows))
+    starts = np.arange(0, len(z), rows_per_band)
+    if rows_per_band > 1:
+        z = np.add.reduceat(z, starts, axis=0)
+    return z, starts, rows_per_band
+
+def thin_ticks(positions, labels, max_ticks=MAX_TICKS):
+    """Evenly spaced subset of at most `max_ticks` tick positions and labels."""
+    step = max(1, math.ceil(len(positions) / max_ticks))
+    return list(positions[::step]), list(labels[::step])
+
+def to_json(figure):
+    """The figure's JSON as Dash sends it, UTF-8 encoded."""
+    return pio.to_json(figure, validate=False).encode('utf-8')
+
+def shrink(figure, factor):
+    """
+    Reduce a figure's data about `factor`-fold, in place.
+
+    Heatmaps sum runs of `factor` rows into bands labelled by their first
+    row (re-thinning explicit y ticks); scatter traces keep every
+    `factor`-th point. Bars and pies are already aggregated and stay.
+
+    Returns:
+        bool: Whether anything was reduced
+    """
+    shrunk = False
+    for trace in figure.data:
+        if trace.type == 'heatmap' and trace.z is not None and len(trace.z) > 1:
+            z, starts, _ = fold_rows(trace.z, math.ceil(len(trace.z) / factor))
+            trace.z = typed(z)
+            if trace.y is not None and len(trace.y) > len(starts):
+                labels = [trace.y[i] for i in starts]
+                trace.y = labels
+                axis = figure.layout['yaxis' + (trace.yaxis or 'y')[1:]]
+                if axis.tickmode == 'array':
+                    axis.tickvals, axis.ticktext = thin_ticks(np.arange(len(labels)), labels)
+            shrunk = True
+        elif trace.type in ('scatter', 'scattergl') and trace.x is not None and len(trace.x) > 1:
+            n_points = len(trace.x)
+            for field in ('x', 'y', 'customdata', 'text'):
+                values = trace[field]
+                if values is not None and not isinstance(values, str) and len(values) == n_points:
+                    trace[field] = values[::factor]
+            shrunk = True
+    return shrunk
+
+def fit_budget(figure, name, budget=PAYLOAD_BUDGET):
+    """
+    Serialize a figure, shrinking it first when its JSON exceeds `budget`.
+
+    Within budget, the figure is serialized exactly once. Otherwise it is
+    shrunk by the ratio of its size to the budget and serialized again,
+    for at most MAX_FIT_ROUNDS rounds.
+
+    Args:
+        figure (go.Figure): Figure to send; modified in place when shrunk
+        name (str): View name for the log
+        budget (int): Payload budget in bytes
+
+    Returns:
+        bytes: The (possibly shrunk) figure's JSON
+    """
+    data = to_json(figure)
+    original = len(data)
+    for _ in range(MAX_FIT_ROUNDS):
+        if len(data) <= budget or not shrink(figure, math.ceil(len(data) / budget)):
+            break
+        data = to_json(figure)
+    if len(data) > budget:
+        logger.warning(f"Figure '{name}' is {len(data) / 1024:.0f} KiB, over its {budget / 1024:.0f} KiB budget")
+    elif len(data) < original:
+        logger.info(f"Figure '{name}' shrunk from {original / 1024:.0f} KiB to {len(data) / 1024:.0f} KiB")
+    else:
+        logger.debug(f"Figure '{name}' is {len(data) / 1024:.0f} KiB")
+    return data
@@ -0,0 +1,287 @@
+import numpy as np
+import pandas as pd
+from CompactTrace import CompactTrace
+
+class SpaceSaving:
+    """
+    Space-Saving top-K summary with a fixed number of counters.
+
+    Each monitored key has a count that overestimates its true weight by at
+    most its recorded error, and any key that is not monitored has a true
+    weight of at most `floor` (the smallest monitored count once the
+    summary is full). Both are bounded by total / capacity, so with
+    capacity k every key heavier than total / k is guaranteed to be present.
+
+    Updates take whole batches: the batch is counted exactly and merged
+    into the summary the same way two Space-Saving summaries are merged,
+    which keeps the guarantees of the one-at-a-time algorithm. Keys can be
+    any numpy dtype np.unique can sort, including structured dtypes for
+    compound keys such as (IP, page) pairs.
+    """
+    def __init__(self, capacity=1024, dtype=np.uint64):
+        """
+        Args:
+            capacity (int): Number of counters (memory is O(capacity))
+            dtype: Key dtype
+        """
+        self.capacity = capacity
+        self.keys = np.zeros(0, dtype=dtype)
+        self.counts = np.zeros(0)
+        self.errors = np.zeros(0)
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def floor(self):
+        """Upper bound on the weight of any key that is not monitored."""
+        return float(self.counts.min()) if len(self.keys) >= self.capacity else 0.0
+
+    def update(self, keys, weights=None):
+        """Add a batch of keys (with optional per-key weights)."""
+        if len(keys) == 0:
+            return
+        batch_keys, inverse = np.unique(keys, return_inverse=True)
+        batch_counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(batch_keys))
+        self.total += float(batch_counts.sum())
+        # An exact count is a summary with no error and nothing left out
+        self._merge(batch_keys, batch_counts, np.zeros(len(batch_keys)), 0.0)
+
+    def merge(self, other):
+        """Fold another summary (e.g. from another shard) into this one."""
+        self.total += other.total
+        self._merge(other.keys, other.counts, other.errors, other.floor)
+
+    def _merge(self, keys, counts, errors, floor):
+        own_floor = self.floor
+        n_own = len(self.keys)
+        merged, inverse = np.unique(np.concatenate((self.keys, keys)), return_inverse=True)
+        inverse = inverse.ravel()
+        size = len(merged)
+        in_own = np.bincount(inverse[:n_own], minlength=size) > 0
+        in_other = np.bincount(inverse[n_own:], minlength=size) > 0
+        total = np.bincount(inverse, weights=np.concatenate((self.counts, counts)), minlength=size)
+        error = np.bincount(inverse, weights=np.concatenate((self.errors, errors)), minlength=size)
+        # A key missing from one side may have had up to that side's floor there
+        total += np.where(in_own, 0.0, own_floor) + np.where(in_other, 0.0, floor)
+        error += np.where(in_own, 0.0, own_floor) + np.where(in_other, 0.0, floor)
+
+        if size > self.capacity:
+            keep = np.argpartition(total, size - self.capacity)[size - self.capacity:]
+            keep.sort()
+            merged, total, error = merged[keep], total[keep], error[keep]
+        self.keys, self.counts, self.errors = merged, total, error
+
+    def scale(self, factor):
+        """Multiply all weights by `factor` (used for exponential decay)."""
+        self.counts = self.counts * factor
+        self.errors = self.errors * factor
+        self.total *= factor
+
+    def top(self, n=None):
+        """
+        The `n` heaviest monitored keys, heaviest first.
+
+        Returns:
+            tuple: (keys, counts, errors); counts - errors is a guaranteed
+                lower bound on each key's true weight
+        """
+        order = np.argsort(self.counts, kind='stable')[::-1][:n]
+        return self.keys[order], self.counts[order], self.errors[order]
+
+class CountMinSketch:
+    """
+    Count-Min sketch for point estimates of arbitrary keys.
+
+    With width w and depth d an estimate exceeds the true weight by more
+    than e / w * total with probability at most exp(-d), and never
+    underestimates it. Sketches built with the same shape and seed can be
+    merged by adding their tables.
+    """
+    def __init__(self, width=16384, depth=4, seed=0):
+        """
+        Args:
+            width (int): Counters per row, rounded up to a power of two
+            depth (int): Independent hash rows
+            seed (int): Hash seed; only sketches with equal seeds merge
+        """
+        self.bits = max(int(np.ceil(np.log2(width))), 1)
+        self.width = 1 << self.bits
+        self.depth = depth
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, one per row
+        self.multipliers = rng.integers(1, 2 ** 63, depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.offsets = rng.integers(0, 2 ** 63, depth, dtype=np.uint64)
+        self.table = np.zeros((depth, self.width))
+        self.total = 0.0
+
+    @classmethod
+    def from_error(cls, epsilon=1e-4, delta=1e-3, seed=0):
+        """Size the sketch so the overestimate is <= epsilon * total with probability 1 - delta."""
+        return cls(width=int(np.ceil(np.e / epsilon)), depth=int(np.ceil(np.log(1 / delta))), seed=seed)
+
+    @property
+    def epsilon(self):
+        return np.e / self.width
+
+    def _buckets(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        shift = np.uint64(64 - self.bits)
+        return [((keys * a + b) >> shift).astype(np.int64) for a, b in zip(self.multipliers, self.offsets)]
+
+    def update(self, keys, weights=None):
+        if len(keys) == 0:
+            return
+        for row, buckets in enumerate(self._buckets(keys)):
+            self.table[row] += np.bincount(buckets, weights=weights, minlength=self.width)
+        self.total += float(np.sum(weights)) if weights is not None else len(keys)
+
+    def estimate(self, keys):
+        """Upper-biased weight estimates of `keys`."""
+        return np.min([self.table[row, buckets] for row, buckets in enumerate(self._buckets(keys))], axis=0)
+
+    def merge(self, other):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("Count-Min sketches differ in shape or seed and cannot be merged")
+        self.table += other.table
+        self.total += other.total
+
+    def scale(self, factor):
+        self.table *= factor
+        self.total *= factor
+
+# Key dtype of (IP, page) pairs
+IP_PAGE_DTYPE = np.dtype([('ip', np.uint64), ('page', np.uint64)])
+
+class HeavyHitterTracker:
+    """
+    Fixed-memory tracking of the hottest pages, cache lines, IPs and
+    (IP, page) pairs of a trace.
+
+    Every kind has a Space-Saving summary for its top-K list and a
+    Count-Min sketch for point queries of arbitrary keys, so memory depends
+    only on `capacity` and the sketch shape, never on the number of
+    distinct addresses.
+
+    With `half_life_ns` set, weights decay exponentially with event age,
+    so the summaries describe what is hot right now rather than over the
+    whole run; this is the variant the live dashboard uses.
+    """
+    KINDS = ('page', 'line', 'ip', 'ip_page')
+
+    def __init__(self, capacity=1024, half_life_ns=None, sketch_width=16384, sketch_depth=4,
+                 page_size=CompactTrace.PAGE_SIZE, line_size=CompactTrace.CACHE_LINE_SIZE):
+        """
+        Args:
+            capacity (int): Space-Saving counters per kind
+            half_life_ns (int): Decay half-life in nanoseconds (None: no decay)
+            sketch_width, sketch_depth (int): Count-Min shape per kind
+        """
+        self.capacity = capacity
+        self.half_life_ns = half_life_ns
+        self.page_size = np.uint64(page_size)
+        self.line_size = np.uint64(line_size)
+        self.summaries = {
+            kind: SpaceSaving(capacity, IP_PAGE_DTYPE if kind == 'ip_page' else np.uint64)
+            for kind in self.KINDS
+        }
+        self.sketches = {
+            kind: CountMinSketch(sketch_width, sketch_depth, seed=i)
+            for i, kind in enumerate(self.KINDS)
+        }
+        self.now = None
+
+    def update(self, timestamp, address, ip=None, weights=None):
+        """
+        Add a batch of events (parallel arrays in roughly time order).
+
+        Args:
+            weights (np.ndarray): Optional per-event weights, e.g. the
+                inverse inclusion probabilities of a sample
+        """
+        if len(address) == 0:
+            return
+        address = np.asarray(address, dtype=np.uint64)
+        weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+        if self.half_life_ns:
+            # Express every weight relative to the newest event seen
+            newest = int(np.max(timestamp))
+            if self.now is not None and newest > self.now:
+                self._decay(2.0 ** (-(newest - self.now) / self.half_life_ns))
+            self.now = newest if self.now is None else max(self.now, newest)
+            age = (self.now - np.asarray(timestamp, dtype=np.int64)).astype(np.float64)
+            decay = 2.0 ** (-age / self.half_life_ns)
+            weights = decay if weights is None else weights * decay
+
+        pages = address // self.page_size
+        keys = {'page': pages, 'line': address // self.line_size}
+        if ip is not None:
+            ip = np.asarray(ip, dtype=np.uint64)
+            sampled = ip != 0
+            pairs = np.empty(int(sampled.sum()), dtype=IP_PAGE_DTYPE)
+            pairs['ip'] = ip[sampled]
+            pairs['page'] = pages[sampled]
+            keys['ip'] = ip[sampled]
+            keys['ip_page'] = pairs
+        for kind, kind_keys in keys.items():
+            kind_weights = weights
+            if weights is not None and kind in ('ip', 'ip_page'):
+                kind_weights = weights[sampled]
+            self.summaries[kind].update(kind_keys, kind_weights)
+            sketch_keys = kind_keys['ip'] ^ (kind_keys['page'] * np.uint64(0x9E3779B97F4A7C15)) \
+                if kind == 'ip_page' else kind_keys
+            self.sketches[kind].update(sketch_keys, kind_weights)
+
+    def _decay(self, factor):
+        for summary in self.summaries.values():
+            summary.scale(factor)
+        for sketch in self.sketches.values():
+            sketch.scale(factor)
+
+    def top(self, kind, n=20):
+        """
+        Heaviest keys of one kind.
+
+        Returns:
+            pd.DataFrame: key column(s), `count` (an overestimate), `error`
+                (its maximum overestimate) and `share` of the total weight
+        """
+        summary = self.summaries[kind]
+        keys, counts, errors = summary.top(n)
+        table = pd.DataFrame(keys) if kind == 'ip_page' else pd.DataFrame({kind: keys})
+        table['count'] = counts
+        table['error'] = errors
+        table['share'] = counts / summary.total if summary.total else 0.0
+        return table
+
+    def estimate(self, kind, keys):
+        """Count-Min estimates for arbitrary page / line / IP keys."""
+        return self.sketches[kind].estimate(keys)
+
+    def error_bounds(self, kind):
+        """
+        Returns:
+            dict: `top_k`, the largest overestimate of any Space-Saving
+                count (also bounds the weight of unlisted keys), and
+                `sketch`, the overestimate the Count-Min estimates stay
+                under with probability `sketch_confidence`
+        """
+        summary = self.summaries[kind]
+        sketch = self.sketches[kind]
+        return {
+            'top_k': summary.floor,
+            'sketch': sketch.epsilon * sketch.total,
+            'sketch_confidence': 1 - np.exp(-sketch.depth),
+        }
+
+def heavy_hitters(trace, capacity=1024, batch_events=1_000_000, **kwargs):
+    """Build a HeavyHitterTracker over a whole trace, feeding it in batches."""
+    trace = CompactTrace.open(trace)
+    tracker = HeavyHitterTracker(capacity, **kwargs)
+    for start in range(0, len(trace), batch_events):
+        end = start + batch_events
+        tracker.update(trace.timestamp[start:end], trace.address[start:end], trace.ip[start:end])
+    return tracker
@@ -1,8 +1,18 @@
-from dash import Dash, html, dcc
+import sys
+from dash import Dash, html, dcc, Output, Input
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots 
 import pandas as pd
 import numpy as np
+from CompactTrace import CompactTrace
+from RawRecords import RawRecordReader
+from Sampling import stratified_sample
+from PhaseDetector import detect_phases, phase_ids
+from HeavyHitters import SpaceSaving
+from Cardinality import HyperLogLog
+from SharedDataset import SharedDataset
+from FigureCache import FigureCache
+from FigurePayload import fit_budget, fold_rows, max_heatmap_rows, scatter, thin_ticks, typed
 
 class MemoryAccessAnalyzer:
     """
@@ -10,24 +20,57 @@ class MemoryAccessAnalyzer:
     This class provides visualization and analysis tools to understand memory
     access patterns, cache performance, and system behavior.
     """
-    def __init__(self, csv_file):
+    # Views covering more events than this are drawn from a stratified
+    # sample of SAMPLE_SIZE events; narrower ranges use the exact data
+    EXACT_LIMIT = 1_000_000
+    SAMPLE_SIZE = 200_000
+    # Cache lines shown in the address distribution, and the Space-Saving
+    # counters used to find them
+    HOT_LINES = 50
+    HOT_LINE_COUNTERS = 1024
+    # Preprocessed state published for multi-worker serving (SharedDataset)
+    SHARED_FRAMES = ('df', 'sample_df')
+    SHARED_OBJECTS = ('bucketing', 'phases', 'base_address', 'heatmap_counts')
+    # Serialized size each figure is held to (see FigurePayload)
+    PAYLOAD_BUDGET = 1024 * 1024
+
+    def __init__(self, trace, raw_source=None, bucketing='uniform', cache_dir=None):
         """
-        Initialize the analyzer with input data file and set up basic parameters.
+        Initialize the analyzer with input data and set up basic parameters.
         
         Args:
-            csv_file (str): Path to the CSV file containing memory access data
+            trace (CompactTrace or str): Loaded trace, path to a CSV/.npz
+                file containing memory access data, or a directory written
+                by `publish`, which is attached to without preprocessing
+            raw_source (str or list): Optional path to the perf dump the trace
+                was parsed from (or the shard dumps, in input order); enables
+                raw record inspection on heatmap clicks
+            bucketing (str): 'uniform' for 50 equal time windows, or 'phase'
+                to use detected execution phases as the time windows
+            cache_dir (str): Optional directory for the figure cache's on-disk
+                tier, shared by all analyzer worker processes using it
         """
         # Standard memory parameters (in bytes)
         self.PAGE_SIZE = 4096        # Standard memory page size
         self.CACHE_LINE_SIZE = 64    # Common cache line size
         
-        # Load and process the data
-        self.df = pd.read_csv(csv_file)
-        self.preprocess_data()
+        # Load and process the data, or attach to an already published copy
+        self.raw_reader = RawRecordReader(raw_source) if raw_source else None
+        if SharedDataset.is_shared(trace):
+            SharedDataset(trace).restore(self)
+        else:
+            self.trace = CompactTrace.open(trace)
+            self.bucketing = bucketing
+            self.preprocess_data()
+        
+        # Rendered figures keyed by dataset, view and time range
+        self.figure_cache = FigureCache(disk_dir=cache_dir)
+        self.fingerprint = self.trace.fingerprint()
         
         # Initialize Dash application
         self.app = Dash(__name__)
         self.setup_layout()
+        self.setup_callbacks()
 
     def preprocess_data(self):
           
@@ -35,45 +78,58 @@ class MemoryAccessAnalyzer:
         Prepare the data for analysis with proper handling of timestamps and numeric conversions.
         This method carefully processes the data to avoid NaN values and ensure proper type conversions.
         """
-        # First, let's handle the address conversion
-        def safe_hex_to_int(x):
-            try:
-                return int(str(x), 16) if isinstance(x, str) and 'x' in str(x) else x
-            except (ValueError, TypeError):
-                return None
-
-        # Convert addresses and clean invalid values
-        self.df['address_num'] = self.df['address'].apply(safe_hex_to_int)
-        self.df = self.df.dropna(subset=['address_num'])
-        
-        # Process timestamps carefully
-        self.df['timestamp'] = pd.to_numeric(self.df['timestamp'], errors='coerce')
-        self.df = self.df.dropna(subset=['timestamp'])
+        # The compact trace already holds typed, validated columns, so no
+        # string coercion is needed here
+        self.df = self.trace.to_frame(['timestamp', 'address'])
         
         # Calculate time windows safely
         min_time = self.df['timestamp'].min()
         max_time = self.df['timestamp'].max()
-        window_size = (max_time - min_time) / 50  # Using 50 windows
+        window_size = max((max_time - min_time) / 50, 1)  # Using 50 windows
         
         # Create normalized timestamps (as integers) to avoid floating point issues
         self.df['time_normalized'] = (self.df['timestamp'] - min_time)
         
-        # Convert to time windows carefully
-        self.df['time_window'] = (self.df['time_normalized'] / window_size).apply(np.floor).astype('Int64')
+        # Convert to time windows, either equal-width or one per detected phase
+        if self.bucketing == 'phase':
+            self.phases = detect_phases(self.trace)
+            self.df['time_window'] = phase_ids(self.trace.timestamp, self.phases)
+        else:
+            self.df['time_window'] = np.floor(self.df['time_normalized'] / window_size).astype(np.int64)
         
-        # Calculate memory page numbers safely
-        self.base_address = self.df['address_num'].min()
-        self.df['address_offset'] = self.df['address_num'] - self.base_address
+        # Calculate memory page numbers relative to the lowest address
+        self.base_address = int(self.df['address'].min())
+        self.df['page_number'] = (
+            (self.trace.address - np.uint64(self.base_address)) // np.uint64(self.PAGE_SIZE)
+        ).astype(np.int64)
         
-        # Use Int64 dtype which can handle NA values
-        self.df['page_number'] = (self.df['address_offset'] // self.PAGE_SIZE).astype('Int64')
+        # Pivot table behind the heatmap; it covers the whole trace, so it is
+        # built once here rather than on every render
+        self.heatmap_counts = pd.pivot_table(
+            self.df,
+            values='address',
+            index='page_number',
+            columns='time_window',
+            aggfunc='count',
+            fill_value=0
+        )
+        
+        # Stratified sample (per time bucket and event type) for huge traces
+        self.sample_df = None
+        if len(self.df) > self.EXACT_LIMIT:
+            self.sample = stratified_sample(
+                self.trace, self.SAMPLE_SIZE, buckets=self.df['time_window'].to_numpy()
+            )
+            self.sample_df = self.df.iloc[self.sample.indices].assign(weight=self.sample.weights)
         
         # Log processing statistics with proper string formatting
         print("Data Processing Summary:")
         print(f"Total records processed: {len(self.df)}")
         print(f"Time range: {min_time:.2f} to {max_time:.2f}")
-        print(f"Address range: 0x{int(self.base_address):x} to 0x{int(self.df['address_num'].max()):x}")
-        print(f"Number of unique pages: {self.df['page_number'].nunique()}")
+        print(f"Address range: 0x{self.base_address:x} to 0x{int(self.df['address'].max()):x}")
+        pages = HyperLogLog()
+        pages.update(self.trace.page)
+        print(f"Number of unique pages: ~{pages.estimate():,.0f} (±{pages.relative_error:.1%})")
 
 
     def create_memory_heatmap(self):
@@ -82,110 +138,161 @@ class MemoryAccessAnalyzer:
             This function carefully handles numeric conversions and creates
             clear address labels for better understanding of memory patterns.
             """
-            # First create the pivot table for our heatmap
-            heatmap_data = pd.pivot_table(
-                self.df,
-                values='address_num',
-                index='page_number',
-                columns='time_window',
-                aggfunc='count',
-                fill_value=0
+            # Access counts per page and time window, computed once in preprocessing
+            heatmap_data = self.heatmap_counts
+            
+            # Keep the payload within budget: with more touched pages than
+            # rows fit, runs of consecutive pages are summed into one row
+            pages = heatmap_data.index.to_numpy()
+            z, starts, pages_per_row = fold_rows(
+                heatmap_data.to_numpy(),
+                max_heatmap_rows(len(heatmap_data.columns), self.PAYLOAD_BUDGET)
             )
+            ends = np.append(starts[1:], len(pages)) - 1
             
-            # Create address labels with proper integer conversion
+            # Address labels for the rows only (the first page of each)
             address_labels = [
-                f"0x{int(i * self.PAGE_SIZE + self.base_address):04x}" 
-                for i in heatmap_data.index
+                f"0x{int(page * self.PAGE_SIZE + self.base_address):04x}"
+                for page in pages[starts]
             ]
             
             # Create time window labels
             time_labels = [f"T{i}" for i in range(len(heatmap_data.columns))]
             
-            # Create the heatmap visualization
-            fig = go.Figure(data=go.Heatmap(
-                z=heatmap_data.values,
-                x=time_labels,
-                y=address_labels,
-                colorscale=[
-                    [0, '#f8f9fa'],    # Very light gray for no access
-                    [0.2, '#c6dbef'],  # Light blue for low access
-                    [0.4, '#6baed6'],  # Medium blue for moderate access
-                    [0.6, '#3182bd'],  # Darker blue for high access
-                    [1.0, '#08519c']   # Very dark blue for intense access
-                ],
-                hoverongaps=False,
-                hovertemplate=(
-                    'Memory Page: %{y}<br>' +
-                    'Time Window: %{x}<br>' +
-                    'Access Count: %{z}<extra></extra>'
-                )
-            ))
+            # Remember which pages / time window each row and column shows so
+            # clicks on a cell can be mapped back to the underlying events
+            self.heatmap_cells = {
+                'pages': dict(zip(address_labels, zip(pages[starts].tolist(), pages[ends].tolist()))),
+                'windows': dict(zip(time_labels, heatmap_data.columns))
+            }
+            tickvals, ticktext = thin_ticks(np.arange(len(address_labels)), address_labels)
             
-            # Add clear annotations to show data characteristics
-            fig.update_layout(
-                title={
-                    'text': (
-                        'Memory Access Pattern Heatmap<br>'
-                        f'<span style="font-size:12px">Showing {len(self.df)} accesses '
-                        f'across {len(address_labels)} pages</span>'
-                    ),
-                    'y': 0.95,
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'yanchor': 'top',
-                    'font': {'size': 20}
-                },
-                xaxis={
-                    'title': 'Time Progress →',
-                    'tickangle': 0,
-                    'showgrid': True,
-                    'dtick': 1
-                },
-                yaxis={
-                    'title': 'Memory Address Range',
-                    'tickangle': 0,
-                    'showgrid': True,
-                    'tickmode': 'array',
-                    'ticktext': address_labels,
-                    'tickvals': list(range(len(address_labels)))
-                },
-                height=500,  # Increased height for better visibility
-                margin={'l': 100, 'r': 50, 't': 100, 'b': 50},
-                plot_bgcolor='white',
-                paper_bgcolor='white'
+            # Served from the figure cache, which serializes through
+            # fit_budget: the measured (and possibly shrunk) JSON is the
+            # payload Dash sends, and it is not rebuilt on a cache hit
+            figure = self.figure_cache.get_or_create(
+                (self.fingerprint, 'heatmap', {'bucketing': self.bucketing, 'payload_budget': self.PAYLOAD_BUDGET}),
+                lambda: self.build_memory_heatmap(z, time_labels, address_labels, tickvals, ticktext,
+                                                  len(pages), pages_per_row),
+                lambda fig: fit_budget(fig, 'heatmap', self.PAYLOAD_BUDGET)
             )
-            
-            return fig
+            band_labels = list(figure['data'][0]['y'])
+            if len(band_labels) < len(address_labels):
+                # Folded further to fit the budget: each band now runs up
+                # to the row before the next band's first row
+                row_of = {label: row for row, label in enumerate(address_labels)}
+                first_rows = [row_of[label] for label in band_labels]
+                last_rows = [row - 1 for row in first_rows[1:]] + [len(address_labels) - 1]
+                self.heatmap_cells['pages'] = {
+                    label: (int(pages[starts[first]]), int(pages[ends[last]]))
+                    for label, first, last in zip(band_labels, first_rows, last_rows)
+                }
+            return figure
+
+    def build_memory_heatmap(self, z, time_labels, address_labels, tickvals, ticktext, n_pages, pages_per_row):
+        """Heatmap figure of the page bands prepared by create_memory_heatmap."""
+        # Create the heatmap visualization
+        fig = go.Figure(data=go.Heatmap(
+            z=typed(z),
+            x=time_labels,
+            y=address_labels,
+            colorscale=[
+                [0, '#f8f9fa'],    # Very light gray for no access
+                [0.2, '#c6dbef'],  # Light blue for low access
+                [0.4, '#6baed6'],  # Medium blue for moderate access
+                [0.6, '#3182bd'],  # Darker blue for high access
+                [1.0, '#08519c']   # Very dark blue for intense access
+            ],
+            hoverongaps=False,
+            hovertemplate=(
+                'Memory Page: %{y}<br>' +
+                'Time Window: %{x}<br>' +
+                'Access Count: %{z}<extra></extra>'
+            )
+        ))
+        
+        # Add clear annotations to show data characteristics
+        fig.update_layout(
+            title={
+                'text': (
+                    'Memory Access Pattern Heatmap<br>'
+                    f'<span style="font-size:12px">Showing {len(self.df)} accesses '
+                    f'across {n_pages} pages'
+                    + (f', {pages_per_row} pages per row' if pages_per_row > 1 else '') +
+                    '</span>'
+                ),
+                'y': 0.95,
+                'x': 0.5,
+                'xanchor': 'center',
+                'yanchor': 'top',
+                'font': {'size': 20}
+            },
+            xaxis={
+                'title': 'Time Progress →',
+                'tickangle': 0,
+                'showgrid': True,
+                'dtick': 1
+            },
+            yaxis={
+                'title': 'Memory Address Range',
+                'tickangle': 0,
+                'showgrid': True,
+                'tickmode': 'array',
+                'ticktext': ticktext,
+                'tickvals': tickvals
+            },
+            height=500,  # Increased height for better visibility
+            margin={'l': 100, 'r': 50, 't': 100, 'b': 50},
+            plot_bgcolor='white',
+            paper_bgcolor='white'
+        )
+        return fig
 
-    def create_access_pattern_analysis(self):
+    def create_access_pattern_analysis(self, window_range=None):
         """
         Creates a detailed analysis of memory access patterns using two complementary visualizations:
         1. A time-based analysis showing how memory accesses are distributed over time
         2. A spatial analysis showing which addresses are accessed most frequently
+        
+        Args:
+            window_range (tuple): Optional (first, last) time window to show. Ranges
+                holding more than EXACT_LIMIT events are estimated from the
+                stratified sample; smaller ranges use the exact events.
         """
+        def in_range(df):
+            if window_range is None:
+                return df
+            return df[df['time_window'].between(window_range[0], window_range[1])]
+        
+        timeline_df = in_range(self.df)
+        label = 'exact'
+        if len(timeline_df) > self.EXACT_LIMIT and self.sample_df is not None:
+            timeline_df = in_range(self.sample_df)
+            label = self.sample.describe(
+                timeline_df['time_window'].to_numpy(),
+                int(self.df['time_window'].max()) + 1,
+                timeline_df['weight'].to_numpy()
+            )
+        else:
+            timeline_df = timeline_df.assign(weight=1)
+
         # Create a figure with two subplots side by side
         fig = make_subplots(
             rows=1, cols=2,
             subplot_titles=(
                 'Memory Access Frequency Over Time',
-                'Memory Address Access Distribution'
+                f'Hottest {self.HOT_LINES} Cache Lines'
             ),
             horizontal_spacing=0.15  # Add space between subplots for clarity
         )
 
-        # Prepare time-based access data
-        # Convert timestamps to relative seconds for better readability
-        timeline_df = self.df.copy()
-        timeline_df['relative_time'] = (
-            (timeline_df['timestamp'] - timeline_df['timestamp'].min()) / 1e9  # Convert to seconds
-        )
-
-        # Create time-based access pattern (left subplot)
-        time_grouped = timeline_df.groupby('time_window').size().reset_index(name='count')
+        # Create time-based access pattern (left subplot); weights turn
+        # sampled counts into estimates of the exact counts
+        time_grouped = timeline_df.groupby('time_window')['weight'].sum().reset_index(name='count')
         fig.add_trace(
-            go.Scatter(
-                x=time_grouped['time_window'],
-                y=time_grouped['count'],
+            scatter(
+                time_grouped['time_window'],
+                time_grouped['count'],
                 mode='lines+markers',
                 name='Accesses',
                 line=dict(color='#2ecc71', width=2),
@@ -199,19 +306,27 @@ class MemoryAccessAnalyzer:
             row=1, col=1
         )
 
-        # Create address distribution (right subplot)
-        address_grouped = timeline_df.groupby('address_num').size().reset_index(name='count')
-        address_grouped['address_hex'] = address_grouped['address_num'].apply(
-            lambda x: f"0x{int(x):04x}"
+        # Create address distribution (right subplot): the hottest cache
+        # lines from a fixed-size Space-Saving summary, in address order
+        hot = SpaceSaving(self.HOT_LINE_COUNTERS)
+        hot.update(
+            timeline_df['address'].to_numpy(dtype=np.uint64) // np.uint64(self.CACHE_LINE_SIZE),
+            timeline_df['weight'].to_numpy(dtype=np.float64)
         )
+        lines, counts, errors = hot.top(self.HOT_LINES)
+        order = np.argsort(lines)
         
         fig.add_trace(
             go.Bar(
-                x=address_grouped['address_hex'],
-                y=address_grouped['count'],
+                x=[f"0x{int(line) * self.CACHE_LINE_SIZE:04x}" for line in lines[order]],
+                y=typed(counts[order]),
+                customdata=typed(errors[order]),
                 name='Address Frequency',
                 marker_color='#3498db',
-                hovertemplate='Address: %{x}<br>Access Count: %{y}<extra></extra>'
+                hovertemplate=(
+                    'Cache Line: %{x}<br>Access Count: %{y:.0f}' +
+                    ' (overestimate ≤ %{customdata:.0f})<extra></extra>'
+                )
             ),
             row=1, col=2
         )
@@ -221,7 +336,7 @@ class MemoryAccessAnalyzer:
             height=400,
             showlegend=False,
             title={
-                'text': 'Memory Access Pattern Analysis',
+                'text': f'Memory Access Pattern Analysis ({label})',
                 'y': 0.95,
                 'x': 0.5,
                 'xanchor': 'center',
@@ -238,7 +353,7 @@ class MemoryAccessAnalyzer:
             row=1, col=1
         )
         fig.update_xaxes(
-            title_text='Memory Address',
+            title_text='Cache Line Address',
             gridcolor='lightgrey',
             showgrid=True,
             tickangle=45,  # Angle the address labels for better readability
@@ -258,6 +373,25 @@ class MemoryAccessAnalyzer:
         )
 
         return fig
+
+    def access_pattern_figure(self, window_range=None):
+        """
+        The access pattern analysis for `window_range`, from the figure
+        cache; built with create_access_pattern_analysis and serialized
+        through fit_budget on a miss.
+        """
+        parameters = {
+            'exact_limit': self.EXACT_LIMIT,
+            'sample_size': self.SAMPLE_SIZE,
+            'hot_lines': self.HOT_LINES,
+            'bucketing': self.bucketing,
+            'payload_budget': self.PAYLOAD_BUDGET
+        }
+        return self.figure_cache.get_or_create(
+            (self.fingerprint, 'access pattern', window_range, parameters),
+            lambda: self.create_access_pattern_analysis(window_range),
+            lambda fig: fit_budget(fig, 'access pattern', self.PAYLOAD_BUDGET)
+        )
     def setup_layout(self):
         """
         Set up the dashboard layout with all visualization components.
@@ -286,7 +420,17 @@ class MemoryAccessAnalyzer:
             # Memory access heatmap
             html.Div([
                 dcc.Graph(
+                    id='heatmap-graph',
                     figure=self.create_memory_heatmap()
+                ),
+                html.Pre(
+                    id='raw-record-view',
+                    style={
+                        'fontSize': '12px',
+                        'maxHeight': '300px',
+                        'overflowY': 'auto',
+                        'color': '#2c3e50'
+                    }
                 )
             ], style={
                 'margin': '20px',
@@ -299,7 +443,8 @@ class MemoryAccessAnalyzer:
             # Access pattern analysis
             html.Div([
                 dcc.Graph(
-                    figure=self.create_access_pattern_analysis()
+                    id='access-pattern-graph',
+                    figure=self.access_pattern_figure()
                 )
             ], style={
                 'margin': '20px',
@@ -328,13 +473,68 @@ class MemoryAccessAnalyzer:
             'padding': '20px'
         })
 
-    def run_server(self, debug=True):
+    def setup_callbacks(self):
+        """Set up interactive callbacks."""
+        @self.app.callback(
+            Output('raw-record-view', 'children'),
+            [Input('heatmap-graph', 'clickData')]
+        )
+        def show_raw_records(click_data):
+            if not click_data:
+                return 'Click a heatmap cell to inspect the raw records behind it.'
+            if self.raw_reader is None:
+                return 'Raw record inspection needs the source perf dump (raw_source).'
+            
+            point = click_data['points'][0]
+            first_page, last_page = self.heatmap_cells['pages'].get(point['y'], (-1, -1))
+            window = self.heatmap_cells['windows'].get(point['x'])
+            page_number = self.df['page_number'].to_numpy()
+            selected = np.flatnonzero(
+                (page_number >= first_page) & (page_number <= last_page) &
+                (self.df['time_window'].to_numpy() == window)
+            )
+            records = self.raw_reader.read_records(
+                self.trace.raw_offset[selected],
+                self.trace.raw_length[selected],
+                limit=5,
+                shard_ids=self.trace.shard_id[selected]
+            )
+            if not records:
+                return f'No raw records stored for {point["y"]} at {point["x"]}.'
+            return (
+                f'{len(selected)} events in {point["y"]} at {point["x"]}, '
+                f'showing {len(records)}:\n\n' + '\n'.join(records)
+            )
+
+        @self.app.callback(
+            Output('access-pattern-graph', 'figure'),
+            [Input('access-pattern-graph', 'relayoutData')],
+            prevent_initial_call=True
+        )
+        def zoom_access_pattern(relayout_data):
+            # Zooming the time axis re-renders the views for the visible
+            # windows, switching to exact data once the range is small enough
+            relayout_data = relayout_data or {}
+            if 'xaxis.range[0]' in relayout_data:
+                window_range = (
+                    int(np.floor(relayout_data['xaxis.range[0]'])),
+                    int(np.ceil(relayout_data['xaxis.range[1]']))
+                )
+                return self.access_pattern_figure(window_range)
+            return self.access_pattern_figure()
+
+    def publish(self, directory):
+        """Publish the preprocessed data for worker processes to attach to."""
+        SharedDataset.publish(directory, self)
+
+    def run_server(self, debug=True, host='127.0.0.1', port=8050):
         """Start the dashboard server."""
-        self.app.run_server(debug=debug)
+        self.app.run(debug=debug, host=host, port=port)
 
 def main():
     """Main function to initialize and run the analyzer."""
-    analyzer = MemoryAccessAnalyzer('perf_output_enhanced.csv')
+    trace = sys.argv[1] if len(sys.argv) > 1 else 'perf_output_enhanced.csv'
+    analyzer = MemoryAccessAnalyzer(trace)
     analyzer.run_server()
 
 if __name__ == '__main__':
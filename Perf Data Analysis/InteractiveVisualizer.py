@@ -1,16 +1,51 @@
+import sys
 from dash import Dash, html, dcc, Output, Input
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 from plotly.subplots import make_subplots
+from CompactTrace import CompactTrace
+from Sampling import stratified_sample
+from FigureCache import FigureCache
+from PhaseDetector import detect_phases, phase_ids
+from SharedDataset import SharedDataset
+from FigurePayload import fit_budget, histogram_bars, scatter, typed
 
 class MemoryAccessDashboard:
-    def __init__(self, csv_file):
-        """Initialize dashboard with the enhanced CSV file."""
-        # Load and preprocess data
-        self.df = pd.read_csv(csv_file)
-        self.preprocess_data()
+    # Views covering more events than this are drawn from a stratified
+    # sample of SAMPLE_SIZE events; narrower ranges use the exact data
+    EXACT_LIMIT = 1_000_000
+    SAMPLE_SIZE = 200_000
+    # Preprocessed state published for multi-worker serving (SharedDataset)
+    SHARED_FRAMES = ('df', 'sample_df')
+    SHARED_OBJECTS = ('bucketing', 'phases', 'bucket_counts', 'event_bucket_counts')
+    # Serialized size each figure is held to (see FigurePayload)
+    PAYLOAD_BUDGET = 1024 * 1024
+
+    def __init__(self, trace, cache_dir=None, bucketing='quantile'):
+        """
+        Initialize dashboard with a CompactTrace or a path to the enhanced CSV/.npz file.
+        
+        Args:
+            trace (CompactTrace or str): Trace or path to load, or a directory
+                written by `publish`, which is attached to without preprocessing
+            cache_dir (str): Optional directory for the figure cache's on-disk
+                tier, shared by all dashboard worker processes using it
+            bucketing (str): 'quantile' for up to 100 equal-population time
+                buckets, or 'phase' for one bucket per detected execution phase
+        """
+        # Load and preprocess data, or attach to an already published copy
+        if SharedDataset.is_shared(trace):
+            SharedDataset(trace).restore(self)
+        else:
+            self.trace = CompactTrace.open(trace)
+            self.bucketing = bucketing
+            self.preprocess_data()
+        
+        # Rendered figures keyed by dataset, view and time range
+        self.figure_cache = FigureCache(disk_dir=cache_dir)
+        self.fingerprint = self.trace.fingerprint()
         
         # Initialize Dash app
         self.app = Dash(__name__)
@@ -20,41 +55,45 @@ class MemoryAccessDashboard:
     def preprocess_data(self):
        
         """Prepare data for visualization with robust time bucket creation."""
-        # Convert hexadecimal addresses to numeric
-        self.df['address_num'] = self.df['address'].apply(
-            lambda x: int(str(x), 16) if isinstance(x, str) and 'x' in str(x) else x
-        )
-        
-        # Convert timestamps to numeric, handling any non-numeric values
-        self.df['timestamp'] = pd.to_numeric(self.df['timestamp'], errors='coerce')
-        
-        # Create time buckets more robustly
-        # First check if we have enough unique values for 100 bins
-        unique_timestamps = self.df['timestamp'].nunique()
-        n_bins = min(unique_timestamps, 100)  # Use fewer bins if we have fewer unique values
+        # Typed columns straight from the compact trace; event types arrive
+        # as categoricals backed by the trace's string table
+        self.df = self.trace.to_frame(['timestamp', 'address', 'event_type'])
         
-        try:
-            self.df['time_bucket'] = pd.qcut(
-                self.df['timestamp'],
-                q=n_bins,
-                duplicates='drop',
-                labels=[f'T{i}' for i in range(n_bins)]
-            )
-        except ValueError:
-            # If qcut fails, fall back to cut with evenly spaced bins
-            self.df['time_bucket'] = pd.cut(
-                self.df['timestamp'],
-                bins=n_bins,
-                labels=[f'T{i}' for i in range(n_bins)]
+        if self.bucketing == 'phase':
+            # Detected execution phases are the time buckets
+            self.phases = detect_phases(self.trace)
+            self.df['time_bucket'] = pd.Categorical.from_codes(
+                phase_ids(self.trace.timestamp, self.phases),
+                [f'T{i}' for i in range(max(len(self.phases), 1))]
             )
+        else:
+            # Create time buckets more robustly
+            # First check if we have enough unique values for 100 bins
+            unique_timestamps = self.df['timestamp'].nunique()
+            n_bins = min(unique_timestamps, 100)  # Use fewer bins if we have fewer unique values
+            
+            try:
+                self.df['time_bucket'] = pd.qcut(
+                    self.df['timestamp'],
+                    q=n_bins,
+                    duplicates='drop',
+                    labels=[f'T{i}' for i in range(n_bins)]
+                )
+            except ValueError:
+                # If qcut fails, fall back to cut with evenly spaced bins
+                self.df['time_bucket'] = pd.cut(
+                    self.df['timestamp'],
+                    bins=n_bins,
+                    labels=[f'T{i}' for i in range(n_bins)]
+                )
         
         # Create address ranges similarly
-        unique_addresses = self.df['address_num'].nunique()
+        unique_addresses = self.df['address'].nunique()
         n_addr_bins = min(unique_addresses, 50)  # Use fewer bins if we have fewer unique values
         
         try:
             self.df['addr_bucket'] = pd.qcut(
-                self.df['address_num'],
+                self.df['address'],
                 q=n_addr_bins,
                 duplicates='drop',
                 labels=[f'A{i}' for i in range(n_addr_bins)]
@@ -62,22 +101,36 @@ class MemoryAccessDashboard:
         except ValueError:
             # Fall back to cut with evenly spaced bins
             self.df['addr_bucket'] = pd.cut(
-                self.df['address_num'],
+                self.df['address'],
                 bins=n_addr_bins,
                 labels=[f'A{i}' for i in range(n_addr_bins)]
             )
+        
+        # Per-bucket count tables: any slider range is a column/row slice of
+        # these, so range queries never rescan the events
+        self.bucket_counts = pd.crosstab(self.df['addr_bucket'], self.df['time_bucket'])
+        self.event_bucket_counts = (
+            self.df.groupby(['time_bucket', 'event_type'], observed=True).size().unstack(fill_value=0)
+        )
+        
+        # Stratified sample (per time bucket and event type) for huge traces
+        self.sample_df = None
+        if len(self.df) > self.EXACT_LIMIT:
+            self.sample = stratified_sample(
+                self.trace, self.SAMPLE_SIZE, buckets=self.df['time_bucket'].cat.codes.to_numpy()
+            )
+            self.sample_df = self.df.iloc[self.sample.indices].assign(weight=self.sample.weights)
     
-    def create_heatmap(self):
+    def create_heatmap(self, time_buckets=None):
         """Create interactive heatmap of memory access patterns."""
-        # Create access frequency matrix
-        heatmap_data = pd.crosstab(
-            self.df['addr_bucket'],
-            self.df['time_bucket']
-        )
+        # Slice the precomputed access frequency matrix
+        heatmap_data = self.bucket_counts
+        if time_buckets is not None:
+            heatmap_data = heatmap_data.loc[:, heatmap_data.columns.isin(time_buckets)]
         
         # Create heatmap using Plotly
         fig = go.Figure(data=go.Heatmap(
-            z=heatmap_data.values,
+            z=typed(heatmap_data.to_numpy()),
             x=heatmap_data.columns,
             y=heatmap_data.index,
             colorscale='Viridis',
@@ -98,17 +151,19 @@ class MemoryAccessDashboard:
         
         return fig
     
-    def create_timeline(self):
+    def create_timeline(self, time_buckets=None):
         """Create interactive timeline of memory events."""
-        events_over_time = self.df.groupby(['time_bucket', 'event_type']).size().unstack(fill_value=0)
+        events_over_time = self.event_bucket_counts
+        if time_buckets is not None:
+            events_over_time = events_over_time[events_over_time.index.isin(time_buckets)]
         
         fig = go.Figure()
         
         # Add traces for each event type
         for column in events_over_time.columns:
-            fig.add_trace(go.Scatter(
-                x=events_over_time.index,
-                y=events_over_time[column],
+            fig.add_trace(scatter(
+                events_over_time.index,
+                events_over_time[column],
                 name=column,
                 mode='lines',
                 stackgroup='one',
@@ -130,19 +185,50 @@ class MemoryAccessDashboard:
         
         return fig
     
-    def create_address_distribution(self):
-        """Create interactive distribution of memory accesses."""
+    def create_address_distribution(self, time_buckets=None):
+        """
+        Create interactive distribution of memory accesses.
+        
+        When the selected time range holds more than EXACT_LIMIT events the
+        histogram is estimated from the stratified sample and its title
+        shows the sampling ratio and error bound; zooming into a smaller
+        range switches back to the exact events automatically.
+        """
+        df = self.df
+        if time_buckets is not None:
+            df = df[df['time_bucket'].isin(time_buckets)]
+        
+        weights = None
+        if len(df) > self.EXACT_LIMIT and self.sample_df is not None:
+            df = self.sample_df
+            if time_buckets is not None:
+                df = df[df['time_bucket'].isin(time_buckets)]
+            weights = df['weight']
+        
+        # Shared bin edges so the per-event-type histograms and the error
+        # estimate use the same bins
+        addresses = df['address'].to_numpy(dtype=np.float64)
+        edges = np.histogram_bin_edges(addresses, bins=50) if len(addresses) else np.arange(51)
+        
+        if weights is None:
+            label = 'exact'
+        else:
+            bin_ids = np.clip(np.searchsorted(edges, addresses, side='right') - 1, 0, len(edges) - 2)
+            label = self.sample.describe(bin_ids, len(edges) - 1, weights)
+        
         fig = go.Figure()
         
-        # Add histogram for each event type
-        for event_type in self.df['event_type'].unique():
-            event_data = self.df[self.df['event_type'] == event_type]
+        # Add histogram for each event type, binned here so only the 50
+        # bin counts are sent rather than every address
+        for event_type in df['event_type'].unique():
+            selected = (df['event_type'] == event_type).to_numpy()
             
-            fig.add_trace(go.Histogram(
-                x=event_data['address_num'],
+            fig.add_trace(histogram_bars(
+                addresses[selected],
+                edges,
+                weights=None if weights is None else weights.to_numpy()[selected],
                 name=event_type,
                 opacity=0.7,
-                nbinsx=50,
                 hovertemplate=(
                     'Address Range: %{x}<br>' +
                     'Count: %{y}<br>' +
@@ -151,24 +237,29 @@ class MemoryAccessDashboard:
             ))
         
         fig.update_layout(
-            title='Memory Access Distribution by Event Type',
+            title=f'Memory Access Distribution by Event Type ({label})',
             xaxis_title='Memory Address',
             yaxis_title='Frequency',
             height=400,
             barmode='overlay',
+            bargap=0,
             showlegend=True
         )
         
         return fig
     
-    def create_event_summary(self):
+    def create_event_summary(self, time_buckets=None):
         """Create interactive summary of event statistics."""
-        event_counts = self.df['event_type'].value_counts()
+        events_over_time = self.event_bucket_counts
+        if time_buckets is not None:
+            events_over_time = events_over_time[events_over_time.index.isin(time_buckets)]
+        event_counts = events_over_time.sum().sort_values(ascending=False)
+        event_counts = event_counts[event_counts > 0]
         
         fig = go.Figure(data=[
             go.Pie(
                 labels=event_counts.index,
-                values=event_counts.values,
+                values=typed(event_counts.to_numpy()),
                 hole=.3,
                 hovertemplate=(
                     'Event: %{label}<br>' +
@@ -344,25 +435,44 @@ class MemoryAccessDashboard:
             [Input('time-slider', 'value')]
         )
         def update_graphs(time_range):
-            # Filter data based on time range
+            # Time buckets covered by the selected range
             time_buckets = [f'T{i}' for i in range(time_range[0], time_range[1] + 1)]
-            filtered_df = self.df[self.df['time_bucket'].isin(time_buckets)]
-            
-            # Update all visualizations with filtered data
-            heatmap = self.create_heatmap()
-            timeline = self.create_timeline()
-            distribution = self.create_address_distribution()
-            summary = self.create_event_summary()
             
-            return heatmap, timeline, distribution, summary
+            # Serve each figure from the cache, rendering it only on a miss;
+            # the cache serializes through fit_budget, so a new figure is
+            # measured (and shrunk if needed) from the JSON that is cached
+            views = {
+                'heatmap': self.create_heatmap,
+                'timeline': self.create_timeline,
+                'distribution': self.create_address_distribution,
+                'summary': self.create_event_summary
+            }
+            parameters = {
+                'exact_limit': self.EXACT_LIMIT,
+                'bucketing': self.bucketing,
+                'payload_budget': self.PAYLOAD_BUDGET
+            }
+            return tuple(
+                self.figure_cache.get_or_create(
+                    (self.fingerprint, view, time_range, parameters),
+                    lambda create=create: create(time_buckets),
+                    lambda figure, view=view: fit_budget(figure, view, self.PAYLOAD_BUDGET)
+                )
+                for view, create in views.items()
+            )
+    
+    def publish(self, directory):
+        """Publish the preprocessed data for worker processes to attach to."""
+        SharedDataset.publish(directory, self)
     
-    def run_server(self, debug=True):
+    def run_server(self, debug=True, host='127.0.0.1', port=8050):
         """Run the dashboard server."""
-        self.app.run_server(debug=debug)
+        self.app.run(debug=debug, host=host, port=port)
 
 def main():
     # Create and run dashboard
-    dashboard = MemoryAccessDashboard('perf_output_enhanced.csv')
+    trace = sys.argv[1] if len(sys.argv) > 1 else 'perf_output_enhanced.csv'
+    dashboard = MemoryAccessDashboard(trace)
     dashboard.run_server()
 
 if __name__ == '__main__':
@@ -0,0 +1,262 @@
+import sys
+from dash import Dash, html, dcc, Output, Input
+import plotly.graph_objects as go
+import numpy as np
+from FigurePayload import histogram_bars, scatter
+from LiveTrace import RingBuffer, RunningAggregates, TraceTailer
+
+class LiveMemoryAccessDashboard:
+    """
+    Live view of a trace that is still being written.
+
+    Instead of reading a CSV once at startup, the dashboard process owns a
+    fixed-capacity ring buffer and a set of running aggregates that a
+    background tailer keeps up to date. A dcc.Interval callback redraws the
+    heatmap, hot-page list and timeline from those aggregates and the
+    recent-accesses scatter from the tail of the ring buffer, and the
+    address distribution of the whole run from a reservoir sample, so
+    nothing is re-read from disk and memory stays bounded for arbitrarily long
+    profiling runs.
+    """
+    def __init__(self, input_file, capacity=1_000_000, window_ns=100_000_000,
+                 max_windows=120, refresh_ms=1000, recent_events=20_000, sample_size=100_000,
+                 bucketing='uniform'):
+        """
+        Args:
+            input_file (str): Growing `timestamp: event address` perf text output
+            capacity (int): Number of most recent events held in the ring buffer
+            window_ns (int): Width of one time window in nanoseconds
+            max_windows (int): Number of recent windows kept in the aggregates
+            refresh_ms (int): Dashboard refresh period in milliseconds
+            recent_events (int): Number of most recent events plotted in
+                the recent-accesses view
+            sample_size (int): Events kept in the reservoir behind the
+                whole-run address distribution
+            bucketing (str): 'uniform' for one column per time window, or
+                'phase' to merge windows by detected execution phase
+        """
+        self.buffer = RingBuffer(capacity)
+        self.aggregates = RunningAggregates(window_ns=window_ns, max_windows=max_windows,
+                                            sample_size=sample_size, bucketing=bucketing)
+        self.time_title = 'Execution Phase' if bucketing == 'phase' else 'Time Window'
+        self.tailer = TraceTailer(input_file, self.buffer, self.aggregates,
+                                  poll_interval=refresh_ms / 1000)
+        self.refresh_ms = refresh_ms
+        self.recent_events = recent_events
+
+        self.app = Dash(__name__)
+        self.setup_layout()
+        self.setup_callbacks()
+
+    def create_heatmap(self):
+        """Heatmap of the hottest pages over the retained time windows (or phases)."""
+        with self.tailer.lock:
+            pages, buckets, counts = self.aggregates.heatmap()
+
+        fig = go.Figure(data=go.Heatmap(
+            z=counts,
+            x=buckets,
+            y=[f"0x{int(page) * self.aggregates.page_size:x}" for page in pages],
+            colorscale='Viridis',
+            hovertemplate=(
+                'Memory Page: %{y}<br>' +
+                f'{self.time_title}: %{{x}}<br>' +
+                'Access Count: %{z}<extra></extra>'
+            )
+        ))
+        fig.update_layout(
+            title='Live Memory Access Heatmap',
+            xaxis_title=self.time_title,
+            yaxis_title='Memory Page',
+            height=500,
+            uirevision='live'  # Keep zoom/pan across refreshes
+        )
+        return fig
+
+    def create_hot_pages(self):
+        """Bar chart of the pages that are hot right now (decayed counts)."""
+        with self.tailer.lock:
+            hot = self.aggregates.hot_pages()
+
+        fig = go.Figure(data=go.Bar(
+            x=hot['count'],
+            y=[f"0x{int(page) * self.aggregates.page_size:x}" for page in hot['page']],
+            orientation='h',
+            marker_color='#e74c3c',
+            hovertemplate='Memory Page: %{y}<br>Decayed Access Count: %{x:.1f}<extra></extra>'
+        ))
+        fig.update_layout(
+            title='Currently Hot Pages',
+            xaxis_title='Decayed Access Count',
+            yaxis={'title': 'Memory Page', 'autorange': 'reversed'},
+            height=500,
+            uirevision='live'
+        )
+        return fig
+
+    def create_timeline(self):
+        """Stacked per-event counts over the retained time windows (or phases)."""
+        with self.tailer.lock:
+            event_types = list(self.tailer.event_types)
+            buckets, counts = self.aggregates.timeline(len(event_types))
+
+        fig = go.Figure()
+        for code, event_type in enumerate(event_types):
+            fig.add_trace(go.Scatter(
+                x=buckets,
+                y=counts[:, code],
+                name=event_type,
+                mode='lines',
+                stackgroup='one'
+            ))
+        fig.update_layout(
+            title='Live Memory Events Timeline',
+            xaxis_title=self.time_title,
+            yaxis_title='Number of Events',
+            height=400,
+            hovermode='x unified',
+            uirevision='live'
+        )
+        return fig
+
+    def create_recent_accesses(self):
+        """Scatter of the most recent buffered accesses, one trace per event type."""
+        with self.tailer.lock:
+            event_types = list(self.tailer.event_types)
+            recent = self.buffer.snapshot(last=self.recent_events)
+
+        fig = go.Figure()
+        t0 = recent['timestamp'][0] if len(recent['timestamp']) else 0
+        for code, event_type in enumerate(event_types):
+            selected = recent['event_code'] == code
+            if not selected.any():
+                continue
+            fig.add_trace(scatter(
+                (recent['timestamp'][selected] - t0) / 1e6,
+                recent['address'][selected],
+                name=event_type,
+                mode='markers',
+                marker={'size': 3},
+                hovertemplate='Time: %{x:.3f} ms<br>Address: 0x%{y:x}<extra></extra>'
+            ))
+        fig.update_layout(
+            title=f'Most Recent {len(recent["timestamp"]):,} Accesses',
+            xaxis_title='Time (ms, relative)',
+            yaxis_title='Memory Address',
+            height=400,
+            uirevision='live'
+        )
+        return fig
+
+    def create_address_distribution(self):
+        """
+        Address histogram per event type over the whole run so far.
+
+        Estimated from the reservoir sample; the title shows the sampling
+        ratio and error bound like the sampled views of the other
+        dashboards.
+        """
+        with self.tailer.lock:
+            event_types = list(self.tailer.event_types)
+            sample = self.aggregates.run_sample(event_types)
+
+        addresses = sample.trace.address.astype(np.float64)
+        edges = np.histogram_bin_edges(addresses, bins=50) if len(addresses) else np.arange(51)
+        bin_ids = np.clip(np.searchsorted(edges, addresses, side='right') - 1, 0, len(edges) - 2)
+        label = sample.describe(bin_ids, len(edges) - 1)
+
+        fig = go.Figure()
+        for code, event_type in enumerate(event_types):
+            selected = sample.trace.event_code == code
+            if not selected.any():
+                continue
+            fig.add_trace(histogram_bars(
+                addresses[selected],
+                edges,
+                weights=sample.weights[selected],
+                name=event_type,
+                opacity=0.7,
+                hovertemplate=(
+                    'Address Range: %{x}<br>' +
+                    'Estimated Count: %{y:.0f}<br>' +
+                    f'Event: {event_type}<extra></extra>'
+                )
+            ))
+        fig.update_layout(
+            title=f'Address Distribution Over the Whole Run ({label})',
+            xaxis_title='Memory Address',
+            yaxis_title='Number of Accesses',
+            barmode='overlay',
+            height=400,
+            uirevision='live'
+        )
+        return fig
+
+    def setup_layout(self):
+        """Set up the live dashboard layout."""
+        card = {
+            'margin': '20px',
+            'padding': '20px',
+            'backgroundColor': 'white',
+            'borderRadius': '10px',
+            'boxShadow': '0 2px 4px rgba(0,0,0,0.1)'
+        }
+        self.app.layout = html.Div([
+            html.Div([
+                html.H1(
+                    'Live Memory Access Monitor',
+                    style={'textAlign': 'center', 'color': '#2c3e50', 'marginBottom': '10px'}
+                ),
+                html.P(
+                    id='live-status',
+                    style={'textAlign': 'center', 'color': '#7f8c8d'}
+                )
+            ], style={'padding': '20px'}),
+            html.Div([dcc.Graph(id='live-heatmap')], style=card),
+            html.Div([dcc.Graph(id='live-hot-pages')], style=card),
+            html.Div([dcc.Graph(id='live-timeline')], style=card),
+            html.Div([dcc.Graph(id='live-recent')], style=card),
+            html.Div([dcc.Graph(id='live-distribution')], style=card),
+            dcc.Interval(id='live-interval', interval=self.refresh_ms)
+        ], style={
+            'fontFamily': 'Arial, sans-serif',
+            'backgroundColor': '#f0f2f5',
+            'minHeight': '100vh',
+            'padding': '20px'
+        })
+
+    def setup_callbacks(self):
+        """Redraw from the running aggregates on every interval tick."""
+        @self.app.callback(
+            [Output('live-heatmap', 'figure'),
+             Output('live-hot-pages', 'figure'),
+             Output('live-timeline', 'figure'),
+             Output('live-recent', 'figure'),
+             Output('live-distribution', 'figure'),
+             Output('live-status', 'children')],
+            [Input('live-interval', 'n_intervals')]
+        )
+        def refresh(n_intervals):
+            status = (
+                f'{self.buffer.total:,} events seen, '
+                f'{len(self.buffer):,} buffered (capacity {self.buffer.capacity:,})'
+            )
+            return (self.create_heatmap(), self.create_hot_pages(), self.create_timeline(),
+                    self.create_recent_accesses(), self.create_address_distribution(), status)
+
+    def run_server(self, debug=False, host='127.0.0.1', port=8050):
+        """Start tailing the input and serve the dashboard."""
+        self.tailer.start()
+        try:
+            # The reloader would start a second tailer, so keep it off
+            self.app.run(debug=debug, host=host, port=port, use_reloader=False)
+        finally:
+            self.tailer.stop()
+
+def main():
+    input_file = sys.argv[1] if len(sys.argv) > 1 else 'perf_output.txt'
+    dashboard = LiveMemoryAccessDashboard(input_file)
+    dashboard.run_server()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+import os
+import threading
+import numpy as np
+from CompressedInput import detect_compression, open_dump
+from HeavyHitters import HeavyHitterTracker
+from PhaseDetector import PhaseDetector, phase_boundaries
+from Sampling import ReservoirSampler
+
+class RingBuffer:
+    """
+    Fixed-capacity, array-backed buffer holding the most recent events.
+
+    Appending never allocates: once `capacity` events have been written the
+    oldest ones are overwritten, so memory stays constant however long the
+    profiled process runs.
+    """
+    COLUMNS = {
+        'timestamp': np.int64,
+        'address': np.uint64,
+        'event_code': np.uint16,
+    }
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self.head = 0          # Next slot to write
+        self.total = 0         # Events ever appended
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, columns):
+        """Append a batch of events given as column name -> array."""
+        n_new = len(columns['timestamp'])
+        if n_new == 0:
+            return
+        # Only the newest `capacity` events of an oversized batch survive
+        skip = max(0, n_new - self.capacity)
+        slots = (self.head + skip + np.arange(n_new - skip)) % self.capacity
+        for name, values in self.columns.items():
+            values[slots] = columns[name][skip:]
+        self.head = (self.head + n_new) % self.capacity
+        self.total += n_new
+
+    def snapshot(self, last=None):
+        """
+        Copy of the buffered events in arrival order.
+
+        Args:
+            last (int): Only copy the `last` most recent events
+        """
+        n = len(self) if last is None else min(last, len(self))
+        slots = (self.head - n + np.arange(n)) % self.capacity
+        return {name: values[slots] for name, values in self.columns.items()}
+
+class RunningAggregates:
+    """
+    Incrementally maintained per-window counts for the live views.
+
+    Counts are kept for the most recent `max_windows` time windows only:
+    per (window, page) for the heatmap and per (window, event) for the
+    timeline. Older windows are dropped as new ones open, which keeps
+    memory bounded for arbitrarily long runs. A decayed heavy-hitter
+    tracker (half-life of `hot_half_life_windows` windows) follows the
+    pages and cache lines that are hot right now, and a reservoir of
+    `sample_size` events stands for the whole run since the tailer started,
+    which neither the retained windows nor the ring buffer cover.
+
+    With bucketing='phase' an online PhaseDetector follows the stream, and
+    the heatmap and timeline merge the retained windows into one column
+    per detected execution phase instead of one per window.
+    """
+    def __init__(self, window_ns=100_000_000, max_windows=120, page_size=4096,
+                 hot_half_life_windows=10, sample_size=100_000, bucketing='uniform',
+                 phase_window_events=10_000):
+        self.window_ns = window_ns
+        self.max_windows = max_windows
+        self.page_size = page_size
+        self.page_counts = {}      # window -> (pages, counts)
+        self.event_counts = {}     # window -> (event codes, counts)
+        self.hot = HeavyHitterTracker(
+            capacity=256, half_life_ns=hot_half_life_windows * window_ns, page_size=page_size
+        )
+        self.reservoir = ReservoirSampler(sample_size, RingBuffer.COLUMNS)
+        self.phases = PhaseDetector(window_events=phase_window_events, page_size=page_size) \
+            if bucketing == 'phase' else None
+
+    def update(self, columns):
+        """Fold a batch of new events into the running counts."""
+        if len(columns['timestamp']) == 0:
+            return
+        windows = columns['timestamp'] // self.window_ns
+        pages = columns['address'] // np.uint64(self.page_size)
+
+        for window in np.unique(windows):
+            selected = windows == window
+            self._merge(self.page_counts, int(window), pages[selected])
+            self._merge(self.event_counts, int(window), columns['event_code'][selected])
+        self.hot.update(columns['timestamp'], columns['address'])
+        self.reservoir.add(columns)
+        if self.phases is not None:
+            # The tailed text has no DSOs; phases follow rate, working set and strides
+            self.phases.update(columns['timestamp'], columns['address'],
+                               np.zeros(len(columns['timestamp']), dtype=np.int64))
+
+        # Evict windows that fell out of the retained range
+        newest = max(self.page_counts)
+        for counts in (self.page_counts, self.event_counts):
+            for window in [w for w in counts if w <= newest - self.max_windows]:
+                del counts[window]
+
+    @staticmethod
+    def _merge(counts, window, keys):
+        keys, added = np.unique(keys, return_counts=True)
+        if window in counts:
+            old_keys, old_counts = counts[window]
+            keys = np.concatenate((old_keys, keys))
+            added = np.concatenate((old_counts, added))
+            keys, inverse = np.unique(keys, return_inverse=True)
+            added = np.bincount(inverse, weights=added).astype(np.int64)
+        counts[window] = (keys, added)
+
+    def buckets(self, windows):
+        """
+        Time bucket of each retained window and the bucket labels: one
+        bucket per window ('T<window>'), or per detected phase ('P<phase>').
+        """
+        if self.phases is None:
+            return np.arange(len(windows)), [f"T{w}" for w in windows]
+        # Closed phases plus the open one; its start is already known
+        phases = self.phases.phases + ([self.phases.current] if self.phases.current else [])
+        ids = np.searchsorted(phase_boundaries(phases), np.array(windows, dtype=np.int64) * self.window_ns,
+                              side='right')
+        unique, inverse = np.unique(ids, return_inverse=True)
+        return inverse, [f"P{phase}" for phase in unique]
+
+    def heatmap(self, max_pages=64):
+        """
+        Page x time bucket count matrix over the retained windows.
+
+        Only the `max_pages` pages with the most accesses are returned so
+        the figure size is bounded as well.
+
+        Returns:
+            tuple: (pages, bucket labels, counts[pages, buckets])
+        """
+        windows = sorted(self.page_counts)
+        if not windows:
+            return np.array([], dtype=np.uint64), [], np.zeros((0, 0))
+        bucket, labels = self.buckets(windows)
+        all_pages = np.concatenate([self.page_counts[w][0] for w in windows])
+        all_counts = np.concatenate([self.page_counts[w][1] for w in windows])
+        columns = np.repeat(bucket, [len(self.page_counts[w][0]) for w in windows])
+
+        pages, rows = np.unique(all_pages, return_inverse=True)
+        totals = np.bincount(rows, weights=all_counts)
+        top = np.sort(np.argsort(totals)[::-1][:max_pages])
+
+        # Fill only the selected pages' rows; every other page maps to -1
+        slot = np.full(len(pages), -1, dtype=np.int64)
+        slot[top] = np.arange(len(top))
+        row_slots = slot[rows]
+        kept = row_slots >= 0
+        matrix = np.zeros((len(top), len(labels)))
+        np.add.at(matrix, (row_slots[kept], columns[kept]), all_counts[kept])
+        return pages[top], labels, matrix
+
+    def run_sample(self, event_types):
+        """
+        Uniform sample of every event seen so far.
+
+        Args:
+            event_types (list): The tailer's event names, which the batch
+                codes index
+
+        Returns:
+            WeightedSample
+        """
+        return self.reservoir.sample(event_types)
+
+    def hot_pages(self, n=20):
+        """Currently hottest pages by exponentially decayed access count."""
+        return self.hot.top('page', n)
+
+    def timeline(self, n_events):
+        """
+        Returns:
+            tuple: (bucket labels, counts[buckets, event codes])
+        """
+        windows = sorted(self.event_counts)
+        bucket, labels = self.buckets(windows)
+        matrix = np.zeros((len(labels), n_events))
+        for i, window in enumerate(windows):
+            codes, counts = self.event_counts[window]
+            matrix[bucket[i], codes] += counts
+        return labels, matrix
+
+class TraceTailer:
+    """
+    Follows a growing `timestamp: event address` text file, the format
+    DataToCSV monitors, and feeds new events into a ring buffer and
+    running aggregates.
+
+    Compressed files are replayed through one decompression stream that
+    stays open between polls, so each byte is decompressed only once.
+    """
+    # Upper bound on bytes consumed per poll, so catching up on a large
+    # backlog happens over several polls instead of one huge read
+    MAX_READ_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, input_file, buffer, aggregates, poll_interval=1.0):
+        self.input_file = input_file
+        self.buffer = buffer
+        self.aggregates = aggregates
+        self.poll_interval = poll_interval
+        self.position = 0
+        self.compression = None
+        self._file = None
+        self._partial = b''
+        self.event_types = []
+        self._event_codes = {}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def parse_lines(self, lines):
+        """Parse complete lines into column arrays, skipping malformed ones."""
+        timestamps, addresses, codes = [], [], []
+        for line in lines:
+            parts = line.split()
+            if len(parts) < 3:
+                continue
+            try:
+                timestamp = float(parts[0].rstrip(':'))
+                address = int(parts[2], 16)
+            except ValueError:
+                continue
+            event = parts[1].rstrip(':')
+            if event not in self._event_codes:
+                self._event_codes[event] = len(self.event_types)
+                self.event_types.append(event)
+            timestamps.append(timestamp)
+            addresses.append(address)
+            codes.append(self._event_codes[event])
+        return {
+            # perf script prints seconds; the buffers hold nanoseconds
+            'timestamp': (np.array(timestamps, dtype=np.float64) * 1e9).astype(np.int64),
+            'address': np.array(addresses, dtype=np.uint64),
+            'event_code': np.array(codes, dtype=np.uint16),
+        }
+
+    def poll(self):
+        """Read whatever was appended since the last poll. Returns the event count."""
+        if not os.path.exists(self.input_file):
+            return 0
+        if self._file is None:
+            self.compression = detect_compression(self.input_file)
+            self._file = open_dump(self.input_file)
+        elif self.compression is None and os.path.getsize(self.input_file) < self.position:
+            # File was truncated or replaced; start over on the next poll
+            self.close()
+            self.position = 0
+            self._partial = b''
+            return 0
+        try:
+            data = self._partial + self._file.read(self.MAX_READ_BYTES)
+        except EOFError:
+            return 0  # Compressed stream still being written
+        # Leave a trailing partial line for the next poll
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        self.position += end
+        columns = self.parse_lines(data[:end].decode('utf-8', errors='replace').splitlines())
+        with self.lock:
+            self.buffer.append(columns)
+            self.aggregates.update(columns)
+        return len(columns['timestamp'])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def start(self):
+        """Poll in a background thread until `stop` is called."""
+        def run():
+            while not self._stop.is_set():
+                self.poll()
+                self._stop.wait(self.poll_interval)
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.close()
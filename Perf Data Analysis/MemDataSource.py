@@ -0,0 +1,109 @@
+"""
+Decoding of perf's `data_src` sample field (union perf_mem_data_src in
+linux/perf_event.h) into two compact per-event codes:
+
+    mem_level  uint8  where the access was served from, an index into LEVELS
+    mem_flags  uint8  bit set of HIT, MISS, TLB_HIT, TLB_MISS, LOAD, STORE, PREFETCH
+
+Bit layout of data_src used here:
+    bits  0-4   mem_op      NA 0x01, LOAD 0x02, STORE 0x04, PFETCH 0x08, EXEC 0x10
+    bits  5-18  mem_lvl     NA 0x01, HIT 0x02, MISS 0x04, L1 0x08, LFB 0x10, L2 0x20,
+                            L3 0x40, LOC_RAM 0x80, REM_RAM1 0x100, REM_RAM2 0x200,
+                            REM_CCE1 0x400, REM_CCE2 0x800, IO 0x1000, UNC 0x2000
+    bits 26-32  mem_dtlb    NA 0x01, HIT 0x02, MISS 0x04, L1 0x08, L2 0x10, WK 0x20, OS 0x40
+    bits 33-36  mem_lvl_num L1 1, L2 2, L3 3, L4 4, ANY_CACHE 0xb, LFB 0xc, RAM 0xd, PMEM 0xe, NA 0xf
+    bit  37     mem_remote
+
+Newer kernels fill mem_lvl_num (+ mem_remote) and it takes precedence;
+older ones only set the mem_lvl bits, of which the nearest level wins.
+"""
+import numpy as np
+
+LEVELS = ['N/A', 'L1', 'LFB', 'L2', 'L3', 'L4', 'Any cache', 'RAM', 'PMEM',
+          'Remote cache', 'Remote RAM', 'IO', 'Uncached']
+LEVEL_CODES = {name: code for code, name in enumerate(LEVELS)}
+
+HIT = 0x01
+MISS = 0x02
+TLB_HIT = 0x04
+TLB_MISS = 0x08
+LOAD = 0x10
+STORE = 0x20
+PREFETCH = 0x40
+
+# mem_lvl bit -> level, farthest first so that nearer levels overwrite
+_LEGACY_LEVELS = [
+    (0x2000, 'Uncached'), (0x1000, 'IO'),
+    (0x400 | 0x800, 'Remote cache'), (0x100 | 0x200, 'Remote RAM'),
+    (0x80, 'RAM'), (0x40, 'L3'), (0x20, 'L2'), (0x10, 'LFB'), (0x08, 'L1'),
+]
+
+# mem_lvl_num -> (local level, level when mem_remote is set)
+_LEVEL_NUMBERS = {
+    0x1: ('L1', 'Remote cache'), 0x2: ('L2', 'Remote cache'), 0x3: ('L3', 'Remote cache'),
+    0x4: ('L4', 'Remote cache'), 0xb: ('Any cache', 'Remote cache'), 0xc: ('LFB', 'LFB'),
+    0xd: ('RAM', 'Remote RAM'), 0xe: ('PMEM', 'PMEM'),
+}
+
+def decode_data_src(data_src):
+    """
+    Decode raw data_src values.
+
+    Args:
+        data_src (np.ndarray): Raw 64-bit data_src values
+
+    Returns:
+        tuple: (mem_level, mem_flags) as uint8 arrays
+    """
+    data_src = np.asarray(data_src, dtype=np.uint64)
+    op = data_src & np.uint64(0x1f)
+    lvl = (data_src >> np.uint64(5)) & np.uint64(0x3fff)
+    dtlb = (data_src >> np.uint64(26)) & np.uint64(0x7f)
+    lvl_num = (data_src >> np.uint64(33)) & np.uint64(0xf)
+    remote = ((data_src >> np.uint64(37)) & np.uint64(1)).astype(bool)
+
+    level = np.zeros(len(data_src), dtype=np.uint8)
+    for bits, name in _LEGACY_LEVELS:
+        level[(lvl & np.uint64(bits)) != 0] = LEVEL_CODES[name]
+    for number, (local, far) in _LEVEL_NUMBERS.items():
+        selected = lvl_num == np.uint64(number)
+        level[selected & ~remote] = LEVEL_CODES[local]
+        level[selected & remote] = LEVEL_CODES[far]
+
+    flags = np.zeros(len(data_src), dtype=np.uint8)
+    for field, bit, flag in ((lvl, 0x02, HIT), (lvl, 0x04, MISS),
+                             (dtlb, 0x02, TLB_HIT), (dtlb, 0x04, TLB_MISS),
+                             (op, 0x02, LOAD), (op, 0x04, STORE), (op, 0x08, PREFETCH)):
+        flags[(field & np.uint64(bit)) != 0] |= flag
+    return level, flags
+
+def has_data_source(trace):
+    """True when any event of the trace carries decoded data_src information."""
+    return bool(len(trace)) and bool(trace.mem_level.any() or trace.mem_flags.any())
+
+def level_breakdown(trace):
+    """
+    Hits, misses and mean latency per memory level.
+
+    Returns:
+        dict: 'levels' (names of the levels present), 'hits', 'misses' and
+            'latency' (mean weight, NaN where no weight was sampled)
+    """
+    n_levels = len(LEVELS)
+    level = trace.mem_level.astype(np.int64)
+    hit = (trace.mem_flags & HIT) != 0
+    miss = (trace.mem_flags & MISS) != 0
+    hits = np.bincount(level[hit], minlength=n_levels)
+    misses = np.bincount(level[miss], minlength=n_levels)
+    weighted = trace.weight > 0
+    weight_sum = np.bincount(level[weighted], weights=trace.weight[weighted], minlength=n_levels)
+    weight_count = np.bincount(level[weighted], minlength=n_levels)
+    present = np.bincount(level, minlength=n_levels) > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        latency = weight_sum / weight_count
+    return {
+        'levels': [name for name, p in zip(LEVELS, present) if p],
+        'hits': hits[present],
+        'misses': misses[present],
+        'latency': latency[present],
+    }
@@ -0,0 +1,429 @@
+import copy
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from CompactTrace import CompactTrace
+from Cardinality import CardinalityProfile, HyperLogLog
+from PhaseDetector import detect_phases, phase_boundaries
+from Sampling import ReservoirSampler, WeightedSample
+
+class ChunkWriter:
+    """
+    Writes a trace as a sequence of CompactTrace .npz chunks plus a
+    manifest. Use through `ChunkedTrace.create`.
+
+    Every chunk is also streamed through a reservoir sampler, whose sample
+    is written next to the chunks on close (see `ChunkedTrace.sample`).
+    Writers of different processes can fill one directory in parallel
+    under distinct `prefix`es; `merge` then collects their chunks and
+    samples into the writer that closes the trace.
+    """
+    def __init__(self, directory, sample_events=100_000, prefix='chunk'):
+        self.directory = directory
+        self.prefix = prefix
+        self.chunks = []
+        self.reservoir = ReservoirSampler(sample_events)
+        self.timestamp_unit = None   # Decided by the first frame, see add_frame
+        os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+
+    def add(self, trace):
+        """Write one chunk (a CompactTrace) and record its ranges."""
+        if len(trace) == 0:
+            return
+        name = f"{self.prefix}-{len(self.chunks):05d}.npz"
+        trace.save(os.path.join(self.directory, name))
+        self.reservoir.add(trace)
+        self.chunks.append({
+            'file': name,
+            'events': len(trace),
+            'timestamp_min': int(trace.timestamp.min()),
+            'timestamp_max': int(trace.timestamp.max()),
+            'address_min': int(trace.address.min()),
+            'address_max': int(trace.address.max()),
+        })
+
+    def add_frame(self, df, quarantine=None):
+        """
+        Write one chunk from a string-typed DataFrame (parser output).
+
+        The first frame with a valid timestamp decides the timestamp unit
+        for all frames of the trace.
+        """
+        if self.timestamp_unit is None:
+            self.timestamp_unit = CompactTrace.timestamp_unit(df)
+        self.add(CompactTrace.from_frame(df, quarantine, self.timestamp_unit))
+
+    def merge(self, other):
+        """Append the chunks another writer put in the same directory, in order."""
+        self.chunks.extend(other.chunks)
+        self.reservoir.merge(other.reservoir)
+
+    def sample(self):
+        """Reservoir sample of the chunks written so far, as a WeightedSample."""
+        return self.reservoir.sample()
+
+    def close(self):
+        self.sample().trace.save(os.path.join(self.directory, ChunkedTrace.SAMPLE))
+        with open(os.path.join(self.directory, ChunkedTrace.MANIFEST), 'w', encoding='utf-8') as file:
+            json.dump({'chunks': self.chunks}, file, indent=1)
+
+class ChunkedTrace:
+    """
+    A trace stored on disk as bounded-size columnar chunks.
+
+    Chunks are ordinary CompactTrace .npz files, each holding at most the
+    chunk size the trace was written with, and a manifest records every
+    chunk's event count and timestamp/address ranges. Iterating loads one
+    chunk at a time, so anything written as a chunk-by-chunk pass needs
+    memory for one chunk no matter how long the trace is. A uniform
+    reservoir sample of the whole trace is stored alongside for views that
+    need individual events rather than aggregates.
+    """
+    MANIFEST = 'manifest.json'
+    SAMPLE = 'sample.npz'
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, self.MANIFEST), 'r', encoding='utf-8') as file:
+            self.chunks = json.load(file)['chunks']
+
+    @classmethod
+    def create(cls, directory, sample_events=100_000, prefix='chunk'):
+        """Start writing a chunked trace; returns a ChunkWriter."""
+        return ChunkWriter(directory, sample_events, prefix)
+
+    @classmethod
+    def from_csv(cls, csv_file, directory, chunk_events=1_000_000, quarantine=None):
+        """
+        Convert a CSV written by DataToCSV / ExtendedData2CSV chunk by chunk.
+        Rejected rows of all chunks are recorded in `quarantine` (a
+        SchemaValidation.Quarantine), if given.
+        """
+        with cls.create(directory) as writer:
+            for df in pd.read_csv(csv_file, usecols=CompactTrace.csv_columns, dtype=str, chunksize=chunk_events):
+                writer.add_frame(df, quarantine)
+        return cls(directory)
+
+    @staticmethod
+    def is_chunked(path):
+        return os.path.isfile(os.path.join(str(path), ChunkedTrace.MANIFEST))
+
+    def __len__(self):
+        return sum(chunk['events'] for chunk in self.chunks)
+
+    def __iter__(self):
+        for path in self.chunk_paths():
+            yield CompactTrace.load(path, mmap_mode='r')
+
+    def sample(self):
+        """
+        The reservoir sample written with the chunks, as a WeightedSample
+        whose `describe` gives its ratio and error bound; None for traces
+        written without one.
+        """
+        path = os.path.join(self.directory, self.SAMPLE)
+        if not os.path.isfile(path):
+            return None
+        trace = CompactTrace.load(path)
+        population = len(self)
+        return WeightedSample(trace, np.full(len(trace), population / len(trace) if len(trace) else 1.0),
+                              population)
+
+    def chunk_paths(self):
+        return [os.path.join(self.directory, chunk['file']) for chunk in self.chunks]
+
+    @property
+    def time_range(self):
+        if not self.chunks:
+            return 0, 0
+        return (min(chunk['timestamp_min'] for chunk in self.chunks),
+                max(chunk['timestamp_max'] for chunk in self.chunks))
+
+    @property
+    def address_range(self):
+        if not self.chunks:
+            return 0, 0
+        return (min(chunk['address_min'] for chunk in self.chunks),
+                max(chunk['address_max'] for chunk in self.chunks))
+
+def _merge_sparse(keys, counts, new_keys, new_counts):
+    """Add two sparse key -> count tables."""
+    keys, inverse = np.unique(np.concatenate((keys, new_keys)), return_inverse=True)
+    return keys, np.bincount(inverse, weights=np.concatenate((counts, new_counts))).astype(np.int64)
+
+def _time_bins(timestamp, start, span, n_time_bins, boundaries):
+    """Time bucket of every timestamp: equal-width bins, or between `boundaries`."""
+    if boundaries is not None:
+        return np.searchsorted(boundaries, timestamp, side='right').astype(np.int64)
+    return np.clip((timestamp - start) * n_time_bins // (span + 1), 0, n_time_bins - 1).astype(np.int64)
+
+class HeatmapCounts:
+    """
+    Sparse (page, time bin) access counts over a fixed time axis.
+
+    Memory is proportional to the number of non-empty cells, not events.
+    """
+    def __init__(self, start, span, n_time_bins=50, page_size=CompactTrace.PAGE_SIZE, boundaries=None):
+        """
+        Args:
+            start, span (int): Time axis origin and length in nanoseconds,
+                usually `ChunkedTrace.time_range`
+            n_time_bins (int): Number of equal-width time bins (<= 4096)
+            boundaries (np.ndarray): Sorted inner edges of the time buckets
+                (e.g. PhaseDetector.phase_boundaries); replaces the
+                equal-width bins with len(boundaries) + 1 buckets
+        """
+        if boundaries is not None:
+            boundaries = np.asarray(boundaries, dtype=np.int64)
+            n_time_bins = len(boundaries) + 1
+        if n_time_bins > 4096:
+            raise ValueError("HeatmapCounts supports at most 4096 time bins")
+        self.start = start
+        self.span = max(span, 1)
+        self.n_time_bins = n_time_bins
+        self.page_size = page_size
+        self.boundaries = boundaries
+        self.keys = np.zeros(0, dtype=np.uint64)   # page * n_time_bins + bin
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def time_bins(self, timestamp):
+        return _time_bins(timestamp, self.start, self.span, self.n_time_bins, self.boundaries).astype(np.uint64)
+
+    def update(self, trace):
+        pages = trace.address // np.uint64(self.page_size)
+        cells, counts = np.unique(pages * np.uint64(self.n_time_bins) + self.time_bins(trace.timestamp),
+                                  return_counts=True)
+        self.keys, self.counts = _merge_sparse(self.keys, self.counts, cells, counts)
+
+    def merge(self, other):
+        self.keys, self.counts = _merge_sparse(self.keys, self.counts, other.keys, other.counts)
+
+    def matrix(self, max_pages=100):
+        """
+        Returns:
+            tuple: (pages, counts[pages, time bins]) for the `max_pages`
+                most accessed pages, in address order
+        """
+        cell_pages = self.keys // np.uint64(self.n_time_bins)
+        pages, rows = np.unique(cell_pages, return_inverse=True)
+        totals = np.bincount(rows, weights=self.counts, minlength=len(pages))
+        top = np.sort(np.argsort(totals)[::-1][:max_pages])
+        selected = np.isin(rows, top)
+        matrix = np.zeros((len(top), self.n_time_bins), dtype=np.int64)
+        matrix[np.searchsorted(top, rows[selected]),
+               (self.keys[selected] % np.uint64(self.n_time_bins)).astype(np.int64)] = self.counts[selected]
+        return pages[top], matrix
+
+class EventMix:
+    """Occurrences of every event name per time bin."""
+    def __init__(self, start, span, n_time_bins=50, boundaries=None):
+        """
+        Args:
+            start, span, n_time_bins, boundaries: Time axis, as for HeatmapCounts
+        """
+        if boundaries is not None:
+            boundaries = np.asarray(boundaries, dtype=np.int64)
+            n_time_bins = len(boundaries) + 1
+        self.start = start
+        self.span = max(span, 1)
+        self.n_time_bins = n_time_bins
+        self.boundaries = boundaries
+        self.counts = {}   # event name -> counts per time bin
+
+    def update(self, trace):
+        bins = _time_bins(trace.timestamp, self.start, self.span, self.n_time_bins, self.boundaries)
+        n_types = len(trace.event_types)
+        table = np.bincount(bins * n_types + trace.event_code,
+                            minlength=self.n_time_bins * n_types).reshape(self.n_time_bins, n_types)
+        # Codes are per chunk; names are what lines chunks up
+        for code, name in enumerate(trace.event_types):
+            if table[:, code].any():
+                self.counts[name] = self.counts.get(name, 0) + table[:, code]
+
+    def merge(self, other):
+        for name, counts in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + counts
+
+    def frame(self):
+        """Time bins x event names as a DataFrame."""
+        return pd.DataFrame(self.counts, index=pd.RangeIndex(self.n_time_bins, name='time_bin'))
+
+class Histogram:
+    """Counts of one column over fixed bin edges."""
+    def __init__(self, column, edges):
+        """
+        Args:
+            column (str): Trace column or derived column ('page', 'line')
+            edges (np.ndarray): Bin edges, fixed up front so partial
+                histograms of different chunks add up
+        """
+        self.column = column
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+    def update(self, trace):
+        values = getattr(trace, self.column).astype(np.float64)
+        self.counts += np.histogram(values, bins=self.edges)[0]
+
+    def merge(self, other):
+        self.counts += other.counts
+
+class SummaryStats:
+    """
+    Totals behind the parser's summary: event count, time and address
+    ranges, per-event and per-DSO counts, and approximate distinct
+    addresses and pages (HyperLogLog).
+    """
+    def __init__(self):
+        self.n_events = 0
+        self.timestamp_range = None
+        self.address_range = None
+        self.event_counts = {}
+        self.dso_counts = {}
+        self.addresses = HyperLogLog()
+        self.pages = HyperLogLog()
+
+    @staticmethod
+    def _union(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a[0], b[0]), max(a[1], b[1])
+
+    @staticmethod
+    def _add_counts(totals, names, counts):
+        for name, count in zip(names, counts):
+            if count:
+                totals[name] = totals.get(name, 0) + int(count)
+
+    def update(self, trace):
+        if len(trace) == 0:
+            return
+        self.n_events += len(trace)
+        self.timestamp_range = self._union(self.timestamp_range,
+                                           (int(trace.timestamp.min()), int(trace.timestamp.max())))
+        self.address_range = self._union(self.address_range,
+                                         (int(trace.address.min()), int(trace.address.max())))
+        self._add_counts(self.event_counts, trace.event_types,
+                         np.bincount(trace.event_code, minlength=len(trace.event_types)))
+        self._add_counts(self.dso_counts, trace.dsos,
+                         np.bincount(trace.dso_code, minlength=len(trace.dsos)))
+        self.addresses.update(trace.address)
+        self.pages.update(trace.page)
+
+    def merge(self, other):
+        self.n_events += other.n_events
+        self.timestamp_range = self._union(self.timestamp_range, other.timestamp_range)
+        self.address_range = self._union(self.address_range, other.address_range)
+        self._add_counts(self.event_counts, other.event_counts.keys(), other.event_counts.values())
+        self._add_counts(self.dso_counts, other.dso_counts.keys(), other.dso_counts.values())
+        self.addresses.merge(other.addresses)
+        self.pages.merge(other.pages)
+
+    def lines(self):
+        """Human-readable summary, one line per item."""
+        lines = [
+            f"Total events processed: {self.n_events}",
+            f"Unique event types: {len(self.event_counts)}",
+            "Event type distribution:",
+        ]
+        for name, count in sorted(self.event_counts.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name}: {count}")
+        if self.timestamp_range:
+            lines.append(f"Time range: {pd.to_datetime(self.timestamp_range[0], unit='ns')} "
+                         f"to {pd.to_datetime(self.timestamp_range[1], unit='ns')}")
+            lines.append(f"Address range: 0x{self.address_range[0]:x} to 0x{self.address_range[1]:x}")
+        lines.append(f"Number of unique addresses: ~{self.addresses.estimate():,.0f} "
+                     f"(±{self.addresses.relative_error:.1%})")
+        lines.append(f"Number of unique pages: ~{self.pages.estimate():,.0f} "
+                     f"(±{self.pages.relative_error:.1%})")
+        return lines
+
+def standard_aggregations(chunked, n_time_bins=50, n_address_bins=50, bucketing='uniform'):
+    """
+    The aggregations the dashboards need, laid out from the manifest ranges.
+
+    With bucketing='phase' the time axis of the heatmap and event mix is
+    one bucket per execution phase, detected in one streaming pass over
+    the chunks first. The cardinality profile (distinct addresses, lines
+    and pages per window, thread and DSO) always uses `n_time_bins`
+    equal-width windows.
+    """
+    start, end = chunked.time_range
+    low, high = chunked.address_range
+    boundaries = phase_boundaries(detect_phases(chunked)) if bucketing == 'phase' else None
+    return {
+        'heatmap': HeatmapCounts(start, end - start, n_time_bins, boundaries=boundaries),
+        'event_mix': EventMix(start, end - start, n_time_bins, boundaries),
+        'address_histogram': Histogram('address', np.linspace(low, high + 1, n_address_bins + 1)),
+        'cardinality': CardinalityProfile.for_range(start, end, n_time_bins),
+        'summary': SummaryStats(),
+    }
+
+def _aggregate_chunk(path, aggregations):
+    """Worker entry point: run empty aggregations over one chunk."""
+    trace = CompactTrace.load(path, mmap_mode='r')
+    for aggregation in aggregations.values():
+        aggregation.update(trace)
+    return aggregations
+
+def run_aggregations(chunked, aggregations, workers=1):
+    """
+    Run mergeable aggregations over every chunk of a trace.
+
+    Each aggregation only needs `update(trace)` and `merge(other)`.
+    With one worker the chunks are folded in sequentially; with more, each
+    worker process aggregates whole chunks into fresh partial results that
+    are merged here, so peak memory is about one chunk per worker.
+
+    Args:
+        chunked (ChunkedTrace): Trace to aggregate
+        aggregations (dict): name -> aggregation; updated in place
+        workers (int): Worker processes
+
+    Returns:
+        dict: The same aggregations, now covering the whole trace
+    """
+    if workers <= 1:
+        for trace in chunked:
+            for aggregation in aggregations.values():
+                aggregation.update(trace)
+        return aggregations
+
+    empty = copy.deepcopy(aggregations)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_aggregate_chunk, path, copy.deepcopy(empty))
+                   for path in chunked.chunk_paths()]
+        for future in futures:
+            for name, partial in future.result().items():
+                aggregations[name].merge(partial)
+    return aggregations
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python OutOfCore.py <perf dump | csv> <chunk_dir>")
+        sys.exit(1)
+    source, directory = sys.argv[1], sys.argv[2]
+    if ChunkedTrace.is_chunked(directory):
+        chunked = ChunkedTrace(directory)
+    elif source.endswith('.csv'):
+        chunked = ChunkedTrace.from_csv(source, directory)
+    else:
+        from ExtendedData2CSV import PerfDataProcessor
+        chunked = PerfDataProcessor(source, None).process_perf_output_chunked(directory)
+    aggregations = run_aggregations(chunked, standard_aggregations(chunked), workers=os.cpu_count() or 1)
+    print('\n'.join(aggregations['summary'].lines()))
+
+if __name__ == '__main__':
+    main()
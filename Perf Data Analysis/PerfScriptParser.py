@@ -0,0 +1,254 @@
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from CompactTrace import CompactTrace
+from CompressedInput import open_dump, split_ranges, supports_random_access
+from MemDataSource import decode_data_src
+from OutOfCore import ChunkedTrace
+
+class PerfScriptParser:
+    """
+    Fast parser for fixed-field memory sample listings:
+
+        perf script -F time,tid,ip,addr,data_src,weight,sym,dso
+        perf mem report -D
+
+    Unlike the `perf report -D` raw dump, these print one sample per line
+    with the fields in a fixed order, so every line is handled with a
+    couple of str.split calls and int conversions; there is no regular
+    expression anywhere on the per-line path. Lines that do not have the
+    expected shape are counted and skipped.
+
+    `perf script` lines look like
+
+        3598 12345.678901:  7ffd82ad0ab8  68100142 |OP LOAD|LVL L1 hit|...|BLK  N/A  12  7f23228636d0 func+0x10 (/lib/libc.so.6)
+
+    i.e. [comm] [pid/]tid time: addr data_src |decoded data_src weight ip
+    sym (dso). Everything before the decoded block is read from the right,
+    so extra leading fields such as comm are tolerated. `perf mem report -D`
+    lines are laid out by their "# PID, TID, IP, ADDR, ..., DSRC, SYMBOL"
+    header; they carry no timestamps, so samples are numbered in file order
+    instead.
+
+    Symbols are not kept: CompactTrace has no symbol column. Every sample
+    becomes a PERF_RECORD_SAMPLE event whose raw_offset/raw_length point at
+    its line, so RawRecordReader can show it.
+    """
+    EVENT_TYPE = 'PERF_RECORD_SAMPLE'
+
+    def __init__(self, input_file):
+        """
+        Args:
+            input_file (str): `perf script` or `perf mem report -D` output,
+                plain or compressed
+        """
+        self.input_file = input_file
+        self.malformed = 0
+        self.dsos = []
+        self.logger = logging.getLogger(__name__)
+
+    def iter_chunks(self, chunk_events=1_000_000, start=0, end=None):
+        """
+        Parse the input, yielding CompactTrace chunks of at most
+        `chunk_events` samples. All chunks share one (growing) DSO table.
+
+        Args:
+            chunk_events (int): Samples per chunk
+            start, end (int): Parse only the lines starting in this byte
+                range of the (decompressed) input, as cut by
+                CompressedInput.split_ranges
+        """
+        rows = []
+        dso_codes = {}
+        header = None
+        sequence = 0
+        position = start
+        self.malformed = 0
+
+        # Lines stay bytes: split() and int() work on them directly, and only
+        # DSO names seen for the first time are ever decoded
+        with open_dump(self.input_file) as file:
+            if start:
+                file.seek(start)
+            for line in file:
+                if end is not None and position >= end:
+                    break
+                line_start = position
+                position += len(line)
+
+                if line.startswith(b'#'):
+                    if b'DSRC' in line:
+                        header = [name.strip() for name in line[1:].decode('utf-8', errors='replace').split(',')]
+                    continue
+                try:
+                    if header is None:
+                        fields = self._script_fields(line)
+                    else:
+                        fields = self._mem_report_fields(line, header, sequence)
+                except (ValueError, IndexError, KeyError):
+                    if line.strip():
+                        self.malformed += 1
+                    continue
+                if fields is None:
+                    # Blank lines are layout; any other line without a
+                    # data_src block is not a memory sample we can use
+                    if line.strip():
+                        self.malformed += 1
+                    continue
+                sequence += 1
+
+                dso = fields[-1]
+                code = dso_codes.get(dso)
+                if code is None:
+                    code = dso_codes[dso] = len(self.dsos)
+                    self.dsos.append(dso.decode('utf-8', errors='replace'))
+                rows.append(fields[:-1] + (code, line_start, position - line_start))
+
+                if len(rows) >= chunk_events:
+                    yield self._build(rows)
+                    rows = []
+
+        if rows:
+            yield self._build(rows)
+        if self.malformed:
+            self.logger.warning(f"Skipped {self.malformed} malformed lines in {self.input_file}")
+
+    def parse(self):
+        """Parse the whole input into a single CompactTrace."""
+        chunks = list(self.iter_chunks(chunk_events=sys.maxsize))
+        if not chunks:
+            return CompactTrace({}, [self.EVENT_TYPE], [''])
+        return chunks[0]
+
+    @staticmethod
+    def _script_fields(line):
+        """Split one `perf script` line; None for lines without a data_src block."""
+        first_bar = line.find(b'|')
+        if first_bar < 0:
+            return None
+        head = line[:first_bar].split()
+        # The decoded block ends in an unterminated "|LCK ..." or "|BLK ..."
+        # segment of words; the weight is the first all-digit token after it
+        tail = line[line.rindex(b'|') + 1:].split()
+        weight = 0
+        while not tail[weight].isdigit():
+            weight += 1
+
+        pid, _, tid = head[-4].rpartition(b'/')
+        seconds, _, fraction = head[-3].rstrip(b':').partition(b'.')
+        timestamp = int(seconds) * 1_000_000_000 + int(fraction or 0) * 10 ** (9 - len(fraction))
+        dso = tail[-1]
+        if dso.startswith(b'(') and dso.endswith(b')'):
+            dso = dso[1:-1]
+        return (timestamp, int(pid or 0), int(tid), int(head[-2], 16), int(head[-1], 16),
+                int(tail[weight]), int(tail[weight + 1], 16), dso)
+
+    @staticmethod
+    def _mem_report_fields(line, header, sequence):
+        """Split one `perf mem report -D` line laid out by its header."""
+        values = line.decode('utf-8', errors='replace').split(None, len(header) - 1)
+        if not values:
+            return None
+        fields = dict(zip(header, values))
+        dso = fields.get('SYMBOL', '').strip().partition(':')[0]
+        return (sequence, int(fields['PID']), int(fields['TID']), int(fields['ADDR'], 0),
+                int(fields['DSRC'], 0), int(fields.get('LOCAL WEIGHT') or fields.get('WEIGHT') or 0),
+                int(fields['IP'], 0), dso.encode('utf-8'))
+
+    # Layout of the rows collected by iter_chunks
+    ROW_COLUMNS = ('timestamp', 'process_id', 'thread_id', 'address', 'data_src',
+                   'weight', 'ip', 'dso_code', 'raw_offset', 'raw_length')
+
+    def _build(self, rows):
+        """Turn collected rows into a CompactTrace."""
+        table = np.array(rows, dtype=np.uint64)
+        arrays = {name: table[:, i] for i, name in enumerate(self.ROW_COLUMNS)}
+        arrays['mem_level'], arrays['mem_flags'] = decode_data_src(arrays.pop('data_src'))
+        arrays['event_code'] = np.zeros(len(table), dtype=np.uint16)
+        return CompactTrace(arrays, [self.EVENT_TYPE], list(self.dsos) or [''])
+
+    def process(self, output_file):
+        """
+        Parse the input and write it as a .npz trace or an enhanced CSV
+        that CompactTrace.from_csv reads back.
+        """
+        self.logger.info(f"Starting to process {self.input_file}")
+        trace = self.parse()
+        if str(output_file).endswith('.npz'):
+            trace.save(output_file)
+        else:
+            df = trace.to_frame(['timestamp', 'event_type', 'thread_id', 'process_id', 'dso',
+                                 'raw_offset', 'raw_length', 'weight', 'mem_level', 'mem_flags'])
+            df.insert(1, 'address', [f"0x{value:x}" for value in trace.address.tolist()])
+            df['ip_address'] = [f"0x{value:x}" for value in trace.ip.tolist()]
+            df.to_csv(output_file, index=False)
+        self.logger.info(f"Parsed {len(trace)} samples into {output_file}")
+        return trace
+
+    def is_mem_report(self, probe_bytes=65536):
+        """True for `perf mem report -D` output (a '# ..., DSRC, ...' header)."""
+        with open_dump(self.input_file) as file:
+            head = file.read(probe_bytes)
+        return any(line.startswith(b'#') and b'DSRC' in line for line in head.splitlines())
+
+    def process_chunked(self, output_dir, chunk_events=1_000_000, workers=1):
+        """
+        Parse the input straight into an out-of-core chunked trace.
+
+        With several workers a `perf script` listing that allows random
+        access (plain text or seekable-format zstd) is cut into line-aligned
+        byte ranges, and each range is parsed into its own chunks by a
+        separate process. `perf mem report -D` output is always parsed
+        sequentially: its samples are numbered in file order and laid out
+        by a header at the top.
+        """
+        if workers > 1 and supports_random_access(self.input_file) and not self.is_mem_report():
+            ranges = split_ranges(self.input_file, workers)
+        else:
+            ranges = [(0, None)]
+        with ChunkedTrace.create(output_dir) as writer:
+            if len(ranges) == 1:
+                for chunk in self.iter_chunks(chunk_events):
+                    writer.add(chunk)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(_parse_range, self.input_file, output_dir, index, start, end, chunk_events)
+                        for index, (start, end) in enumerate(ranges)
+                    ]
+                    self.malformed = 0
+                    # Ranges are in file order, so their chunks are too
+                    for future in futures:
+                        part, malformed = future.result()
+                        writer.merge(part)
+                        self.malformed += malformed
+        self.logger.info(f"Wrote {len(writer.chunks)} chunks to {output_dir} from {len(ranges)} range(s)")
+        return ChunkedTrace(output_dir)
+
+def _parse_range(input_file, output_dir, index, start, end, chunk_events):
+    """Worker entry point: parse one byte range into chunks; returns (writer, malformed lines)."""
+    parser = PerfScriptParser(input_file)
+    writer = ChunkedTrace.create(output_dir, prefix=f"chunk-{index:03d}")
+    for chunk in parser.iter_chunks(chunk_events, start, end):
+        writer.add(chunk)
+    return writer, parser.malformed
+
+def is_perf_script(input_file, probe_bytes=65536):
+    """
+    Tell `perf script` / `perf mem report -D` listings from `perf report -D`
+    dumps by looking at the start of the file.
+    """
+    with open_dump(input_file) as file:
+        head = file.read(probe_bytes).decode('utf-8', errors='replace')
+    return 'PERF_RECORD_' not in head and ('|' in head or 'DSRC' in head)
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python PerfScriptParser.py <perf script | perf mem report -D output> <output.csv|.npz>")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    PerfScriptParser(sys.argv[1]).process(sys.argv[2])
+
+if __name__ == '__main__':
+    main()
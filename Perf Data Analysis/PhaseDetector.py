@@ -0,0 +1,229 @@
+import os
+import numpy as np
+from CompactTrace import CompactTrace
+
+class PhaseDetector:
+    """
+    Online execution-phase detector over a streaming trace.
+
+    Events are grouped into windows of `window_events` consecutive events.
+    When a window closes it is reduced to a feature vector:
+
+        - access rate        events per second in the window (log scale)
+        - working-set size   distinct pages touched (log scale)
+        - dominant DSO       DSO with the most events and its share
+        - stride mix         fractions of line deltas that are 0, +-1,
+                             small (<= 16 lines) and large
+
+    The window is compared with the running centroid of the current phase.
+    A phase boundary is declared once `confirm_windows` consecutive windows
+    are further than `threshold` from the centroid; shorter excursions are
+    folded back into the current phase. Each event is touched a constant
+    number of times and only the current window and phase summaries are
+    kept, so the detector runs in linear time with bounded memory.
+    """
+    STRIDE_CLASSES = ('zero', 'sequential', 'small', 'large')
+
+    def __init__(self, window_events=10_000, threshold=1.0, confirm_windows=2,
+                 page_size=CompactTrace.PAGE_SIZE, line_size=CompactTrace.CACHE_LINE_SIZE):
+        """
+        Args:
+            window_events (int): Events per feature window
+            threshold (float): Feature distance that counts as a change;
+                1.0 corresponds to e.g. a 4x change in access rate or
+                working set, a different dominant DSO, or a completely
+                different stride mix
+            confirm_windows (int): Consecutive distant windows needed to
+                open a new phase
+        """
+        self.window_events = window_events
+        self.threshold = threshold
+        self.confirm_windows = confirm_windows
+        self.page_size = np.uint64(page_size)
+        self.line_size = np.uint64(line_size)
+
+        self.pending = []          # Column chunks of the open window
+        self.pending_events = 0
+        self.last_line = None      # Carries stride computation across windows
+        self.current = None        # Summary of the open phase
+        self.candidates = []       # Distant windows awaiting confirmation
+        self.phases = []           # Closed phases
+
+    def update(self, timestamp, address, dso_code):
+        """Feed a batch of events (parallel arrays in time order)."""
+        start = 0
+        while start < len(timestamp):
+            take = min(self.window_events - self.pending_events, len(timestamp) - start)
+            end = start + take
+            self.pending.append((timestamp[start:end], address[start:end], dso_code[start:end]))
+            self.pending_events += take
+            start = end
+            if self.pending_events == self.window_events:
+                self._close_window()
+
+    def finish(self):
+        """Flush the partial window and the open phase; returns all phases."""
+        if self.pending_events:
+            self._close_window()
+        for window in self.candidates:
+            self._absorb(window)
+        self.candidates = []
+        if self.current is not None:
+            self.phases.append(self._summarize(self.current))
+            self.current = None
+        return self.phases
+
+    def _window_features(self):
+        timestamp = np.concatenate([chunk[0] for chunk in self.pending])
+        address = np.concatenate([chunk[1] for chunk in self.pending])
+        dso_code = np.concatenate([chunk[2] for chunk in self.pending])
+        self.pending = []
+        self.pending_events = 0
+
+        lines = (address // self.line_size).astype(np.int64)
+        previous = lines[:1] if self.last_line is None else np.array([self.last_line])
+        deltas = np.abs(np.diff(np.concatenate((previous, lines))))
+        self.last_line = lines[-1]
+        stride_mix = np.array([
+            np.mean(deltas == 0),
+            np.mean(deltas == 1),
+            np.mean((deltas > 1) & (deltas <= 16)),
+            np.mean(deltas > 16),
+        ])
+
+        duration = max(int(timestamp[-1]) - int(timestamp[0]), 1) / 1e9
+        dso_counts = np.bincount(dso_code)
+        return {
+            'start': int(timestamp[0]),
+            'end': int(timestamp[-1]),
+            'events': len(timestamp),
+            'log_rate': np.log2(len(timestamp) / duration),
+            'log_working_set': np.log2(len(np.unique(address // self.page_size))),
+            'dso_counts': dso_counts,
+            'stride_mix': stride_mix,
+        }
+
+    def _distance(self, window):
+        phase = self.current
+        n = phase['windows']
+        distance = (
+            abs(window['log_rate'] - phase['log_rate'] / n) / 2 +
+            abs(window['log_working_set'] - phase['log_working_set'] / n) / 2 +
+            np.abs(window['stride_mix'] - phase['stride_mix'] / n).sum() / 2
+        )
+        if np.argmax(window['dso_counts']) != np.argmax(phase['dso_counts']):
+            distance += 1.0
+        return distance
+
+    def _close_window(self):
+        window = self._window_features()
+        if self.current is None:
+            self._start_phase([window])
+        elif self._distance(window) <= self.threshold:
+            # Short excursion: the candidates belonged to this phase after all
+            for candidate in self.candidates:
+                self._absorb(candidate)
+            self.candidates = []
+            self._absorb(window)
+        else:
+            self.candidates.append(window)
+            if len(self.candidates) >= self.confirm_windows:
+                self.phases.append(self._summarize(self.current))
+                self._start_phase(self.candidates)
+                self.candidates = []
+
+    def _start_phase(self, windows):
+        self.current = None
+        for window in windows:
+            self._absorb(window)
+
+    def _absorb(self, window):
+        """Add a window to the open phase's running sums."""
+        if self.current is None:
+            self.current = {
+                'start': window['start'], 'end': window['end'], 'events': 0, 'windows': 0,
+                'log_rate': 0.0, 'log_working_set': 0.0,
+                'stride_mix': np.zeros(len(self.STRIDE_CLASSES)),
+                'dso_counts': np.zeros(0, dtype=np.int64),
+            }
+        phase = self.current
+        phase['end'] = window['end']
+        phase['events'] += window['events']
+        phase['windows'] += 1
+        phase['log_rate'] += window['log_rate']
+        phase['log_working_set'] += window['log_working_set']
+        phase['stride_mix'] = phase['stride_mix'] + window['stride_mix']
+        size = max(len(phase['dso_counts']), len(window['dso_counts']))
+        phase['dso_counts'] = (
+            np.pad(phase['dso_counts'], (0, size - len(phase['dso_counts']))) +
+            np.pad(window['dso_counts'], (0, size - len(window['dso_counts'])))
+        )
+
+    def _summarize(self, phase):
+        n = phase['windows']
+        return {
+            'start': phase['start'],
+            'end': phase['end'],
+            'events': phase['events'],
+            'access_rate': float(2 ** (phase['log_rate'] / n)),
+            'working_set_pages': float(2 ** (phase['log_working_set'] / n)),
+            'dominant_dso': int(np.argmax(phase['dso_counts'])),
+            'stride_mix': dict(zip(self.STRIDE_CLASSES, (phase['stride_mix'] / n).round(4).tolist())),
+        }
+
+def detect_phases(trace, batch_events=1_000_000, **kwargs):
+    """
+    Run the detector over a whole trace, streaming it batch by batch.
+
+    The accesses of each batch (a chunk of a ChunkedTrace, or
+    `batch_events` consecutive events of an in-memory trace) are fed in
+    their time order (CompactTrace.access_order), so only one batch is
+    ever sorted and memory stays bounded by the batch size. Traces are
+    written in time order, so sorting within a batch is enough.
+
+    Args:
+        trace: Anything CompactTrace.open accepts, or an iterable of
+            CompactTrace chunks such as a ChunkedTrace
+        batch_events (int): Events per batch of an in-memory trace
+        **kwargs: PhaseDetector options
+
+    Returns:
+        list: Phase summaries (start/end timestamps, event count, features);
+            'dominant_dso' is the DSO's name
+    """
+    if isinstance(trace, (str, os.PathLike, CompactTrace)):
+        trace = CompactTrace.open(trace)
+        batches = (trace.take(slice(start, start + batch_events)) for start in range(0, len(trace), batch_events))
+    else:
+        batches = trace
+    detector = PhaseDetector(**kwargs)
+    # DSO codes are per chunk; feed the detector codes into one shared table
+    dsos, dso_codes = [], {}
+    for batch in batches:
+        for dso in batch.dsos:
+            if dso not in dso_codes:
+                dso_codes[dso] = len(dsos)
+                dsos.append(dso)
+        recode = np.array([dso_codes[dso] for dso in batch.dsos], dtype=np.int64)
+        order = batch.access_order()
+        detector.update(batch.timestamp[order], batch.address[order], recode[batch.dso_code[order]])
+    phases = detector.finish()
+    for phase in phases:
+        phase['dominant_dso'] = dsos[phase['dominant_dso']] if dsos else ''
+    return phases
+
+def phase_boundaries(phases):
+    """Start timestamps of every phase but the first: the edges between time buckets."""
+    starts = np.array([phase['start'] for phase in phases[1:]], dtype=np.int64)
+    # A trace that is not in time order across batches can report an
+    # earlier start for a later phase; keep the edges sorted for searchsorted
+    return np.maximum.accumulate(starts) if len(starts) else starts
+
+def phase_ids(timestamp, phases):
+    """
+    Phase index of every event, for using phases as time buckets.
+
+    Events before the first phase start fall into phase 0 and events after
+    the last phase end into the last phase.
+    """
+    return np.searchsorted(phase_boundaries(phases), timestamp, side='right').astype(np.int64)
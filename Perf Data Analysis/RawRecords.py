@@ -0,0 +1,94 @@
+import re
+import threading
+from CompressedInput import open_dump
+
+class RawRecordReader:
+    """
+    On-demand access to the raw records of a `perf report -D` dump.
+
+    ExtendedData2CSV stores only the byte offset and length of each record
+    instead of copying its hex dump into every output row. This reader
+    seeks to those offsets in the original dump and decodes just the
+    records that were asked for, e.g. the events behind a clicked heatmap
+    cell.
+
+    The open dump handles are shared by all threads (Dash serves callbacks
+    from a thread pool), so each seek + read runs under a lock; handles may
+    be decompression streams, which have no positional read.
+    """
+    # ".  0010:  32 01 00 00 ...  2..............."
+    HEX_DUMP_LINE = re.compile(r'^\.\s+[0-9a-f]+:\s+(.*)$')
+
+    def __init__(self, source_file):
+        """
+        Args:
+            source_file (str or list): Path to the perf text dump the offsets
+                refer to, plain or compressed (seeking is only fast in plain
+                files and seekable-format zstd), or the list of shard dumps
+                a merged trace was parsed from, indexed by `shard_id`
+        """
+        self.source_file = source_file
+        self.source_files = list(source_file) if isinstance(source_file, (list, tuple)) else [source_file]
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files = {}
+
+    def read_text(self, offset, length, shard_id=0):
+        """Return the record's lines exactly as they appear in the dump."""
+        shard_id = int(shard_id)
+        with self._lock:
+            if shard_id not in self._files:
+                # Small buffer: each lookup reads one record at a random offset
+                self._files[shard_id] = open_dump(self.source_files[shard_id], buffer_size=64 * 1024)
+            file = self._files[shard_id]
+            file.seek(int(offset))
+            data = file.read(int(length))
+        return data.decode('utf-8', errors='replace')
+
+    def read_bytes(self, offset, length, shard_id=0):
+        """Decode the record's hex dump back into the raw event bytes."""
+        data = bytearray()
+        for line in self.read_text(offset, length, shard_id).splitlines():
+            match = self.HEX_DUMP_LINE.match(line.strip())
+            if not match:
+                continue
+            # At most 16 byte columns, followed by the ASCII rendering
+            for token in match.group(1).split()[:16]:
+                if len(token) != 2:
+                    break
+                try:
+                    data.append(int(token, 16))
+                except ValueError:
+                    break
+        return bytes(data)
+
+    def read_records(self, offsets, lengths, limit=10, shard_ids=None):
+        """
+        Fetch the text of up to `limit` records.
+
+        Args:
+            offsets, lengths: Parallel sequences, e.g. the `raw_offset` and
+                `raw_length` columns of a CompactTrace selection
+            limit (int): Upper bound on records read, keeps UI callbacks cheap
+            shard_ids: Optional parallel `shard_id` column for merged traces
+        """
+        if shard_ids is None:
+            shard_ids = [0] * len(offsets)
+        records = []
+        for offset, length, shard_id in zip(offsets, lengths, shard_ids):
+            if len(records) >= limit:
+                break
+            if length:
+                records.append(self.read_text(offset, length, shard_id))
+        return records
@@ -0,0 +1,239 @@
+import numpy as np
+from CompactTrace import CompactTrace
+
+class WeightedSample:
+    """
+    A sampled subset of a trace together with per-event weights.
+
+    Each weight is the number of original events the sampled event stands
+    for (population size / sample size of its stratum), so weighted counts
+    are unbiased estimates of the exact counts. Views use `describe` to
+    print the sampling ratio and a 95% error bound next to the figure.
+    """
+    def __init__(self, trace, weights, population, indices=None):
+        """
+        Args:
+            trace (CompactTrace): The sampled events
+            weights (np.ndarray): Weight of each sampled event
+            population (int): Number of events the sample was drawn from
+            indices (np.ndarray): Positions of the sampled events in the
+                source trace, when it is still available
+        """
+        self.trace = trace
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.population = int(population)
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.trace)
+
+    @property
+    def ratio(self):
+        """Fraction of the population that was kept."""
+        return len(self.trace) / self.population if self.population else 1.0
+
+    @property
+    def is_exact(self):
+        return len(self.trace) == self.population
+
+    def bin_estimates(self, bin_ids, n_bins, weights=None, z=1.96):
+        """
+        Estimate per-bin counts with a confidence half-width.
+
+        Treating every event as kept independently with probability 1/w,
+        the variance of a bin's weighted count is sum(w * (w - 1)) over the
+        sampled events in that bin.
+
+        Args:
+            bin_ids (np.ndarray): Bin of each sampled event
+            n_bins (int): Number of bins
+            weights (np.ndarray): Weights of a filtered subset of the
+                sample, aligned with `bin_ids`; defaults to all weights
+            z (float): Normal quantile of the interval (1.96 for 95%)
+
+        Returns:
+            tuple: (estimated counts, half-width of the z-level interval)
+        """
+        weights = self.weights if weights is None else np.asarray(weights, dtype=np.float64)
+        estimates = np.bincount(bin_ids, weights=weights, minlength=n_bins)
+        variance = np.bincount(bin_ids, weights=weights * (weights - 1), minlength=n_bins)
+        return estimates, z * np.sqrt(variance)
+
+    def describe(self, bin_ids=None, n_bins=None, weights=None):
+        """Short human-readable label: sampling ratio and worst relative bin error."""
+        if self.is_exact:
+            return 'exact'
+        label = f'sampled {self.ratio:.2%} (1:{1 / self.ratio:.0f})'
+        if bin_ids is not None and len(bin_ids):
+            estimates, halfwidth = self.bin_estimates(
+                bin_ids, n_bins or int(bin_ids.max()) + 1, weights)
+            # Ignore bins holding under 1% of the events; their relative
+            # error is large but they barely show up in the chart
+            visible = estimates >= 0.01 * estimates.sum()
+            if visible.any():
+                relative = (halfwidth[visible] / estimates[visible]).max()
+                label += f', ±{relative:.1%} per bin at 95%'
+        return label
+
+def stratified_sample(trace, target_size, n_time_buckets=100, min_per_stratum=1, seed=0, buckets=None):
+    """
+    Draw a stratified sample per (time bucket, event type).
+
+    Each stratum gets a share of `target_size` proportional to its size,
+    but never fewer than `min_per_stratum` events, so short bursts and rare
+    event types stay visible in sampled views.
+
+    Args:
+        trace (CompactTrace): Trace to sample from
+        target_size (int): Approximate number of events to keep
+        n_time_buckets (int): Number of equal-width time buckets
+        min_per_stratum (int): Lower bound on events kept per stratum
+        seed (int): Seed for reproducible samples
+        buckets (np.ndarray): Optional time bucket of every event (e.g.
+            detected phases); overrides the equal-width buckets
+
+    Returns:
+        WeightedSample
+    """
+    n_events = len(trace)
+    if n_events <= target_size:
+        return WeightedSample(trace, np.ones(n_events), n_events, np.arange(n_events))
+
+    rng = np.random.default_rng(seed)
+
+    # Stratum id = time bucket * n_event_types + event code
+    if buckets is None:
+        timestamp = trace.timestamp
+        t_min, t_max = timestamp.min(), timestamp.max()
+        width = max((t_max - t_min) / n_time_buckets, 1)
+        bucket = np.minimum((timestamp - t_min) // width, n_time_buckets - 1).astype(np.int64)
+    else:
+        bucket = np.asarray(buckets, dtype=np.int64)
+    stratum = bucket * len(trace.event_types) + trace.event_code
+
+    strata, inverse, sizes = np.unique(stratum, return_inverse=True, return_counts=True)
+    quota = np.maximum(np.round(sizes * (target_size / n_events)), min_per_stratum)
+    quota = np.minimum(quota, sizes).astype(np.int64)
+
+    # Shuffle within strata: sort by (stratum, random key) and keep each
+    # stratum's first `quota` events
+    order = np.lexsort((rng.random(n_events), inverse))
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rank = np.arange(n_events) - np.repeat(starts, sizes)
+    keep = np.sort(order[rank < np.repeat(quota, sizes)])
+
+    weights = (sizes / quota)[inverse[keep]]
+    return WeightedSample(trace.take(keep), weights, n_events, keep)
+
+class ReservoirSampler:
+    """
+    Uniform fixed-size sample over a stream of event batches (Algorithm R).
+
+    Memory is bounded by `capacity` events no matter how long the stream
+    runs; every event seen so far has the same chance of being in the
+    reservoir, so `sample` weights each kept event by seen / kept and the
+    result carries the same ratio and error-bound label as a stratified
+    sample.
+
+    Batches are either CompactTrace chunks, whose per-chunk string tables
+    are re-encoded into the sampler's own tables, or dicts of column
+    arrays (the live tailer's batches) whose codes already index one
+    table that is passed to `sample`.
+    """
+    def __init__(self, capacity, columns=None, seed=0):
+        """
+        Args:
+            capacity (int): Maximum number of events kept
+            columns (dict): Column name -> dtype to keep; defaults to all
+                CompactTrace columns
+            seed (int): Seed for reproducible samples
+        """
+        self.capacity = capacity
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+        self.columns = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in (columns or CompactTrace.COLUMNS).items()
+        }
+        self.event_types = []
+        self.dsos = []
+        self._codes = {'event_code': {}, 'dso_code': {}}
+
+    def _recode(self, name, table, strings):
+        """Map a batch's string table onto the sampler's table of the same kind."""
+        codes = self._codes[name]
+        for string in strings:
+            if string not in codes:
+                codes[string] = len(table)
+                table.append(string)
+        return np.array([codes[string] for string in strings], dtype=np.uint16)
+
+    def add(self, batch):
+        """Offer every event of a batch (CompactTrace or column name -> array)."""
+        if isinstance(batch, CompactTrace):
+            columns = dict(batch.columns)
+            columns['event_code'] = self._recode('event_code', self.event_types, batch.event_types)[batch.event_code]
+            columns['dso_code'] = self._recode('dso_code', self.dsos, batch.dsos)[batch.dso_code]
+        else:
+            columns = batch
+        n_batch = len(columns['timestamp'])
+        positions = np.arange(self.seen, self.seen + n_batch)
+
+        # Fill phase: the first `capacity` events go straight in
+        filling = positions < self.capacity
+        slots = positions[filling]
+        sources = np.flatnonzero(filling)
+
+        # Replacement phase: event i replaces a random slot with
+        # probability capacity / (i + 1). Later events overwrite earlier
+        # ones that drew the same slot, as in the sequential algorithm.
+        streaming = np.flatnonzero(~filling)
+        if len(streaming):
+            draws = (self.rng.random(len(streaming)) * (positions[streaming] + 1)).astype(np.int64)
+            accepted = draws < self.capacity
+            slots = np.concatenate((slots, draws[accepted]))
+            sources = np.concatenate((sources, streaming[accepted]))
+
+        for name, values in self.columns.items():
+            values[slots] = columns[name][sources]
+        self.seen += n_batch
+
+    def merge(self, other):
+        """
+        Fold in a reservoir of the same capacity filled from a disjoint part
+        of the stream (e.g. another worker's shard).
+
+        The merged reservoir takes a hypergeometric share of its slots from
+        each side, so it is again a uniform sample of both streams.
+        """
+        if other.capacity != self.capacity:
+            raise ValueError("Only reservoirs of the same capacity can be merged")
+        total = self.seen + other.seen
+        size = min(self.capacity, total)
+        n_other = int(self.rng.hypergeometric(other.seen, self.seen, size)) if size else 0
+        mine = self.rng.choice(min(self.seen, self.capacity), size - n_other, replace=False)
+        theirs = self.rng.choice(min(other.seen, other.capacity), n_other, replace=False)
+
+        columns = {name: values[theirs] for name, values in other.columns.items()}
+        for name, table, other_table in (('event_code', self.event_types, other.event_types),
+                                         ('dso_code', self.dsos, other.dsos)):
+            if name in columns and other_table:
+                columns[name] = self._recode(name, table, other_table)[columns[name]]
+        for name, values in self.columns.items():
+            values[:size] = np.concatenate((values[mine], columns[name]))
+        self.seen = total
+
+    def sample(self, event_types=None, dsos=None):
+        """
+        Current reservoir contents as a WeightedSample.
+
+        Args:
+            event_types, dsos (list): String tables of dict batches' codes;
+                CompactTrace batches use the sampler's own tables
+        """
+        size = min(self.seen, self.capacity)
+        trace = CompactTrace(
+            {name: values[:size].copy() for name, values in self.columns.items()},
+            event_types or self.event_types or [''], dsos or self.dsos or ['']
+        )
+        return WeightedSample(trace, np.full(size, self.seen / size if size else 1.0), self.seen)
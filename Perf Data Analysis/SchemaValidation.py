@@ -0,0 +1,379 @@
+"""
+Schema validation for trace CSVs at ingest.
+
+Every column a loader understands is declared once in SCHEMA, with the
+check its values must pass. `validate` runs all checks as whole-column
+operations (regular-expression matches and numeric conversions over the
+entire column, a lookup-table hex decoder) and returns typed arrays plus
+one reason bit mask per row; rows with a non-zero mask are rejected as a
+whole instead of being coerced column by column.
+
+Rejected rows can be written to a side quarantine CSV with their reason
+codes, so nothing is silently dropped and the clean output can be saved
+as a typed trace that loaders memory-map without any further coercion.
+Rows are rejected as a whole, so a row with, say, an unknown event name
+or a malformed period is dropped even though its address and timestamp
+are fine; loaders that coerced column by column used to keep such rows
+with the bad field zeroed.
+
+Timestamps are stored as int64 nanoseconds. The raw dump prints integer
+nanoseconds, perf script fractional seconds; the unit is decided once per
+source (see `infer_timestamp_unit`) and every batch of that source is
+then checked against it, so chunked and tailed loads normalize alike.
+
+Reason bits:
+    missing_timestamp  0x01  no timestamp
+    bad_timestamp      0x02  timestamp not a finite, non-negative number
+                             (or fractional in a nanosecond source)
+    missing_address    0x04  no address
+    bad_address        0x08  address not a hex number of at most 64 bits
+    unknown_event      0x10  event name not a perf record type or event name
+    bad_hex            0x20  optional hex column (ip, data_src) not hex
+    bad_integer        0x40  optional integer column not a non-negative integer
+    out_of_range       0x80  integer too large for its storage type, or a
+                             timestamp past int64 nanoseconds
+"""
+import os
+import numpy as np
+import pandas as pd
+
+MISSING_TIMESTAMP = 0x01
+BAD_TIMESTAMP = 0x02
+MISSING_ADDRESS = 0x04
+BAD_ADDRESS = 0x08
+UNKNOWN_EVENT = 0x10
+BAD_HEX = 0x20
+BAD_INTEGER = 0x40
+OUT_OF_RANGE = 0x80
+
+REASONS = {
+    MISSING_TIMESTAMP: 'missing_timestamp',
+    BAD_TIMESTAMP: 'bad_timestamp',
+    MISSING_ADDRESS: 'missing_address',
+    BAD_ADDRESS: 'bad_address',
+    UNKNOWN_EVENT: 'unknown_event',
+    BAD_HEX: 'bad_hex',
+    BAD_INTEGER: 'bad_integer',
+    OUT_OF_RANGE: 'out_of_range',
+}
+
+# Column -> (check, required). Columns missing from the input are skipped;
+# empty values of optional columns are fine and read as 0.
+SCHEMA = {
+    'timestamp': ('timestamp', True),
+    'address': ('hex', True),
+    'event_type': ('event', False),
+    'ip': ('hex', False),
+    'data_src': ('hex', False),
+    'period': ('integer', False),
+    'thread_id': ('integer', False),
+    'process_id': ('integer', False),
+    'raw_offset': ('integer', False),
+    'raw_length': ('integer', False),
+    'shard_id': ('integer', False),
+    'weight': ('integer', False),
+    'mem_level': ('integer', False),
+    'mem_flags': ('integer', False),
+}
+
+# perf record types from the raw dump, or perf event names as perf script
+# prints them (cycles, mem-loads, cpu/mem-loads,ldlat=30/P, ...)
+EVENT_PATTERN = r'PERF_RECORD_[A-Z0-9_]+|[a-z][\w.-]*(?:/[^/\s]*/[a-zA-Z]*)?'
+
+# Longest valid hex value: "0x" + 16 digits. Longer strings are rejected
+# by length alone, before any character is decoded.
+MAX_HEX_LENGTH = 18
+# Rows decoded per block, which bounds the decoder's temporaries (and
+# keeps them in cache)
+HEX_BLOCK = 8192
+
+# Character code -> hex digit value, 16 for anything else
+_HEX_DIGITS = np.full(128, 16, dtype=np.uint8)
+for _digits, _base in (('0123456789', 0), ('abcdef', 10), ('ABCDEF', 10)):
+    _HEX_DIGITS[[ord(c) for c in _digits]] = np.arange(_base, _base + len(_digits))
+
+def event_names(event_type):
+    """
+    Reduce event descriptions to their record or event name.
+
+    The raw-dump parser stores the whole header remainder
+    ("PERF_RECORD_SAMPLE(IP, 0x2): 3598/3598: 0x7f23... period: 1"),
+    which is unique per sample and useless as a category.
+    """
+    return event_type.astype(str).str.extract(r'^\s*([^\s(:]+)', expand=False)
+
+def parse_hex(values):
+    """
+    Parse hex strings (with or without 0x) into uint64 without any
+    per-value Python.
+
+    The column is held as variable-width strings, so one very long value
+    costs only its own length. Values longer than MAX_HEX_LENGTH are
+    rejected by length; the rest are decoded by `_decode_hex` one block of
+    HEX_BLOCK rows at a time.
+
+    Returns:
+        tuple: (uint64 values, validity mask, empty mask)
+    """
+    text = values.to_numpy(dtype=object, na_value='').astype(np.dtypes.StringDType())
+    text = np.strings.strip(text)
+    length = np.strings.str_len(text)
+    empty = length == 0
+    parsed = np.zeros(len(text), dtype=np.uint64)
+    ok = ~empty & (length <= MAX_HEX_LENGTH)
+    for first in range(0, len(text), HEX_BLOCK):
+        rows = slice(first, first + HEX_BLOCK)
+        if not ok[rows].all():
+            rows = first + np.flatnonzero(ok[rows])
+        parsed[rows], ok[rows] = _decode_hex(text[rows], length[rows])
+    return parsed, ok, empty
+
+def _decode_hex(text, length):
+    """
+    Decode up to MAX_HEX_LENGTH-character strings: they become a fixed-width
+    character matrix, digits are decoded through a lookup table and shifted
+    into place by their distance from the end of the string.
+    """
+    chars = text.astype(f'<U{MAX_HEX_LENGTH}').view(np.uint32).reshape(len(text), MAX_HEX_LENGTH)
+    prefixed = (length > 2) & (chars[:, 0] == ord('0')) & ((chars[:, 1] | 0x20) == ord('x'))
+    start = np.where(prefixed, 2, 0)
+    ok = length - start <= 16
+
+    position = np.arange(MAX_HEX_LENGTH)
+    in_digits = (position >= start[:, None]) & (position < length[:, None])
+    digits = _HEX_DIGITS[np.minimum(chars, 127)]
+    ok &= ~np.any(in_digits & (digits == 16), axis=1)
+    in_digits &= ok[:, None]
+    shift = np.where(in_digits, 4 * (length[:, None] - 1 - position), 0).astype(np.uint64)
+    parsed = np.bitwise_or.reduce(np.where(in_digits, digits.astype(np.uint64) << shift, 0), axis=1)
+    return parsed, ok
+
+def _to_numbers(values):
+    """Numeric view of a column (NaN where not a number) and its empty mask."""
+    empty = values.isna().to_numpy(copy=True)
+    if values.dtype.kind in 'iuf':
+        return values.to_numpy(), empty
+    numbers = pd.to_numeric(values, errors='coerce').to_numpy()
+    if numbers.dtype.kind == 'f':
+        # Only the values that did not convert can be blank strings
+        failed = np.isnan(numbers) & ~empty
+        empty[failed] = (values[failed].astype(object).str.strip() == '').to_numpy(dtype=bool)
+    return numbers, empty
+
+def _parse_timestamp(values):
+    """
+    Timestamps as exact integers where integral, and as floats.
+
+    float64 holds integers exactly only below 2**53, which nanosecond
+    timestamps exceed; integral values that large are re-read from the
+    original values so they come back exact.
+
+    Returns:
+        tuple: (int64 values of integral timestamps, float values,
+            validity mask, integral mask, int64 overflow mask, empty mask)
+    """
+    numbers, empty = _to_numbers(values)
+    int64_max = np.iinfo(np.int64).max
+    if numbers.dtype.kind in 'iu':
+        ok = numbers >= 0
+        integral = ok
+        overflow = ok & (numbers > int64_max)
+        integers = np.where(ok & ~overflow, numbers, 0).astype(np.int64)
+        return integers, numbers.astype(float), ok, integral, overflow, empty
+
+    ok = np.isfinite(numbers) & (numbers >= 0)
+    integral = ok & (numbers == np.floor(numbers))
+    overflow = integral & (numbers >= 2.0 ** 63)
+    integers = np.where(integral & ~overflow, numbers, 0).astype(np.int64)
+    large = np.flatnonzero(integral & (numbers >= 2.0 ** 53))
+    if len(large):
+        exact = pd.to_numeric(values.iloc[large], errors='coerce').to_numpy()
+        if exact.dtype.kind in 'iu':
+            overflow[large] = exact > int64_max
+            integers[large] = np.where(exact > int64_max, 0, exact).astype(np.int64)
+    return integers, np.where(ok, numbers, 0), ok, integral, overflow, empty
+
+def _timestamp_unit(ok, integral):
+    """'s' if most valid timestamps are fractional, 'ns' if most are integral, None if none is valid."""
+    n_valid = np.count_nonzero(ok)
+    if n_valid == 0:
+        return None
+    return 's' if 2 * np.count_nonzero(ok & ~integral) > n_valid else 'ns'
+
+def infer_timestamp_unit(df):
+    """
+    Timestamp unit of a source, judged from one batch of it.
+
+    perf script prints fractional seconds and the raw dump integer
+    nanoseconds (pandas writes those as "123.0" when the column has gaps,
+    which still counts as integral). Whichever form most valid
+    timestamps take decides, so a few stray rows cannot flip the unit.
+
+    Args:
+        df (pd.DataFrame): Batch with canonical column names
+
+    Returns:
+        str: 's', 'ns', or None when the batch holds no valid timestamp
+    """
+    if 'timestamp' not in df:
+        return None
+    _, _, ok, integral, _, _ = _parse_timestamp(df['timestamp'])
+    return _timestamp_unit(ok, integral)
+
+def _parse_integer(values, dtype):
+    """
+    Non-negative integers in `dtype`; empty values read as 0.
+
+    pandas writes integer columns with gaps as floats ("52.0"), so any
+    integral number is accepted.
+
+    Returns:
+        tuple: (values, validity mask, in-range mask)
+    """
+    numbers, empty = _to_numbers(values)
+    if numbers.dtype.kind == 'f':
+        # uint64 columns beyond 2**53 only come back exact when they have
+        # no gaps (to_numeric then returns int64/uint64)
+        ok = empty | (np.isfinite(numbers) & (numbers >= 0) & (numbers == np.floor(numbers)))
+        numbers = np.where(ok & ~empty, numbers, 0)
+        in_range = numbers < 2.0 ** (8 * np.dtype(dtype).itemsize)
+    else:
+        ok = numbers >= 0
+        in_range = numbers <= np.iinfo(dtype).max
+    typed = np.where(ok & in_range, numbers, 0).astype(dtype)
+    return typed, ok, in_range
+
+def _check_events(values, event_types):
+    """
+    Event names and their known mask. The string work runs once per
+    distinct description, not once per row.
+    """
+    codes, uniques = pd.factorize(values)
+    names = event_names(pd.Series(uniques, dtype=object))
+    if event_types is None:
+        known = names.str.fullmatch(EVENT_PATTERN).to_numpy(dtype=bool, na_value=False)
+    else:
+        known = names.isin(list(event_types)).to_numpy()
+    known = known | names.isna().to_numpy()
+    present = codes >= 0
+    row_names = np.full(len(codes), np.nan, dtype=object)
+    row_names[present] = names.to_numpy(dtype=object)[codes[present]]
+    row_known = np.ones(len(codes), dtype=bool)
+    row_known[present] = known[codes[present]]
+    return pd.Series(row_names, index=values.index, dtype=object), row_known
+
+def validate(df, dtypes=None, event_types=None, timestamp_unit=None):
+    """
+    Check every SCHEMA column of a string-typed (or parser-typed) frame.
+
+    Args:
+        df (pd.DataFrame): Rows to check, with canonical column names
+        dtypes (dict): Column -> storage dtype for the range checks of
+            integer columns (default uint64)
+        event_types (iterable): Accepted event names; by default any name
+            matching EVENT_PATTERN
+        timestamp_unit (str): 'ns' or 's'. Pass the unit decided for the
+            source (`infer_timestamp_unit`) when validating it in batches;
+            by default it is inferred from this batch alone
+
+    Returns:
+        tuple: (columns, reasons) where `columns` maps every present SCHEMA
+            column to its typed values for all rows (int64 nanosecond
+            timestamps, unsigned integer arrays,
+            event names as a string Series) and `reasons` is the uint16
+            reason mask of every row, 0 for clean rows
+    """
+    dtypes = dtypes or {}
+    reasons = np.zeros(len(df), dtype=np.uint16)
+    columns = {}
+    for name, (check, required) in SCHEMA.items():
+        if name not in df:
+            if required:
+                reasons |= MISSING_TIMESTAMP if name == 'timestamp' else MISSING_ADDRESS
+            continue
+        values = df[name]
+        if check == 'timestamp':
+            columns[name] = _check_timestamp(values, timestamp_unit, reasons)
+        elif check == 'hex':
+            columns[name], ok, empty = parse_hex(values)
+            if required:
+                reasons[empty] |= MISSING_ADDRESS
+                reasons[~ok & ~empty] |= BAD_ADDRESS
+            else:
+                reasons[~ok & ~empty] |= BAD_HEX
+        elif check == 'integer':
+            columns[name], ok, in_range = _parse_integer(values, dtypes.get(name, np.uint64))
+            reasons[~ok] |= BAD_INTEGER
+            reasons[ok & ~in_range] |= OUT_OF_RANGE
+        elif check == 'event':
+            columns[name], known = _check_events(values, event_types)
+            reasons[~known] |= UNKNOWN_EVENT
+    return columns, reasons
+
+def _check_timestamp(values, unit, reasons):
+    """
+    Timestamps as int64 nanoseconds; sets the timestamp reason bits of
+    `reasons` in place.
+
+    Nanosecond timestamps must be integers that fit in int64. Seconds are
+    scaled by 1e9 in float64 (exact to well under a microsecond at
+    typical uptimes) and rejected when the result would not fit.
+    """
+    integers, numbers, ok, integral, overflow, empty = _parse_timestamp(values)
+    reasons[empty] |= MISSING_TIMESTAMP
+    reasons[~ok & ~empty] |= BAD_TIMESTAMP
+    if (unit or _timestamp_unit(ok, integral)) == 's':
+        nanoseconds = np.rint(numbers * 1e9)
+        overflow = ok & (nanoseconds >= 2.0 ** 63)
+        timestamp = np.where(ok & ~overflow, nanoseconds, 0).astype(np.int64)
+    else:
+        reasons[ok & ~integral] |= BAD_TIMESTAMP
+        timestamp = integers
+    reasons[overflow] |= OUT_OF_RANGE
+    return timestamp
+
+def reason_names(reasons):
+    """'|'-joined reason names of every row's mask ('' for clean rows)."""
+    codes, inverse = np.unique(reasons, return_inverse=True)
+    labels = np.array(['|'.join(label for bit, label in REASONS.items() if code & bit) for code in codes],
+                      dtype=object)
+    return labels[inverse.reshape(-1)]
+
+class Quarantine:
+    """
+    Side CSV collecting rejected rows with their reason codes.
+
+    Each written row keeps its original fields, prefixed with `row` (its
+    0-based data row in the input across all batches), `reason_code` (the
+    bit mask) and `reasons` (the mask spelled out). Pass the same
+    Quarantine to every batch of a chunked load so row numbers continue.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.rejected = 0
+        self.counts = {name: 0 for name in REASONS.values()}
+        if os.path.exists(path):
+            os.remove(path)
+
+    def add(self, df, reasons):
+        """Record one validated batch; only its rejected rows are written."""
+        rejected = np.flatnonzero(reasons)
+        if len(rejected):
+            bad = reasons[rejected]
+            for bit, name in REASONS.items():
+                self.counts[name] += int(np.count_nonzero(bad & bit))
+            out = df.iloc[rejected].copy()
+            out.insert(0, 'reasons', reason_names(bad))
+            out.insert(0, 'reason_code', bad)
+            out.insert(0, 'row', rejected + self.rows)
+            out.to_csv(self.path, mode='a', header=not os.path.exists(self.path), index=False)
+        self.rows += len(reasons)
+        self.rejected += len(rejected)
+        return len(rejected)
+
+    def summary(self):
+        """Lines describing how many rows failed which check."""
+        lines = [f"Rows checked: {self.rows:,}, quarantined: {self.rejected:,} ({self.path})"]
+        lines += [f"  {name}: {count:,}" for name, count in self.counts.items() if count]
+        return lines
@@ -0,0 +1,133 @@
+import heapq
+import multiprocessing
+import queue
+import threading
+from operator import itemgetter
+
+class _Failure:
+    """Carries an exception from a producer to the consumer."""
+    def __init__(self, error):
+        self.error = error
+
+class _Done:
+    """End-of-stream marker; a class so it survives pickling between processes."""
+
+def _put(out, item, stop):
+    """Blocking put that gives up once the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _produce(source, out, batch_size, stop):
+    try:
+        batch = []
+        for item in source:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                if not _put(out, batch, stop):
+                    return
+                batch = []
+        if batch and not _put(out, batch, stop):
+            return
+        _put(out, _Done, stop)
+    except BaseException as error:
+        _put(out, _Failure(error), stop)
+
+def _produce_process(factory, out, batch_size, stop):
+    """Process entry point: build the source in the worker and produce from it."""
+    try:
+        source = factory()
+    except BaseException as error:
+        _put(out, _Failure(error), stop)
+        return
+    _produce(source, out, batch_size, stop)
+
+def _drain(out):
+    while True:
+        batch = out.get()
+        if batch is _Done:
+            return
+        if isinstance(batch, _Failure):
+            raise batch.error
+        yield from batch
+
+def _keyed(items, key):
+    """
+    Pair items with a sort key. An item whose key is None takes the key of
+    the item before it in the same source, so it stays in place; keyless
+    items at the start of a source sort before everything else.
+    """
+    previous = (0,)
+    for item in items:
+        value = key(item)
+        if value is not None:
+            previous = (1, value)
+        yield previous, item
+
+def merge_streams(sources, key, batch_size=1024, queue_batches=8, processes=False):
+    """
+    K-way merge of several individually ordered streams into one.
+
+    Every source is consumed by its own producer into a bounded queue of
+    batches, and each shard holds at most `queue_batches * batch_size`
+    items in memory however far it runs ahead of the others. The consumer
+    merges the queues with a heap on `key`, which costs O(log k) per item
+    for k shards.
+
+    Producer threads only overlap file reads and decompression, which
+    release the GIL; pure-Python parsing still runs one shard at a time.
+    With `processes=True` every source runs in its own process, so the
+    shards are parsed in parallel at the cost of pickling each batch.
+
+    Each source must already be ordered by `key` (perf writes per-CPU and
+    per-session dumps in time order). Errors in a producer are re-raised in
+    the consumer; closing the merged generator early stops the producers.
+
+    Args:
+        sources (list): Iterables to merge; with `processes=True`, picklable
+            zero-argument callables returning the iterable instead, since
+            generators cannot be sent to another process
+        key (callable): Sort key of an item, e.g. its timestamp; None keeps
+            the item next to its predecessor in the same source
+        batch_size (int): Items handed over per queue operation
+        queue_batches (int): Queue capacity per shard, in batches
+        processes (bool): Run the producers as processes instead of threads
+
+    Yields:
+        Items of all sources in `key` order
+    """
+    if processes:
+        stop = multiprocessing.Event()
+        queues = [multiprocessing.Queue(maxsize=queue_batches) for _ in sources]
+        workers = [
+            multiprocessing.Process(target=_produce_process, args=(factory, out, batch_size, stop), daemon=True)
+            for factory, out in zip(sources, queues)
+        ]
+    else:
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=queue_batches) for _ in sources]
+        workers = [
+            threading.Thread(target=_produce, args=(source, out, batch_size, stop), daemon=True)
+            for source, out in zip(sources, queues)
+        ]
+    for worker in workers:
+        worker.start()
+    try:
+        merged = heapq.merge(*(_keyed(_drain(out), key) for out in queues), key=itemgetter(0))
+        for _, item in merged:
+            yield item
+    finally:
+        stop.set()
+        for worker, out in zip(workers, queues):
+            # A producer process only exits once its queued batches are
+            # flushed to the pipe, so discard them until it is gone
+            while processes and worker.is_alive():
+                try:
+                    out.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            worker.join()
@@ -0,0 +1,234 @@
+import glob
+import json
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from CompactTrace import CompactTrace
+from Sampling import WeightedSample
+
+class SharedDataset:
+    """
+    A dashboard's preprocessed state, published once as memory-mapped
+    .npy files that any number of server processes attach to read-only.
+
+    The loader process builds a dashboard normally (loading the trace and
+    running its preprocessing) and calls `publish`. Worker processes then
+    construct the dashboard from the published directory: every per-event
+    array (trace columns, derived page/line numbers, time and address
+    bucket codes, the stratified sample) is opened with `mmap_mode='r'`, so
+    all workers share the same page-cache pages and nothing is copied or
+    recomputed. Small aggregates (bucket count tables, phases, scalars) are
+    pickled and loaded per worker.
+
+    Layout of a published directory:
+        dataset.json            manifest: traces, frames, arrays, objects
+        trace.<column>.npy      one file per CompactTrace column
+        frame.<name>.<col>.npy  DataFrame columns (categoricals as codes)
+        array.<name>.npy        plain arrays
+        objects.pkl             small aggregates
+
+    Every publish writes a new versioned directory next to the published
+    path (`<path>.v<time_ns>`) and then points `<path>`, a symlink, at it
+    with an atomic os.replace, so there is no moment at which the path is
+    missing or half-written. Attaching resolves the symlink once, so a
+    worker reads one version throughout even if a publish happens
+    meanwhile. The previous KEEP_VERSIONS - 1 versions stay on disk for
+    workers still starting up on them; older ones are removed (workers
+    that already mapped their files keep the mappings).
+    """
+    MANIFEST = 'dataset.json'
+    OBJECTS = 'objects.pkl'
+    # Published versions kept on disk, including the current one
+    KEEP_VERSIONS = 2
+
+    def __init__(self, directory):
+        """Attach to a published directory (or the symlink to its current version)."""
+        self.directory = os.path.realpath(directory)
+        with open(os.path.join(self.directory, self.MANIFEST), 'r', encoding='utf-8') as file:
+            self.manifest = json.load(file)
+
+    @staticmethod
+    def is_shared(path):
+        return os.path.isfile(os.path.join(str(path), SharedDataset.MANIFEST))
+
+    def _load(self, name):
+        return np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='r')
+
+    @classmethod
+    def write(cls, directory, traces=None, frames=None, arrays=None, objects=None):
+        """
+        Publish traces, DataFrames, arrays and small objects to `directory`.
+
+        Args:
+            directory (str): Published path; becomes a symlink to the new version
+            traces (dict): name -> CompactTrace; the derived page and line
+                columns are published too, so workers never compute them
+            frames (dict): name -> DataFrame with numeric or categorical columns
+            arrays (dict): name -> numpy array
+            objects (dict): name -> any picklable value
+        """
+        directory = os.path.normpath(directory)
+        staging = f"{directory}.v{time.time_ns()}"
+        os.makedirs(staging)
+        save = lambda name, values: np.save(os.path.join(staging, name + '.npy'), np.asarray(values))
+        manifest = {'traces': {}, 'frames': {}, 'arrays': sorted(arrays or {})}
+
+        for name, trace in (traces or {}).items():
+            columns = dict(trace.columns, page=trace.page, line=trace.line)
+            for column, values in columns.items():
+                save(f"{name}.{column}", values)
+            manifest['traces'][name] = {
+                'columns': list(columns),
+                'event_types': trace.event_types,
+                'dsos': trace.dsos,
+                'fingerprint': trace.fingerprint(),
+            }
+
+        for name, frame in (frames or {}).items():
+            columns = {}
+            for column, series in frame.items():
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    save(f"frame.{name}.{column}", series.cat.codes.to_numpy())
+                    columns[column] = {'categories': series.cat.categories.tolist(),
+                                       'ordered': bool(series.cat.ordered)}
+                elif series.dtype.kind in 'biuf':
+                    save(f"frame.{name}.{column}", series.to_numpy())
+                    columns[column] = {}
+                else:
+                    raise ValueError(f"Column {name}.{column} of dtype {series.dtype} cannot be shared")
+            if isinstance(frame.index, pd.RangeIndex):
+                index = [frame.index.start, frame.index.stop, frame.index.step]
+            else:
+                save(f"frame.{name}.__index__", frame.index.to_numpy())
+                index = None
+            manifest['frames'][name] = {'columns': columns, 'range_index': index}
+
+        for name, values in (arrays or {}).items():
+            save(f"array.{name}", values)
+        with open(os.path.join(staging, cls.OBJECTS), 'wb') as file:
+            pickle.dump(objects or {}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        # The manifest goes last: a directory without one is never attached
+        with open(os.path.join(staging, cls.MANIFEST), 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=1)
+
+        cls._swap(directory, staging)
+
+    @classmethod
+    def _swap(cls, directory, version):
+        """Point the `directory` symlink at `version` and prune old versions."""
+        if os.path.isdir(directory) and not os.path.islink(directory):
+            # Published before versioning: a plain directory cannot be
+            # atomically replaced by a symlink, so move it aside first
+            os.rename(directory, f"{directory}.v0")
+        link = f"{directory}.link-{os.getpid()}"
+        os.symlink(os.path.basename(version), link)
+        os.replace(link, directory)
+
+        prefix = f"{directory}.v"
+        older = sorted(
+            (int(path[len(prefix):]), path) for path in glob.glob(glob.escape(prefix) + '*')
+            if path[len(prefix):].isdigit() and path != version
+        )
+        for _, path in older[:max(0, len(older) - (cls.KEEP_VERSIONS - 1))]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def trace(self, name='trace'):
+        """Memory-mapped CompactTrace, with its derived columns and fingerprint preset."""
+        spec = self.manifest['traces'][name]
+        columns = {column: self._load(f"{name}.{column}") for column in spec['columns']}
+        trace = CompactTrace(
+            {column: columns[column] for column in CompactTrace.COLUMNS},
+            spec['event_types'], spec['dsos']
+        )
+        trace._derived.update(page=columns['page'], line=columns['line'])
+        trace._fingerprint = spec['fingerprint']
+        return trace
+
+    def frame(self, name):
+        """DataFrame backed by the memory-mapped columns (no copy)."""
+        spec = self.manifest['frames'][name]
+        data = {}
+        for column, info in spec['columns'].items():
+            values = self._load(f"frame.{name}.{column}")
+            if 'categories' in info:
+                values = pd.Categorical.from_codes(values, info['categories'], ordered=info['ordered'])
+            data[column] = values
+        if spec['range_index'] is not None:
+            index = pd.RangeIndex(*spec['range_index'])
+        else:
+            index = pd.Index(self._load(f"frame.{name}.__index__"))
+        return pd.DataFrame(data, index=index, copy=False)
+
+    def array(self, name):
+        return self._load(f"array.{name}")
+
+    def objects(self):
+        with open(os.path.join(self.directory, self.OBJECTS), 'rb') as file:
+            return pickle.load(file)
+
+    @classmethod
+    def publish(cls, directory, dashboard):
+        """
+        Publish a preprocessed dashboard's shared state.
+
+        The dashboard class lists what makes up that state in
+        `SHARED_FRAMES` (per-event DataFrames) and `SHARED_OBJECTS` (small
+        aggregates); its trace and stratified sample are always included.
+        """
+        frames = {name: getattr(dashboard, name) for name in dashboard.SHARED_FRAMES
+                  if getattr(dashboard, name, None) is not None}
+        objects = {name: getattr(dashboard, name) for name in dashboard.SHARED_OBJECTS
+                   if hasattr(dashboard, name)}
+        traces = {'trace': dashboard.trace}
+        arrays = {}
+        sample = getattr(dashboard, 'sample', None)
+        if sample is not None:
+            traces['sample'] = sample.trace
+            arrays.update(sample_weights=sample.weights, sample_indices=sample.indices)
+            objects['sample_population'] = sample.population
+        cls.write(directory, traces, frames, arrays, objects)
+
+    def restore(self, dashboard):
+        """Set a dashboard's shared state from this dataset instead of preprocessing."""
+        dashboard.trace = self.trace()
+        dashboard.sample_df = None
+        for name in self.manifest['frames']:
+            setattr(dashboard, name, self.frame(name))
+        objects = self.objects()
+        population = objects.pop('sample_population', None)
+        for name, value in objects.items():
+            setattr(dashboard, name, value)
+        if 'sample' in self.manifest['traces']:
+            dashboard.sample = WeightedSample(
+                self.trace('sample'), self.array('sample_weights'), population,
+                self.array('sample_indices')
+            )
+
+def create_server(directory, app='dashboard', cache_dir=None):
+    """
+    WSGI entry point for serving a published dataset from several workers:
+
+        gunicorn -w 4 --preload 'SharedDataset:create_server("shared/", "analyzer")'
+
+    Each worker attaches to the memory-mapped arrays, so resident memory
+    stays flat as workers are added. Pass a `cache_dir` so the workers
+    also share rendered figures. With --preload the dashboard is
+    built once in the master and forked; without it every worker imports
+    Dash itself before attaching.
+
+    Args:
+        directory (str): Directory written by `SharedDataset.publish`
+        app (str): 'dashboard' (InteractiveVisualizer) or 'analyzer' (I2Vis)
+        cache_dir (str): Shared on-disk figure cache
+
+    Returns:
+        flask.Flask: The Dash app's WSGI server
+    """
+    if app == 'analyzer':
+        from I2Vis import MemoryAccessAnalyzer
+        return MemoryAccessAnalyzer(directory, cache_dir=cache_dir).app.server
+    from InteractiveVisualizer import MemoryAccessDashboard
+    return MemoryAccessDashboard(directory, cache_dir=cache_dir).app.server
@@ -0,0 +1,143 @@
+import re
+import numpy as np
+from CompactTrace import CompactTrace
+from PhaseDetector import detect_phases, phase_ids
+
+class TraceAggregates:
+    """
+    Precomputed, trace-length-independent summaries of a trace.
+
+    Everything here is keyed by values that mean the same thing across
+    traces (page numbers, line numbers, IPs, DSO and event names) and time
+    is normalized to [0, 1) over the trace's span, so aggregates of two
+    different runs can be compared directly without touching raw events.
+    With bucketing='phase' the time bins are the trace's detected execution
+    phases instead, so phase k of one run lines up with phase k of another.
+
+    Sparse tables are stored as parallel arrays:
+        page_keys/page_bins/page_counts   (page, time bin) -> accesses
+        line_keys/line_counts             line -> accesses
+        ip_keys/ip_counts                 IP -> samples
+        dso_names/dso_counts              DSO -> accesses
+        event_names/event_counts          event name -> occurrences
+    """
+    # Event names counted as cache misses / hits / total references when a
+    # trace has no per-access memory level information
+    MISS_PATTERN = re.compile(r'miss', re.IGNORECASE)
+    HIT_PATTERN = re.compile(r'hit', re.IGNORECASE)
+    REFERENCE_PATTERN = re.compile(r'references|loads|stores|accesses', re.IGNORECASE)
+
+    ARRAYS = (
+        'page_keys', 'page_bins', 'page_counts', 'line_keys', 'line_counts',
+        'ip_keys', 'ip_counts', 'dso_names', 'dso_counts', 'event_names', 'event_counts'
+    )
+
+    def __init__(self, n_time_bins=100, n_events=0, bucketing='uniform', **arrays):
+        self.n_time_bins = n_time_bins
+        self.n_events = n_events
+        self.bucketing = bucketing
+        for name in self.ARRAYS:
+            setattr(self, name, arrays.get(name, np.array([])))
+
+    @classmethod
+    def from_trace(cls, trace, n_time_bins=100, bucketing='uniform'):
+        """
+        Compute all aggregates in a single pass of vectorized group-bys.
+
+        Args:
+            trace: Anything CompactTrace.open accepts
+            n_time_bins (int): Equal-width time bins with bucketing='uniform'
+            bucketing (str): 'uniform', or 'phase' for one time bin per
+                detected execution phase
+        """
+        trace = CompactTrace.open(trace)
+        timestamp = trace.timestamp
+        if bucketing == 'phase':
+            phases = detect_phases(trace)
+            n_time_bins = max(len(phases), 1)
+            time_bin = phase_ids(timestamp, phases)
+        else:
+            span = max(int(timestamp.max() - timestamp.min()), 1) if len(trace) else 1
+            time_bin = ((timestamp - timestamp.min()) * n_time_bins // (span + 1)).astype(np.int64) \
+                if len(trace) else np.array([], dtype=np.int64)
+
+        pages, page_index = np.unique(trace.page, return_inverse=True)
+        cells, cell_counts = np.unique(page_index * n_time_bins + time_bin, return_counts=True)
+        line_keys, line_counts = np.unique(trace.line, return_counts=True)
+
+        sampled_ip = trace.ip[trace.ip != 0]
+        ip_keys, ip_counts = np.unique(sampled_ip, return_counts=True)
+
+        dso_counts = np.bincount(trace.dso_code, minlength=len(trace.dsos))
+        event_counts = np.bincount(trace.event_code, minlength=len(trace.event_types))
+
+        return cls(
+            n_time_bins=n_time_bins,
+            n_events=len(trace),
+            bucketing=bucketing,
+            page_keys=pages[cells // n_time_bins],
+            page_bins=(cells % n_time_bins).astype(np.uint16),
+            page_counts=cell_counts,
+            line_keys=line_keys,
+            line_counts=line_counts,
+            ip_keys=ip_keys,
+            ip_counts=ip_counts,
+            dso_names=np.array(trace.dsos, dtype=str),
+            dso_counts=dso_counts,
+            event_names=np.array(trace.event_types, dtype=str),
+            event_counts=event_counts,
+        )
+
+    def hit_miss(self):
+        """
+        Cache hit/miss totals derived from event names.
+
+        Returns:
+            dict: hits, misses and hit_rate (NaN when the trace has no
+                cache events)
+        """
+        counts = dict(zip(self.event_names.tolist(), self.event_counts.tolist()))
+        misses = sum(c for name, c in counts.items() if self.MISS_PATTERN.search(name))
+        hits = sum(c for name, c in counts.items() if self.HIT_PATTERN.search(name))
+        references = sum(c for name, c in counts.items() if self.REFERENCE_PATTERN.search(name))
+        if not hits and references:
+            hits = max(references - misses, 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else float('nan')
+        }
+
+    def save(self, path):
+        """Write the aggregates as an .npz archive."""
+        np.savez(
+            path, n_time_bins=self.n_time_bins, n_events=self.n_events, bucketing=self.bucketing,
+            **{name: getattr(self, name) for name in self.ARRAYS}
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as archive:
+            return cls(
+                n_time_bins=int(archive['n_time_bins']),
+                n_events=int(archive['n_events']),
+                bucketing=str(archive['bucketing']) if 'bucketing' in archive else 'uniform',
+                **{name: archive[name] for name in cls.ARRAYS}
+            )
+
+    @classmethod
+    def open(cls, source, n_time_bins=100, bucketing='uniform'):
+        """
+        Accept saved aggregates (.npz written by `save`) or anything
+        CompactTrace.open understands, computing the aggregates on the fly
+        with the given time bucketing.
+        """
+        if isinstance(source, TraceAggregates):
+            return source
+        if str(source).endswith('.npz'):
+            with np.load(source) as archive:
+                is_aggregates = 'page_keys' in archive
+            if is_aggregates:
+                return cls.load(source)
+        return cls.from_trace(source, n_time_bins, bucketing)
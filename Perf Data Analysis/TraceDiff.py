@@ -0,0 +1,243 @@
+import sys
+from dash import Dash, html, dcc
+import plotly.graph_objects as go
+import pandas as pd
+import numpy as np
+from CompactTrace import CompactTrace
+from TraceAggregates import TraceAggregates
+
+class TraceComparison:
+    """
+    Differential analysis of a baseline and a candidate trace.
+
+    Both traces are reduced to TraceAggregates first (or loaded from saved
+    aggregates), and all comparisons run on those: pages and lines are a
+    shared absolute axis and time is normalized per trace, so diffing two
+    very long traces costs about as much as diffing their aggregates.
+    Counts are compared as shares of each trace's total so runs of
+    different length line up. With phase bucketing the time axis is the
+    execution phase index; a phase only one run has shows up as a change
+    of its whole share.
+    """
+    def __init__(self, baseline, candidate, n_time_bins=100, bucketing='uniform'):
+        """
+        Args:
+            baseline, candidate: TraceAggregates, saved aggregates (.npz),
+                or any trace source CompactTrace.open accepts
+            n_time_bins (int): Normalized time resolution used when the
+                aggregates have to be computed
+            bucketing (str): 'uniform' or 'phase' time bins for aggregates
+                computed here
+        """
+        self.baseline = TraceAggregates.open(baseline, n_time_bins, bucketing)
+        self.candidate = TraceAggregates.open(candidate, n_time_bins, bucketing)
+        if self.baseline.bucketing != self.candidate.bucketing:
+            raise ValueError(
+                f"Time bucketing differs: {self.baseline.bucketing} vs {self.candidate.bucketing}"
+            )
+        self.bucketing = self.baseline.bucketing
+        if self.bucketing == 'phase':
+            # Runs may have a different number of phases; the extra ones
+            # have no counterpart
+            self.n_time_bins = max(self.baseline.n_time_bins, self.candidate.n_time_bins)
+        elif self.baseline.n_time_bins != self.candidate.n_time_bins:
+            raise ValueError(
+                f"Time resolution differs: {self.baseline.n_time_bins} vs {self.candidate.n_time_bins} bins"
+            )
+        else:
+            self.n_time_bins = self.baseline.n_time_bins
+
+        self.app = Dash(__name__)
+        self.setup_layout()
+
+    @staticmethod
+    def _share(counts, total):
+        return counts / total if total else counts * 0.0
+
+    def _keyed_deltas(self, base_keys, base_counts, cand_keys, cand_counts):
+        """Align two sparse keyed count tables and return per-key shares."""
+        keys = np.union1d(base_keys, cand_keys)
+        base = np.zeros(len(keys))
+        cand = np.zeros(len(keys))
+        base[np.searchsorted(keys, base_keys)] = self._share(base_counts, self.baseline.n_events)
+        cand[np.searchsorted(keys, cand_keys)] = self._share(cand_counts, self.candidate.n_events)
+        return keys, base, cand
+
+    def page_time_difference(self, max_pages=100):
+        """
+        Candidate minus baseline access share per (page, normalized time bin).
+
+        Returns:
+            tuple: (pages, matrix[pages, time bins]) for the `max_pages`
+                pages whose access pattern changed the most
+        """
+        # Sparse cell keys on the union page axis
+        pages = np.union1d(self.baseline.page_keys, self.candidate.page_keys)
+        cell_keys = np.concatenate((
+            np.searchsorted(pages, self.baseline.page_keys) * self.n_time_bins + self.baseline.page_bins,
+            np.searchsorted(pages, self.candidate.page_keys) * self.n_time_bins + self.candidate.page_bins
+        ))
+        cell_delta = np.concatenate((
+            -self._share(self.baseline.page_counts, self.baseline.n_events),
+            self._share(self.candidate.page_counts, self.candidate.n_events)
+        ))
+        cells, inverse = np.unique(cell_keys, return_inverse=True)
+        delta = np.bincount(inverse, weights=cell_delta)
+
+        # Rank pages by total absolute change, then densify only those rows
+        rows = cells // self.n_time_bins
+        change = np.bincount(rows, weights=np.abs(delta), minlength=len(pages))
+        top = np.sort(np.argsort(change)[::-1][:max_pages])
+        top = top[change[top] > 0]
+        matrix = np.zeros((len(top), self.n_time_bins))
+        selected = np.isin(rows, top)
+        matrix[np.searchsorted(top, rows[selected]), cells[selected] % self.n_time_bins] = delta[selected]
+        return pages[top], matrix
+
+    def dso_deltas(self):
+        """Per-DSO access share in both traces and the change between them."""
+        base = pd.Series(self._share(self.baseline.dso_counts, self.baseline.n_events),
+                         index=self.baseline.dso_names)
+        cand = pd.Series(self._share(self.candidate.dso_counts, self.candidate.n_events),
+                         index=self.candidate.dso_names)
+        table = pd.concat({'baseline': base, 'candidate': cand}, axis=1).fillna(0)
+        table['delta'] = table['candidate'] - table['baseline']
+        return table.sort_values('delta', key=np.abs, ascending=False)
+
+    def ip_deltas(self, top=20):
+        """IPs whose share of samples changed the most."""
+        keys, base, cand = self._keyed_deltas(
+            self.baseline.ip_keys, self.baseline.ip_counts,
+            self.candidate.ip_keys, self.candidate.ip_counts
+        )
+        order = np.argsort(np.abs(cand - base))[::-1][:top]
+        return pd.DataFrame({
+            'ip': [f"0x{int(ip):x}" for ip in keys[order]],
+            'baseline': base[order],
+            'candidate': cand[order],
+            'delta': (cand - base)[order]
+        })
+
+    def hit_miss_change(self):
+        """Hit/miss totals of both traces and the hit-rate change."""
+        base = self.baseline.hit_miss()
+        cand = self.candidate.hit_miss()
+        return {
+            'baseline': base,
+            'candidate': cand,
+            'hit_rate_delta': cand['hit_rate'] - base['hit_rate']
+        }
+
+    def create_difference_heatmap(self):
+        """Heatmap of candidate minus baseline access share per page and time."""
+        pages, matrix = self.page_time_difference()
+        limit = np.abs(matrix).max() if matrix.size else 1
+        if self.bucketing == 'phase':
+            x, time_title, time_hover = [f"P{i}" for i in range(self.n_time_bins)], 'Execution Phase', '%{x}'
+        else:
+            x, time_title, time_hover = np.arange(self.n_time_bins) / self.n_time_bins, 'Normalized Time', '%{x:.2f}'
+        fig = go.Figure(data=go.Heatmap(
+            z=matrix * 100,
+            x=x,
+            y=[f"0x{int(page) * CompactTrace.PAGE_SIZE:x}" for page in pages],
+            colorscale='RdBu_r',
+            zmid=0,
+            zmin=-limit * 100,
+            zmax=limit * 100,
+            colorbar={'title': 'Δ % of accesses'},
+            hovertemplate=(
+                'Memory Page: %{y}<br>' +
+                f'{time_title}: {time_hover}<br>' +
+                'Change: %{z:.4f}%<extra></extra>'
+            )
+        ))
+        fig.update_layout(
+            title='Access Pattern Difference (candidate − baseline)',
+            xaxis_title=time_title,
+            yaxis_title='Memory Page',
+            height=600
+        )
+        return fig
+
+    def create_delta_bars(self, table, label_column, title):
+        fig = go.Figure(data=go.Bar(
+            x=table['delta'] * 100,
+            y=table[label_column],
+            orientation='h',
+            marker_color=np.where(table['delta'] > 0, '#e74c3c', '#2ecc71'),
+            hovertemplate='%{y}<br>Change: %{x:.3f}%<extra></extra>'
+        ))
+        fig.update_layout(
+            title=title,
+            xaxis_title='Δ % of accesses',
+            height=400,
+            margin={'l': 250}
+        )
+        return fig
+
+    def create_hit_miss_summary(self):
+        change = self.hit_miss_change()
+        fig = go.Figure(data=[
+            go.Bar(name=name, x=['Hits', 'Misses'],
+                   y=[change[name]['hits'], change[name]['misses']])
+            for name in ('baseline', 'candidate')
+        ])
+        fig.update_layout(
+            title=f"Cache Hits / Misses (hit rate change: {change['hit_rate_delta'] * 100:+.2f} pts)",
+            barmode='group',
+            height=400
+        )
+        return fig
+
+    def setup_layout(self):
+        """Set up the comparison layout."""
+        card = {
+            'margin': '20px',
+            'padding': '20px',
+            'backgroundColor': 'white',
+            'borderRadius': '10px',
+            'boxShadow': '0 2px 4px rgba(0,0,0,0.1)'
+        }
+        dso_table = self.dso_deltas().reset_index(names='dso').head(20)
+        self.app.layout = html.Div([
+            html.Div([
+                html.H1(
+                    'Memory Access Trace Comparison',
+                    style={'textAlign': 'center', 'color': '#2c3e50', 'marginBottom': '10px'}
+                ),
+                html.P(
+                    f'Baseline: {self.baseline.n_events:,} events, '
+                    f'candidate: {self.candidate.n_events:,} events',
+                    style={'textAlign': 'center', 'color': '#7f8c8d'}
+                )
+            ], style={'padding': '20px'}),
+            html.Div([dcc.Graph(figure=self.create_difference_heatmap())], style=card),
+            html.Div([
+                html.Div([dcc.Graph(figure=self.create_delta_bars(
+                    dso_table, 'dso', 'Per-DSO Access Share Change'))],
+                    style={'width': '50%', 'display': 'inline-block'}),
+                html.Div([dcc.Graph(figure=self.create_delta_bars(
+                    self.ip_deltas(), 'ip', 'Per-IP Sample Share Change'))],
+                    style={'width': '50%', 'display': 'inline-block'})
+            ], style=card),
+            html.Div([dcc.Graph(figure=self.create_hit_miss_summary())], style=card)
+        ], style={
+            'fontFamily': 'Arial, sans-serif',
+            'backgroundColor': '#f0f2f5',
+            'minHeight': '100vh',
+            'padding': '20px'
+        })
+
+    def run_server(self, debug=True, host='127.0.0.1', port=8050):
+        """Start the comparison server."""
+        self.app.run(debug=debug, host=host, port=port)
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python TraceDiff.py <baseline> <candidate>")
+        sys.exit(1)
+    comparison = TraceComparison(sys.argv[1], sys.argv[2])
+    comparison.run_server()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+import sys
+import numpy as np
+import pandas as pd
+from CompactTrace import CompactTrace
+from OutOfCore import ChunkedTrace
+
+# Target recorded for successor mass pruned out of a source's top-N
+OTHER = np.iinfo(np.int64).min
+
+def _source_groups(context, source):
+    """Dense codes of the distinct (context, source) pairs, by hash factorization."""
+    context_codes, _ = pd.factorize(context)
+    source_codes, sources = pd.factorize(source)
+    return pd.factorize(context_codes * len(sources) + source_codes)[0]
+
+def _group_sum(context, source, target, count):
+    """
+    Sum `count` per distinct (context, source, target) edge.
+
+    The edge is encoded as one integer from the dense source group and
+    target codes, then counted with np.bincount; nothing is sorted.
+
+    Returns:
+        tuple: (context, source, target, count, group) of the distinct
+            edges, `group` being the dense code of each edge's source
+    """
+    group = _source_groups(context, source)
+    target_codes, targets = pd.factorize(target)
+    codes, edges = pd.factorize(group * len(targets) + target_codes)
+    first = np.empty(len(edges), dtype=np.int64)
+    first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    totals = np.bincount(codes, weights=count, minlength=len(edges)).astype(np.int64)
+    return context[first], source[first], target[first], totals, group[first]
+
+def _rank_edges(context, source, target, count, group):
+    """
+    Order distinct edges by source, and within a source by successor rank
+    (most frequent first, OTHER last), with one argsort of a composite key.
+
+    Returns:
+        tuple: (context, source, target, count) reordered, the start of
+            every source's run, and every edge's rank within its source
+    """
+    span = int(count.max(initial=0)) + 2
+    key = group * span + np.where(target == OTHER, span - 1, span - 2 - count)
+    order = np.argsort(key)
+    context, source, target, count, group = context[order], source[order], target[order], count[order], group[order]
+    starts = np.flatnonzero(np.append(True, group[1:] != group[:-1]))
+    rank = np.arange(len(count)) - np.repeat(starts, np.diff(np.append(starts, len(count))))
+    return context, source, target, count, starts, rank
+
+class TransitionTable:
+    """
+    Sparse successor counts `source -> target`, optionally per context
+    (e.g. the IP whose delta stream is being followed).
+
+    Transitions are buffered and folded into the table in vectorized
+    batches: every (context, source, target) triple is encoded into one
+    dense integer by hash factorization and counted with np.bincount.
+    Memory is bounded by pruning:
+
+    - each source keeps its `top_n` most frequent successors; the counts
+      of the rest are folded into a single OTHER successor, so per-source
+      totals stay exact
+    - at most `max_sources` sources are kept, the busiest ones; transitions
+      of evicted sources are only counted in `dropped`
+
+    Pruning happens on every fold, so a successor that is rare early and
+    frequent late can be undercounted; with top_n well above the number
+    of successors that matter the effect is small.
+    """
+    def __init__(self, top_n=4, max_sources=1 << 18):
+        self.top_n = top_n
+        self.max_sources = max_sources
+        self.context = np.zeros(0, dtype=np.uint64)
+        self.source = np.zeros(0, dtype=np.int64)
+        self.target = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.dropped = 0
+        self._pending = []
+        self._pending_rows = 0
+
+    def update(self, context, source, target):
+        """Add one transition per element of the three aligned arrays."""
+        if len(source) == 0:
+            return
+        self._pending.append((np.asarray(context, dtype=np.uint64), np.asarray(source, dtype=np.int64),
+                              np.asarray(target, dtype=np.int64), np.ones(len(source), dtype=np.int64)))
+        self._pending_rows += len(source)
+        # Fold once the buffer is as large as the table, so the pruned
+        # table is not rebuilt for every small batch
+        if self._pending_rows >= max(len(self.count), 1 << 20):
+            self.flush()
+
+    def flush(self):
+        """Fold buffered transitions into the table and prune it."""
+        if not self._pending:
+            return
+        parts = [(self.context, self.source, self.target, self.count)] + self._pending
+        self._pending, self._pending_rows = [], 0
+        edges = _group_sum(*(np.concatenate(column) for column in zip(*parts)))
+        self.context, self.source, self.target, self.count = self._prune(*edges)
+
+    def _prune(self, context, source, target, count, group):
+        context, source, target, count, starts, rank = _rank_edges(context, source, target, count, group)
+
+        # Fold everything past the top_n successors into one OTHER edge per
+        # source, appended after the source's kept edges
+        kept = (rank < self.top_n) & (target != OTHER)
+        if not kept.all():
+            lengths = np.diff(np.append(starts, len(count)))
+            other = np.add.reduceat(np.where(kept, 0, count), starts)
+            has_other = other > 0
+            order = np.argsort(np.concatenate((
+                np.repeat(np.arange(len(starts)), lengths)[kept], np.flatnonzero(has_other)
+            )), kind='stable')
+            other_starts = starts[has_other]
+            context = np.concatenate((context[kept], context[other_starts]))[order]
+            source = np.concatenate((source[kept], source[other_starts]))[order]
+            target = np.concatenate((target[kept], np.full(len(other_starts), OTHER)))[order]
+            count = np.concatenate((count[kept], other[has_other]))[order]
+            starts = np.flatnonzero(np.append(True, (context[1:] != context[:-1]) | (source[1:] != source[:-1])))
+
+        # Keep the busiest sources
+        if len(starts) > self.max_sources:
+            totals = np.add.reduceat(count, starts)
+            keep_groups = np.zeros(len(starts), dtype=bool)
+            keep_groups[np.argpartition(-totals, self.max_sources - 1)[:self.max_sources]] = True
+            self.dropped += int(totals[~keep_groups].sum())
+            keep = np.repeat(keep_groups, np.diff(np.append(starts, len(count))))
+            context, source, target, count = context[keep], source[keep], target[keep], count[keep]
+        return context, source, target, count
+
+    def stats(self):
+        """
+        Predictability of the successor stream.
+
+        Hit rates are leave-one-out: a transition counts as a hit only if
+        its successor is among the source's most frequent ones in the rest
+        of the table, so a source seen once predicts nothing (in-sample,
+        every such source would score its one transition as a hit). They
+        are taken over all transitions, those of evicted sources counting
+        as misses.
+
+        Returns:
+            dict: transitions (including those of evicted sources), sources,
+            edges, singleton_share (fraction of all transitions that come
+            from kept sources observed only once), entropy_bits (conditional entropy of the
+            successor given the source, over sources observed at least
+            twice; in-sample, so biased low for sparsely observed sources,
+            and NaN if there are none), top1_hit_rate / top4_hit_rate
+            (leave-one-out fraction of transitions whose successor is among
+            the source's 1 / 4 most frequent ones), coverage (share of
+            transitions kept after source eviction)
+        """
+        self.flush()
+        count, target = self.count, self.target
+        total = int(count.sum())
+        observed = total + self.dropped
+        if total == 0:
+            return {'transitions': observed, 'sources': 0, 'edges': 0, 'singleton_share': 0.0,
+                    'entropy_bits': float('nan'), 'top1_hit_rate': 0.0, 'top4_hit_rate': 0.0,
+                    'coverage': 0.0}
+        _, _, target, count, starts, _ = _rank_edges(
+            self.context, self.source, target, count, _source_groups(self.context, self.source))
+        lengths = np.diff(np.append(starts, len(count)))
+        source_totals = np.add.reduceat(count, starts)
+        totals = np.repeat(source_totals, lengths)
+        predictable = target != OTHER
+
+        # Leave one transition of a successor out: it is still predicted if
+        # fewer than k other kept successors have at least its remaining
+        # count (ties count as misses). Edges are ordered by count within
+        # their source, so that number is one binary search away.
+        group = np.repeat(np.arange(len(starts)), lengths)
+        span = int(count.max()) + 2
+        key = group * span + np.where(predictable, span - 2 - count, span - 1)
+        rivals = np.searchsorted(key, group * span + (span - 1 - count), side='right') - np.repeat(starts, lengths) - 1
+        held_out = predictable & (count >= 2)
+
+        # Each pruned transition counts as its own successor: -log2(1 / total)
+        repeated = totals >= 2
+        probability = np.where(predictable, count, 1) / totals
+        repeated_total = int(count[repeated].sum())
+        entropy = (float(-(count * np.log2(probability))[repeated].sum() / repeated_total) + 0.0
+                   if repeated_total else float('nan'))
+        return {
+            'transitions': observed,
+            'sources': len(starts),
+            'edges': int(predictable.sum()),
+            'singleton_share': float(count[~repeated].sum() / observed),
+            'entropy_bits': entropy,
+            'top1_hit_rate': float(count[held_out & (rivals < 1)].sum() / observed),
+            'top4_hit_rate': float(count[held_out & (rivals < 4)].sum() / observed),
+            'coverage': total / observed,
+        }
+
+    def top_sources(self, n=20):
+        """
+        The `n` busiest sources with their most frequent successor.
+
+        Returns:
+            pd.DataFrame: context, source, transitions, successor, probability
+        """
+        self.flush()
+        if len(self.count) == 0:
+            return pd.DataFrame(columns=['context', 'source', 'transitions', 'successor', 'probability'])
+        context, source, target, count, starts, _ = _rank_edges(
+            self.context, self.source, self.target, self.count, _source_groups(self.context, self.source))
+        totals = np.add.reduceat(count, starts)
+        # The first edge of every source is its most frequent successor
+        busiest = starts[np.argsort(-totals, kind='stable')[:n]]
+        return pd.DataFrame({
+            'context': context[busiest],
+            'source': source[busiest],
+            'transitions': totals[np.searchsorted(starts, busiest)],
+            'successor': target[busiest],
+            'probability': count[busiest] / totals[np.searchsorted(starts, busiest)],
+        })
+
+class TransitionGraph:
+    """
+    Successor statistics of a trace's access stream, the evidence for or
+    against a Markov / correlation prefetcher:
+
+        page   page -> next different page
+        line   cache line -> next different cache line
+        delta  per IP, line delta -> next line delta (the stream a
+               PC-localized delta-correlation prefetcher learns)
+
+    Repeated accesses to the same page or line (and zero deltas) are
+    collapsed, since they are no prefetch opportunity. Events are fed in
+    time-ordered batches; the last page, line and per-IP history are
+    carried across batches, so the result does not depend on batch size
+    except through pruning.
+    """
+    KINDS = ('page', 'line', 'delta')
+
+    def __init__(self, top_n=4, max_sources=1 << 18):
+        """
+        Args:
+            top_n (int): Successors kept per source (at least 4 for the
+                top-4 hit rate to be exact)
+            max_sources (int): Sources kept per kind
+        """
+        self.tables = {kind: TransitionTable(top_n, max_sources) for kind in self.KINDS}
+        self._last = {'page': None, 'line': None}
+        # Last two (collapsed) lines of every IP seen so far
+        self._carry_ip = np.zeros(0, dtype=np.uint64)
+        self._carry_line = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_trace(cls, trace, batch_events=1_000_000, **kwargs):
+        """
+        Build the graph over a CompactTrace (or CSV/.npz path) or an
+        out-of-core ChunkedTrace, one bounded batch at a time.
+        """
+        graph = cls(**kwargs)
+        chunks = trace if isinstance(trace, ChunkedTrace) else [CompactTrace.open(trace)]
+        for chunk in chunks:
+            order = chunk.access_order()
+            for start in range(0, len(order), batch_events):
+                batch = order[start:start + batch_events]
+                graph.update(chunk.line[batch].astype(np.int64), chunk.ip[batch])
+        return graph
+
+    def update(self, line, ip):
+        """Feed a time-ordered batch of accesses (cache line and IP of each)."""
+        line = np.asarray(line, dtype=np.int64)
+        if len(line) == 0:
+            return
+        page = line // (CompactTrace.PAGE_SIZE // CompactTrace.CACHE_LINE_SIZE)
+        for kind, values in (('page', page), ('line', line)):
+            self._update_sequence(kind, values)
+        self._update_deltas(line, np.asarray(ip, dtype=np.uint64))
+
+    def _update_sequence(self, kind, values):
+        if self._last[kind] is not None:
+            values = np.concatenate(([self._last[kind]], values))
+        self._last[kind] = values[-1]
+        values = values[np.append(True, values[1:] != values[:-1])]
+        self.tables[kind].update(np.zeros(len(values) - 1, dtype=np.uint64), values[:-1], values[1:])
+
+    def _update_deltas(self, line, ip):
+        # Carried history goes first; a stable sort by IP then keeps every
+        # IP's accesses in time order
+        n_carry = len(self._carry_ip)
+        ip = np.concatenate((self._carry_ip, ip))
+        line = np.concatenate((self._carry_line, line))
+        new = np.arange(len(ip)) >= n_carry
+        order = np.argsort(ip, kind='stable')
+        ip, line, new = ip[order], line[order], new[order]
+
+        # Collapse repeated lines within an IP
+        same_ip = np.append(False, ip[1:] == ip[:-1])
+        keep = ~(same_ip & np.append(False, line[1:] == line[:-1]))
+        ip, line, new = ip[keep], line[keep], new[keep]
+        same_ip = np.append(False, ip[1:] == ip[:-1])
+
+        # A transition needs three consecutive accesses of one IP and is
+        # counted at the third, if that one is new
+        delta = np.append(0, np.diff(line))
+        valid = same_ip[2:] & same_ip[1:-1] & new[2:]
+        self.tables['delta'].update(ip[2:][valid], delta[1:-1][valid], delta[2:][valid])
+
+        # Carry each IP's last two accesses into the next batch
+        last = np.append(ip[1:] != ip[:-1], True)
+        tail = last | np.append(last[1:], False) & np.append(same_ip[1:], False)
+        self._carry_ip, self._carry_line = ip[tail], line[tail]
+
+    def summary(self):
+        """
+        Predictability per kind.
+
+        Returns:
+            pd.DataFrame: One row per kind with the TransitionTable.stats fields
+        """
+        return pd.DataFrame([dict(kind=kind, **table.stats()) for kind, table in self.tables.items()]).set_index('kind')
+
+    def top_sources(self, kind, n=20):
+        """Busiest sources of one kind with their most likely successor."""
+        return self.tables[kind].top_sources(n)
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python TransitionGraph.py <trace.csv|.npz|chunk_dir>")
+        sys.exit(1)
+    source = sys.argv[1]
+    graph = TransitionGraph.from_trace(ChunkedTrace(source) if ChunkedTrace.is_chunked(source) else source)
+    print(graph.summary().to_string())
+
+if __name__ == '__main__':
+    main()
@@ -1,103 +1,314 @@
+import os
+import sys
+import html
+import time
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
+from CompactTrace import CompactTrace
+from HeavyHitters import SpaceSaving
+from MemDataSource import has_data_source, level_breakdown
+from PhaseDetector import detect_phases, phase_ids
 
-# Load the CSV file
-csv_file = "C:/Users/izcin/OneDrive/Documents/GitHub/Prefetching-Pattern-Tracker/perf_output.csv"
+# Resolution every plot is pre-binned to; the figures only ever see these
+# small arrays, so drawing cost does not depend on the trace length
+TIME_BINS = 200
+HOT_LINES = 64
+RANGE_BINS = 10
+BATCH_EVENTS = 1_000_000
 
 # Load the data
-def load_data():
+def load_data(source):
     print("Loading data...")
-    df = pd.read_csv(csv_file)
-    df['Timestamp'] = pd.to_numeric(df['Timestamp'], errors='coerce')  # Ensure timestamps are numeric
-    return df
+    # Typed columns from the compact trace: numeric timestamps/addresses and
+    # event codes, so no per-row coercion is needed here
+    return CompactTrace.open(source)
+
+def _range_label(low, high, hexadecimal=False):
+    if hexadecimal:
+        return f"0x{int(low):x}-0x{int(high):x}"
+    return f"{low:.0f}-{high:.0f}"
+
+def bin_trace(trace, time_bins=TIME_BINS, hot_lines=HOT_LINES, range_bins=RANGE_BINS, bucketing='uniform'):
+    """
+    Reduce a trace to the small arrays every plot is drawn from.
+
+    Args:
+        trace (CompactTrace): Trace to summarize
+        time_bins (int): Time resolution of the events-over-time plot
+        hot_lines (int): Hottest cache lines shown in the access frequency
+            heatmap
+        range_bins (int): Bins of the grouped time/address histograms
+        bucketing (str): 'uniform', or 'phase' to group the time plots by
+            detected execution phase instead of equal-width bins
+
+    Returns:
+        dict: plot name -> data for that plot
+    """
+    timestamp = trace.timestamp
+    address = trace.address
+
+    # Hottest cache lines in address order, tracked in fixed memory however
+    # many distinct addresses the trace touches
+    hot = SpaceSaving(4 * hot_lines)
+    for start in range(0, len(trace), BATCH_EVENTS):
+        hot.update(trace.line[start:start + BATCH_EVENTS])
+    lines, frequency, _ = hot.top(hot_lines)
+    order = np.argsort(lines)
+    lines, frequency = lines[order], frequency[order]
+
+    # Occurrences per event type
+    event_counts = np.bincount(trace.event_code, minlength=len(trace.event_types))
+
+    # Grouped time and address ranges
+    time_counts, time_edges = np.histogram(timestamp, bins=range_bins) if len(trace) else ([], [0])
+    time_labels = [_range_label(lo, hi) for lo, hi in zip(time_edges[:-1], time_edges[1:])]
+    address_counts, address_edges = np.histogram(address.astype(np.float64), bins=range_bins) \
+        if len(trace) else ([], [0])
+
+    # Events per (time bin, event type)
+    if bucketing == 'phase':
+        phases = detect_phases(trace)
+        time_bins = max(len(phases), 1)
+        time_bin = phase_ids(timestamp, phases)
+        time_counts = np.bincount(time_bin, minlength=time_bins)
+        time_labels = [f"P{i} {_range_label(phase['start'], phase['end'])}" for i, phase in enumerate(phases)] \
+            or ['P0']
+        # Each phase is drawn at its midpoint
+        times = np.array([(phase['start'] + phase['end']) / 2 for phase in phases]) if phases else np.zeros(1)
+    elif len(trace):
+        start = int(timestamp.min())
+        span = max(int(timestamp.max()) - start, 1)
+        time_bin = ((timestamp - start) * time_bins // (span + 1)).astype(np.int64)
+        times = start + (np.arange(time_bins) + 0.5) * (span + 1) / time_bins
+    else:
+        time_bin = np.array([], dtype=np.int64)
+        times = (np.arange(time_bins) + 0.5) / time_bins
+    n_types = len(trace.event_types)
+    events_over_time = np.bincount(
+        time_bin * n_types + trace.event_code, minlength=time_bins * n_types
+    ).reshape(time_bins, n_types)
+    present = event_counts > 0
+
+    # Real hits and misses per memory level when the trace carries perf's
+    # data_src; otherwise fall back to counting events by name
+    if has_data_source(trace):
+        hit_miss = level_breakdown(trace)
+    else:
+        hit_miss = {
+            'names': [name for name, n in zip(trace.event_types, event_counts) if n],
+            'counts': event_counts[present],
+        }
+
+    return {
+        'access_frequency_heatmap': {
+            'addresses': [f"0x{int(line) * CompactTrace.CACHE_LINE_SIZE:x}" for line in lines],
+            'frequency': frequency,
+        },
+        'cache_hit_miss_distribution': hit_miss,
+        'temporal_accesses': {
+            'labels': time_labels,
+            'counts': np.asarray(time_counts),
+        },
+        'address_hotspots': {
+            'labels': [_range_label(lo, hi, True) for lo, hi in zip(address_edges[:-1], address_edges[1:])],
+            'counts': np.asarray(address_counts),
+        },
+        'events_over_time': {
+            'times': times,
+            'names': [name for name, p in zip(trace.event_types, present) if p],
+            'counts': events_over_time[:, present],
+        },
+    }
 
 # 1. Memory Access Frequency Heatmap
-def plot_access_frequency_heatmap(df):
+def plot_access_frequency_heatmap(data):
     print("Plotting memory access frequency heatmap...")
-    address_counts = df['Address'].value_counts().reset_index()
-    address_counts.columns = ['Address', 'Frequency']
-    address_counts = address_counts.sort_values(by='Address')
-
-    plt.figure(figsize=(12, 6))
-    sns.heatmap([address_counts['Frequency']], cmap='YlOrRd', xticklabels=10, cbar_kws={'label': 'Access Frequency'})
-    plt.title("Memory Access Frequency Heatmap")
-    plt.xlabel("Memory Address")
+    fig = plt.figure(figsize=(12, 6))
+    step = max(len(data['addresses']) // 40, 1)
+    frequency = pd.DataFrame([data['frequency']], columns=data['addresses'])
+    sns.heatmap(frequency, cmap='YlOrRd', xticklabels=step, yticklabels=False,
+                cbar_kws={'label': 'Access Frequency'})
+    plt.title(f"Memory Access Frequency Heatmap (hottest {len(data['addresses'])} cache lines)")
+    plt.xlabel("Cache Line Address")
     plt.xticks(rotation=90)  # Rotate x-axis labels
     plt.tight_layout()
-    plt.show()
+    return fig
 
 # 2. Cache Hit vs. Cache Miss Distribution
-def plot_cache_hit_miss_distribution(df):
+def plot_cache_hit_miss_distribution(data):
     print("Plotting cache hit vs. cache miss distribution...")
-    event_counts = df['Event'].value_counts()
-    plt.figure(figsize=(8, 5))
-    event_counts.plot(kind='bar', color=['green', 'red'], alpha=0.7)
-    plt.title("Cache Hit vs. Cache Miss")
-    plt.xlabel("Event Type")
-    plt.ylabel("Count")
-    plt.xticks(rotation=0)
+    if 'levels' not in data:
+        fig = plt.figure(figsize=(8, 5))
+        plt.bar(data['names'], data['counts'], color=['green', 'red'], alpha=0.7)
+        plt.title("Cache Hit vs. Cache Miss")
+        plt.xlabel("Event Type")
+        plt.ylabel("Count")
+        plt.xticks(rotation=0)
+        plt.tight_layout()
+        return fig
+
+    # Hits and misses per level from the decoded data_src, with the mean
+    # sampled latency (weight) of each level on a second axis
+    fig, ax = plt.subplots(figsize=(10, 5))
+    positions = np.arange(len(data['levels']))
+    ax.bar(positions - 0.2, data['hits'], width=0.4, color='green', alpha=0.7, label='Hit')
+    ax.bar(positions + 0.2, data['misses'], width=0.4, color='red', alpha=0.7, label='Miss')
+    ax.set_xticks(positions, data['levels'])
+    ax.set_xlabel("Memory Level")
+    ax.set_ylabel("Count")
+    ax.legend(loc='upper left')
+    if np.isfinite(data['latency']).any():
+        latency_ax = ax.twinx()
+        latency_ax.plot(positions, data['latency'], color='black', marker='o', label='Mean latency')
+        latency_ax.set_ylabel("Mean Latency (cycles)")
+        latency_ax.legend(loc='upper right')
+    plt.title("Cache Hit vs. Cache Miss by Memory Level")
     plt.tight_layout()
-    plt.show()
+    return fig
 
 # 3. Temporal Analysis of Memory Accesses (Grouped Timestamps)
-def plot_temporal_accesses(df):
+def plot_temporal_accesses(data):
     print("Plotting memory accesses over time...")
-    # Group timestamps into bins
-    df['Timestamp_Bin'] = pd.cut(df['Timestamp'], bins=10)
-    time_series = df['Timestamp_Bin'].value_counts().sort_index()
-
-    plt.figure(figsize=(12, 6))
-    time_series.plot(kind='bar', color='blue', alpha=0.7)
+    fig = plt.figure(figsize=(12, 6))
+    plt.bar(data['labels'], data['counts'], color='blue', alpha=0.7)
     plt.title("Memory Accesses Grouped Over Time")
     plt.xlabel("Timestamp Ranges")
     plt.ylabel("Number of Accesses")
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    return fig
 
 # 4. Memory Address Hotspots Histogram (Grouped Addresses)
-def plot_address_hotspots(df):
+def plot_address_hotspots(data):
     print("Plotting memory address hotspots...")
-    # Group addresses into bins
-    df['Address_Bin'] = pd.cut(df['Address'], bins=10)
-    address_counts = df['Address_Bin'].value_counts().sort_index()
-
-    plt.figure(figsize=(12, 6))
-    address_counts.plot(kind='bar', color='orange', alpha=0.7)
+    fig = plt.figure(figsize=(12, 6))
+    plt.bar(data['labels'], data['counts'], color='orange', alpha=0.7)
     plt.title("Distribution of Memory Address Accesses")
     plt.xlabel("Memory Address Ranges")
     plt.ylabel("Frequency")
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    return fig
 
 # 5. Event Type Breakdown Over Time (Improved Legend Placement)
-def plot_events_over_time(df):
+def plot_events_over_time(data):
     print("Plotting cache events over time...")
-    events_over_time = df.groupby(['Timestamp', 'Event']).size().unstack(fill_value=0)
-    plt.figure(figsize=(12, 6))
-    events_over_time.plot(kind='area', stacked=True, colormap='viridis', alpha=0.8)
+    fig = plt.figure(figsize=(12, 6))
+    colors = plt.get_cmap('viridis')(np.linspace(0, 1, max(len(data['names']), 1)))
+    plt.stackplot(data['times'], data['counts'].T, labels=data['names'], colors=colors, alpha=0.8)
     plt.title("Cache Events Over Time")
     plt.xlabel("Timestamp")
     plt.ylabel("Event Count")
     plt.legend(title="Event Type", bbox_to_anchor=(1.05, 1), loc='upper left')  # Move legend outside
     plt.grid()
     plt.tight_layout()
-    plt.show()
+    return fig
+
+PLOTS = {
+    'access_frequency_heatmap': ("Memory Access Frequency Heatmap", plot_access_frequency_heatmap),
+    'cache_hit_miss_distribution': ("Cache Hit vs. Cache Miss", plot_cache_hit_miss_distribution),
+    'temporal_accesses': ("Memory Accesses Grouped Over Time", plot_temporal_accesses),
+    'address_hotspots': ("Distribution of Memory Address Accesses", plot_address_hotspots),
+    'events_over_time': ("Cache Events Over Time", plot_events_over_time),
+}
+
+def render_plot(name, data, output_dir, formats):
+    """Draw one pre-binned plot and save it in every format (worker process entry point)."""
+    plt.switch_backend('Agg')
+    fig = PLOTS[name][1](data)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        fig.savefig(path, format=fmt, dpi=100, bbox_inches='tight')
+        paths.append(os.path.basename(path))
+    plt.close(fig)
+    return name, paths
+
+def write_index(output_dir, rendered, source, n_events):
+    """Write an index.html linking every rendered plot."""
+    sections = []
+    for name, (title, _) in PLOTS.items():
+        paths = rendered[name]
+        image = next((p for p in paths if p.endswith('.png')), None) or paths[0]
+        links = ' | '.join(f'<a href="{html.escape(p)}">{html.escape(p.rsplit(".", 1)[1].upper())}</a>'
+                           for p in paths)
+        sections.append(
+            f'<section><h2>{html.escape(title)}</h2>'
+            f'<img src="{html.escape(image)}" alt="{html.escape(title)}"><p>{links}</p></section>'
+        )
+    page = (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Memory Access Report</title>'
+        '<style>body{font-family:Arial,sans-serif;background:#f0f2f5;margin:20px}'
+        'section{background:white;margin:20px 0;padding:20px;border-radius:10px;'
+        'box-shadow:0 2px 4px rgba(0,0,0,0.1)}img{max-width:100%}</style></head><body>'
+        f'<h1>Memory Access Report</h1><p>{html.escape(str(source))}: {n_events:,} events</p>'
+        + ''.join(sections) + '</body></html>\n'
+    )
+    path = os.path.join(output_dir, 'index.html')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(page)
+    return path
+
+def generate_report(source, output_dir, formats=('png', 'svg'), workers=None, **bin_options):
+    """
+    Render every plot to files without a display and write an index page.
+
+    The trace is reduced to fixed-size bins once in this process; the
+    drawing then runs in parallel worker processes on the non-interactive
+    Agg backend, so each worker only receives a few kilobytes of data.
+
+    Args:
+        source: Anything CompactTrace.open accepts
+        output_dir (str): Directory for the images and index.html
+        formats (tuple): Image formats passed to savefig ('png', 'svg', 'pdf', ...)
+        workers (int): Worker processes (None: one per plot, up to the CPU count)
+        **bin_options: Resolution overrides forwarded to bin_trace
+
+    Returns:
+        str: Path of the index page
+    """
+    started = time.perf_counter()
+    matplotlib.use('Agg')
+    os.makedirs(output_dir, exist_ok=True)
+    trace = load_data(source)
+    binned = bin_trace(trace, **bin_options)
+    print(f"Binned {len(trace):,} events in {time.perf_counter() - started:.2f}s. Rendering...")
+
+    workers = workers or min(len(PLOTS), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_plot, name, binned[name], output_dir, formats) for name in PLOTS]
+        rendered = dict(future.result() for future in futures)
+
+    index = write_index(output_dir, rendered, source, len(trace))
+    print(f"Report written to {index} in {time.perf_counter() - started:.2f}s")
+    return index
 
 # Main function to execute all visualizations
 def main():
-    df = load_data()
+    # Interactive: python VisualizeMemoryAccess.py <trace> [--phases]
+    # Headless batch mode: python VisualizeMemoryAccess.py <trace> --report <output_dir> [--phases]
+    args = sys.argv[1:]
+    bucketing = 'phase' if '--phases' in args else 'uniform'
+    args = [arg for arg in args if arg != '--phases']
+    if len(args) == 3 and args[1] == '--report':
+        generate_report(args[0], args[2], bucketing=bucketing)
+        return
+    if len(args) != 1:
+        print("Usage: python VisualizeMemoryAccess.py <trace> [--report <output_dir>] [--phases]")
+        sys.exit(1)
+
+    trace = load_data(args[0])
+    binned = bin_trace(trace, bucketing=bucketing)
     print("Data Loaded. Generating plots...")
 
-    # Run all the plots one after another
-    plot_access_frequency_heatmap(df)
-    plot_cache_hit_miss_distribution(df)
-    plot_temporal_accesses(df)
-    plot_address_hotspots(df)
-    plot_events_over_time(df)
+    # Draw all the plots, then show them together
+    for name, (_, plot) in PLOTS.items():
+        plot(binned[name])
+    plt.show()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,270 @@
+"""
+ppt - Prefetching Pattern Tracker command line.
+
+    ppt parse        perf dump(s) -> enhanced CSV, chunked trace, dashboard JSON
+    ppt tail         follow a growing perf script output into a CSV
+    ppt validate     CSV -> clean typed trace plus a quarantine of rejected rows
+    ppt stats        summary statistics of a trace
+    ppt report       headless PNG/SVG report
+    ppt serve        one of the Dash dashboards
+    ppt publish      preprocess a dashboard's data for multi-worker serving
+    ppt simulate     replay a trace through a simple prefetcher
+    ppt transitions  page/line/delta successor predictability
+
+Every subcommand imports what it needs when it runs, so `ppt --help` and
+the non-GUI subcommands (parse, tail, validate, stats, simulate,
+transitions) never load dash, plotly, matplotlib or seaborn. Startup
+targets: `ppt --help` costs no more than a bare interpreter start, and
+parse/stats/simulate pay only for numpy and pandas (under one second end
+to end on the sample trace).
+"""
+import argparse
+import os
+import sys
+
+# Time bucketing modes each dashboard supports; the first is its default
+BUCKETING = {
+    'analyzer': ('uniform', 'phase'),
+    'dashboard': ('quantile', 'phase'),
+    'live': ('uniform', 'phase'),
+    'compare': ('uniform', 'phase'),
+}
+
+def bucketing_for(args):
+    """The --bucketing mode for args.app, exiting if that app does not support it."""
+    supported = BUCKETING.get(args.app, ())
+    if args.bucketing is None:
+        return supported[0] if supported else None
+    if args.bucketing not in supported:
+        if not supported:
+            sys.exit(f"ppt {args.command} {args.app} has no --bucketing option")
+        sys.exit(f"ppt {args.command} {args.app} supports --bucketing {'/'.join(supported)}, "
+                 f"not {args.bucketing}")
+    return args.bucketing
+
+def cmd_parse(args):
+    from PerfScriptParser import PerfScriptParser, is_perf_script
+    if args.format == 'script' or (args.format == 'auto' and is_perf_script(args.inputs[0])):
+        if len(args.inputs) > 1:
+            sys.exit("ppt parse merges shards of `perf report -D` dumps only")
+        import logging
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        parser = PerfScriptParser(args.inputs[0])
+        if args.chunks:
+            parser.process_chunked(args.chunks, args.chunk_events, args.workers)
+            return
+        trace = parser.process(args.output)
+        if args.dashboard_json:
+            from DashboardExport import export_dashboard_aggregates
+            export_dashboard_aggregates(trace, args.dashboard_json)
+        return
+
+    from ExtendedData2CSV import PerfDataProcessor
+    inputs = args.inputs if len(args.inputs) > 1 else args.inputs[0]
+    processor = PerfDataProcessor(inputs, args.output)
+    if args.chunks:
+        processor.process_perf_output_chunked(args.chunks, args.chunk_events)
+        return
+    processor.process_perf_output(dashboard_json=args.dashboard_json)
+
+def cmd_tail(args):
+    from DataToCSV import monitor
+    monitor(args.input, args.output, args.interval, args.quarantine)
+
+def cmd_validate(args):
+    from CompactTrace import CompactTrace
+    from SchemaValidation import Quarantine
+    quarantine = Quarantine(args.quarantine)
+    if args.chunks:
+        from OutOfCore import ChunkedTrace
+        ChunkedTrace.from_csv(args.input, args.chunks, args.chunk_events, quarantine)
+        output = args.chunks
+    else:
+        CompactTrace.from_csv(args.input, quarantine).save(args.output)
+        output = args.output
+    print('\n'.join(quarantine.summary()))
+    print(f"Clean rows written to {output}")
+
+def cmd_stats(args):
+    from OutOfCore import ChunkedTrace, SummaryStats, run_aggregations
+    from Cardinality import CardinalityProfile
+    aggregations = {'summary': SummaryStats()}
+    if ChunkedTrace.is_chunked(args.trace):
+        chunked = ChunkedTrace(args.trace)
+        if args.by:
+            aggregations['cardinality'] = CardinalityProfile.for_range(*chunked.time_range, args.windows)
+        aggregations = run_aggregations(chunked, aggregations, args.workers)
+        sample = chunked.sample()
+        if sample is not None:
+            print(f"Reservoir sample: {len(sample)} events ({sample.describe()})")
+    else:
+        from CompactTrace import CompactTrace
+        trace = CompactTrace.open(args.trace)
+        aggregations['summary'].update(trace)
+        if args.by:
+            aggregations['cardinality'] = CardinalityProfile.from_trace(trace, args.windows)
+    print('\n'.join(aggregations['summary'].lines()))
+    for dimension in args.by or ():
+        profile = aggregations['cardinality']
+        error = profile.sketches[(dimension, 'address')].rollup().relative_error
+        note = f", window = timestamp // {profile.window_ns} ns" if dimension == 'window' else ''
+        print(f"\nDistinct keys per {dimension} (±{error:.1%}{note})")
+        print(profile.table(dimension).round().astype('int64').to_string())
+
+def cmd_report(args):
+    from VisualizeMemoryAccess import generate_report
+    generate_report(args.trace, args.output, formats=tuple(args.formats.split(',')), workers=args.workers,
+                    bucketing=args.bucketing)
+
+def cmd_serve(args):
+    options = {'debug': args.debug, 'host': args.host, 'port': args.port}
+    bucketing = bucketing_for(args)
+    if args.app == 'compare':
+        if len(args.traces) != 2:
+            sys.exit("ppt serve compare needs a baseline and a candidate trace")
+        from TraceDiff import TraceComparison
+        TraceComparison(*args.traces, bucketing=bucketing).run_server(**options)
+        return
+    if len(args.traces) != 1:
+        sys.exit(f"ppt serve {args.app} takes exactly one trace")
+    trace = args.traces[0]
+    if args.app == 'analyzer':
+        from I2Vis import MemoryAccessAnalyzer
+        MemoryAccessAnalyzer(trace, raw_source=args.raw_source, bucketing=bucketing,
+                             cache_dir=args.cache_dir).run_server(**options)
+    elif args.app == 'dashboard':
+        from InteractiveVisualizer import MemoryAccessDashboard
+        MemoryAccessDashboard(trace, cache_dir=args.cache_dir, bucketing=bucketing).run_server(**options)
+    else:
+        from LiveDashboard import LiveMemoryAccessDashboard
+        LiveMemoryAccessDashboard(trace, bucketing=bucketing).run_server(**options)
+
+def cmd_publish(args):
+    bucketing = bucketing_for(args)
+    if args.app == 'analyzer':
+        from I2Vis import MemoryAccessAnalyzer
+        dashboard = MemoryAccessAnalyzer(args.trace, bucketing=bucketing)
+    else:
+        from InteractiveVisualizer import MemoryAccessDashboard
+        dashboard = MemoryAccessDashboard(args.trace, bucketing=bucketing)
+    dashboard.publish(args.output)
+    print(f"Published to {args.output}; serve it with\n"
+          f"  gunicorn -w 4 --preload 'SharedDataset:create_server(\"{args.output}\", \"{args.app}\")'")
+
+def cmd_simulate(args):
+    from PrefetchSimulator import simulate
+    results = simulate(args.trace, args.prefetcher, args.degree, args.cache_lines, args.limit)
+    print(f"{'':12}{'baseline':>12}{args.prefetcher:>12}")
+    for metric in ('accesses', 'hits', 'misses', 'hit_rate', 'prefetches', 'accuracy', 'coverage'):
+        row = [results['baseline'][metric], results['prefetch'][metric]]
+        print(f"{metric:12}" + ''.join(
+            f"{value:>12.2%}" if isinstance(value, float) else f"{value:>12,}" for value in row
+        ))
+
+def cmd_transitions(args):
+    from OutOfCore import ChunkedTrace
+    from TransitionGraph import TransitionGraph
+    trace = ChunkedTrace(args.trace) if ChunkedTrace.is_chunked(args.trace) else args.trace
+    graph = TransitionGraph.from_trace(trace, top_n=args.top_n, max_sources=args.max_sources)
+    print(graph.summary().to_string())
+    if args.top:
+        for kind in TransitionGraph.KINDS:
+            print(f"\nBusiest {kind} sources")
+            print(graph.top_sources(kind, args.top).to_string(index=False))
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ppt', description='Prefetching Pattern Tracker')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    parse = subcommands.add_parser('parse', help='parse perf dumps or sample listings (plain or compressed)')
+    parse.add_argument('inputs', nargs='+', help='perf dump, or several shards to merge by timestamp')
+    parse.add_argument('-o', '--output', default='perf_output_enhanced.csv',
+                       help='enhanced CSV to write (.npz for script listings writes a trace)')
+    parse.add_argument('--format', choices=('auto', 'dump', 'script'), default='auto',
+                       help='dump: `perf report -D`; script: `perf script -F time,tid,ip,addr,'
+                            'data_src,weight,sym,dso` or `perf mem report -D`')
+    parse.add_argument('--chunks', metavar='DIR', help='write an out-of-core chunked trace instead of a CSV')
+    parse.add_argument('--chunk-events', type=int, default=1_000_000, help='events per chunk')
+    parse.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help='processes parsing byte ranges of a plain or seekable-zstd script listing (--chunks)')
+    parse.add_argument('--dashboard-json', metavar='PATH', help='also export the web dashboard aggregates')
+    parse.set_defaults(handler=cmd_parse)
+
+    tail = subcommands.add_parser('tail', help='follow a growing perf script output into a CSV')
+    tail.add_argument('input', help='growing `timestamp: event address` text file')
+    tail.add_argument('-o', '--output', default='perf_output.csv', help='CSV to append to')
+    tail.add_argument('--interval', type=float, default=1.0, help='poll interval in seconds')
+    tail.add_argument('--quarantine', metavar='CSV', help='write lines failing validation here')
+    tail.set_defaults(handler=cmd_tail)
+
+    validate = subcommands.add_parser('validate', help='validate a CSV into a clean typed trace and a quarantine CSV')
+    validate.add_argument('input', help='CSV written by parse or tail')
+    validate.add_argument('-o', '--output', default='trace.npz', help='clean .npz trace to write')
+    validate.add_argument('--quarantine', default='quarantine.csv', help='CSV receiving rejected rows and reasons')
+    validate.add_argument('--chunks', metavar='DIR', help='write an out-of-core chunked trace instead')
+    validate.add_argument('--chunk-events', type=int, default=1_000_000, help='rows per chunk')
+    validate.set_defaults(handler=cmd_validate)
+
+    stats = subcommands.add_parser('stats', help='print summary statistics of a trace')
+    stats.add_argument('trace', help='CSV, .npz trace or chunked trace directory')
+    stats.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help='worker processes for chunked traces')
+    stats.add_argument('--by', action='append', choices=('window', 'thread', 'dso'),
+                       help='also list distinct addresses/lines/pages per group (repeatable)')
+    stats.add_argument('--windows', type=int, default=50, help='time windows for --by window')
+    stats.set_defaults(handler=cmd_stats)
+
+    report = subcommands.add_parser('report', help='render a headless PNG/SVG report')
+    report.add_argument('trace', help='CSV or .npz trace')
+    report.add_argument('-o', '--output', default='report', help='output directory')
+    report.add_argument('--formats', default='png,svg', help='comma-separated image formats')
+    report.add_argument('--workers', type=int, help='rendering processes')
+    report.add_argument('--bucketing', choices=('uniform', 'phase'), default='uniform',
+                        help='time bins of the time plots: equal-width or detected execution phases')
+    report.set_defaults(handler=cmd_report)
+
+    serve = subcommands.add_parser('serve', help='serve a dashboard')
+    serve.add_argument('app', choices=('analyzer', 'dashboard', 'live', 'compare'),
+                       help='analyzer: I2Vis, dashboard: InteractiveVisualizer, '
+                            'live: growing perf output, compare: two traces')
+    serve.add_argument('traces', nargs='+',
+                       help='trace(s) or a published directory; for live the growing perf output file')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8050)
+    serve.add_argument('--debug', action='store_true')
+    serve.add_argument('--bucketing', choices=('uniform', 'quantile', 'phase'),
+                       help='time bucketing (dashboard: quantile/phase, others: uniform/phase)')
+    serve.add_argument('--raw-source', nargs='+', help='perf dump(s) behind the trace (analyzer)')
+    serve.add_argument('--cache-dir', help='shared on-disk figure cache (analyzer, dashboard)')
+    serve.set_defaults(handler=cmd_serve)
+
+    publish = subcommands.add_parser('publish', help='publish preprocessed data for multi-worker serving')
+    publish.add_argument('app', choices=('analyzer', 'dashboard'))
+    publish.add_argument('trace', help='CSV or .npz trace')
+    publish.add_argument('-o', '--output', default='shared', help='directory to publish to')
+    publish.add_argument('--bucketing', choices=('uniform', 'quantile', 'phase'),
+                         help='time bucketing (analyzer: uniform/phase, dashboard: quantile/phase)')
+    publish.set_defaults(handler=cmd_publish)
+
+    simulate = subcommands.add_parser('simulate', help='replay a trace through a prefetcher')
+    simulate.add_argument('trace', help='CSV or .npz trace')
+    simulate.add_argument('--prefetcher', choices=('none', 'next-line', 'stride'), default='stride')
+    simulate.add_argument('--degree', type=int, default=2, help='lines prefetched per trigger')
+    simulate.add_argument('--cache-lines', type=int, default=512, help='cache capacity in lines')
+    simulate.add_argument('--limit', type=int, help='replay only the first N accesses')
+    simulate.set_defaults(handler=cmd_simulate)
+
+    transitions = subcommands.add_parser('transitions', help='page/line/delta successor predictability')
+    transitions.add_argument('trace', help='CSV, .npz trace or chunked trace directory')
+    transitions.add_argument('--top-n', type=int, default=4, help='successors kept per source')
+    transitions.add_argument('--max-sources', type=int, default=1 << 18, help='sources kept per kind')
+    transitions.add_argument('--top', type=int, default=0, help='also list the N busiest sources of each kind')
+    transitions.set_defaults(handler=cmd_transitions)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+if __name__ == '__main__':
+    main()
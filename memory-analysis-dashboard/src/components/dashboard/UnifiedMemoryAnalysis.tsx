@@ -1,9 +1,16 @@
 /* eslint-disable */
 
 'use client';
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 import { Github, Linkedin, Download, Mail, Globe } from 'lucide-react';
+import { DashboardAggregates, TimeSeriesDataPoint } from '@/types/types';
+
+// Export format version understood by this page (see DashboardExport.py)
+const AGGREGATES_VERSION = 1;
+
+// Cache rates are null when the trace has no hit/miss events
+const formatRate = (rate: number | null) => (rate === null ? 'n/a' : `${rate}%`);
 
 const Header = () => {
   return (
@@ -67,12 +74,12 @@ const Header = () => {
 
             <div className="flex items-center space-x-4">
               <a
-                href="/perf_output_enhanced.csv"
+                href="/dashboard_aggregates.json"
                 download
                 className="inline-flex items-center px-4 py-2 bg-purple-600 text-white rounded-lg hover:bg-blue-700 transition-colors shadow-sm"
               >
                 <Download size={18} className="mr-2" />
-                <span>Download Dataset</span>
+                <span>Download Aggregates</span>
               </a>
               <a
                 href="/ExtendedData2CSV.py"
@@ -172,6 +179,20 @@ const Footer = () => {
 const UnifiedMemoryAnalysis = () => {
   const [selectedTimeRange, setSelectedTimeRange] = useState('all');
   const [selectedSection, setSelectedSection] = useState('all');
+  const [aggregates, setAggregates] = useState<DashboardAggregates | null>(null);
+
+  // Load the precomputed chart data; its size depends on the number of chart
+  // points, not on the trace length. Falls back to the sample data below.
+  useEffect(() => {
+    fetch('/dashboard_aggregates.json')
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data: DashboardAggregates | null) => {
+        if (data && data.version === AGGREGATES_VERSION) {
+          setAggregates(data);
+        }
+      })
+      .catch(() => undefined);
+  }, []);
 
   // Code sections with annotations
   const codeSnippets = {
@@ -193,14 +214,14 @@ int main() {
   };
 
   // Data setup
-  const libraryAccesses = [
+  const libraryAccesses = aggregates?.libraries ?? [
     { name: 'Main()', accesses: 12, color: '#2ecc71' },
     { name: 'Linker', accesses: 35, color: '#3498db' },
     { name: 'C Library', accesses: 18, color: '#9b59b6' },
     { name: 'VDSO', accesses: 7, color: '#e74c3c' }
   ];
 
-  const eventTypes = [
+  const eventTypes = aggregates?.events ?? [
     { name: 'SAMPLE', count: 60, color: '#1abc9c' },
     { name: 'MMAP2', count: 4, color: '#3498db' },
     { name: 'COMM', count: 2, color: '#9b59b6' },
@@ -209,7 +230,7 @@ int main() {
   ];
 
   const generateTimeSeriesData = () => {
-    const baseData = Array.from({ length: 20 }, (_, i) => ({
+    const baseData: TimeSeriesDataPoint[] = aggregates?.timeSeries ?? Array.from({ length: 20 }, (_, i) => ({
       timestamp: `T${i}`,
       accesses: Math.floor(Math.random() * 20 + 5),
       cacheHits: Math.floor(Math.random() * 15 + 10),
@@ -217,7 +238,7 @@ int main() {
       mainProgram: Math.floor(Math.random() * 10),
       dynamicLinker: Math.floor(Math.random() * 15),
       cLibrary: Math.floor(Math.random() * 8),
-      phase: i < 7 ? 'init' : i < 14 ? 'loop' : 'exit'
+      phase: (i < 7 ? 'init' : i < 14 ? 'loop' : 'exit') as TimeSeriesDataPoint['phase']
     }));
 
     return selectedTimeRange !== 'all' 
@@ -226,6 +247,13 @@ int main() {
   };
 
   const timeSeriesData = generateTimeSeriesData();
+
+  const metrics = aggregates?.metrics ?? {
+    cacheHitRate: 78.5,
+    cacheMissRate: 21.5,
+    totalAccesses: 72,
+    peakAccessRate: 15
+  };
 return (
     <div className="min-h-screen flex flex-col bg-gray-50">
       <Header />
@@ -368,19 +396,19 @@ return (
                 <div className="grid grid-cols-2 gap-4">
                   <div className="p-3 bg-gray-50 rounded">
                     <p className="text-sm text-gray-600">Cache Hit Rate</p>
-                    <p className="text-xl font-mono">78.5%</p>
+                    <p className="text-xl font-mono">{formatRate(metrics.cacheHitRate)}</p>
                   </div>
                   <div className="p-3 bg-gray-50 rounded">
                     <p className="text-sm text-gray-600">Cache Miss Rate</p>
-                    <p className="text-xl font-mono">21.5%</p>
+                    <p className="text-xl font-mono">{formatRate(metrics.cacheMissRate)}</p>
                   </div>
                   <div className="p-3 bg-gray-50 rounded">
                     <p className="text-sm text-gray-600">Total Accesses</p>
-                    <p className="text-xl font-mono">72</p>
+                    <p className="text-xl font-mono">{metrics.totalAccesses.toLocaleString()}</p>
                   </div>
                   <div className="p-3 bg-gray-50 rounded">
                     <p className="text-sm text-gray-600">Peak Access Rate</p>
-                    <p className="text-xl font-mono">15/s</p>
+                    <p className="text-xl font-mono">{Math.round(metrics.peakAccessRate).toLocaleString()}/s</p>
                   </div>
                 </div>
               </div>
@@ -49,13 +49,23 @@ export interface TimeSeriesDataPoint {
   
   // Performance metrics interface
   export interface PerformanceMetrics {
-    cacheHitRate: number;    // Cache hit percentage
-    cacheMissRate: number;   // Cache miss percentage
+    cacheHitRate: number | null;   // Cache hit percentage, null if unknown
+    cacheMissRate: number | null;  // Cache miss percentage, null if unknown
     totalAccesses: number;   // Total memory accesses
     peakAccessRate: number;  // Maximum accesses per second
   }
 
   
+  // Pre-shaped aggregates exported by PerfDataProcessor.export_dashboard_aggregates
+  // (public/dashboard_aggregates.json)
+  export interface DashboardAggregates {
+    version: number;                   // Export format version
+    timeSeries: TimeSeriesDataPoint[];
+    libraries: LibraryAccess[];
+    events: EventType[];
+    metrics: PerformanceMetrics;
+  }
+
   // Type for timeline selection
   export type TimeRangeSelection = 'all' | 'init' | 'loop' | 'exit';
   